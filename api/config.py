@@ -16,7 +16,143 @@ ENV_TO_DB = {
 
 DB_NAME = ENV_TO_DB.get(ENVIRONMENT, "blue_energy_dev")
 
+# Write-behind buffering of incident inserts
+INCIDENT_WRITE_BUFFER = os.getenv("INCIDENT_WRITE_BUFFER", "false").lower() == "true"
+INCIDENT_WRITE_BATCH_SIZE = int(os.getenv("INCIDENT_WRITE_BATCH_SIZE", "500"))
+INCIDENT_WRITE_FLUSH_MS = int(os.getenv("INCIDENT_WRITE_FLUSH_MS", "100"))
+INCIDENT_WRITE_MAX_PENDING = int(os.getenv("INCIDENT_WRITE_MAX_PENDING", "10000"))
+
+# Fast-ack ingest: "sync" processes webhooks inline, "stream" queues them for api.worker
+INGEST_MODE = os.getenv("INGEST_MODE", "sync").lower()
+INGEST_STREAM = os.getenv("INGEST_STREAM", "incident:ingest")
+INGEST_GROUP = os.getenv("INGEST_GROUP", "incident-workers")
+INGEST_STREAM_MAXLEN = int(os.getenv("INGEST_STREAM_MAXLEN", "1000000"))
+INGEST_CLAIM_IDLE_MS = int(os.getenv("INGEST_CLAIM_IDLE_MS", "60000"))
+INGEST_MAX_DELIVERIES = int(os.getenv("INGEST_MAX_DELIVERIES", "5"))
+
+# Unpaired partial incidents in Redis
+PARTIAL_TTL_SECONDS = int(os.getenv("PARTIAL_TTL_SECONDS", "86400"))
+PARTIAL_EXPIRE_GRACE_SECONDS = int(os.getenv("PARTIAL_EXPIRE_GRACE_SECONDS", "3600"))
+ORPHAN_SWEEP_INTERVAL_SECONDS = int(os.getenv("ORPHAN_SWEEP_INTERVAL_SECONDS", "60"))
+ORPHAN_SWEEP_BATCH = int(os.getenv("ORPHAN_SWEEP_BATCH", "500"))
+ORPHAN_ARCHIVE = os.getenv("ORPHAN_ARCHIVE", "false").lower() == "true"
+PARTIAL_ENCODING = os.getenv("PARTIAL_ENCODING", "json").lower()
+PARTIAL_COMPRESSION = os.getenv("PARTIAL_COMPRESSION", "none").lower()
+
+# Idempotent ingest: event IDs persisted within this window are acknowledged without reprocessing (0 disables)
+DEDUP_WINDOW_SECONDS = int(os.getenv("DEDUP_WINDOW_SECONDS", "172800"))
+
+# Admission control for the webhook routes (ADMISSION_MAX_IN_FLIGHT=0 disables)
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "64"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "128"))
+ADMISSION_QUEUE_TIMEOUT_MS = int(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", "1000"))
+ADMISSION_LATENCY_TARGET_MS = int(os.getenv("ADMISSION_LATENCY_TARGET_MS", "250"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+
+# Debug endpoints (disabled unless DEBUG_TOKEN is set) and event-loop lag monitoring
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN", "")
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "60"))
+LOOP_LAG_THRESHOLD_MS = int(os.getenv("LOOP_LAG_THRESHOLD_MS", "100"))
+LOOP_MONITOR_INTERVAL_MS = int(os.getenv("LOOP_MONITOR_INTERVAL_MS", "50"))
+
+# Hourly/daily incident rollups for the analytics routes, recounted every interval over the hours
+# since the last refresh less the lateness; incidents stored later than that after their timestamp
+# are only counted by a rebuild (`python -m api.database.incidents.rollup_refresher --since ...`)
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "true").lower() == "true"
+ROLLUP_INTERVAL_SECONDS = int(os.getenv("ROLLUP_INTERVAL_SECONDS", "300"))
+ROLLUP_LATENESS_SECONDS = int(os.getenv("ROLLUP_LATENESS_SECONDS", "7200"))
+
+# /health/ready pings each backend with this timeout; /health serves a snapshot of counts and latest
+# documents taken every interval, read afresh only when it is older than the max age
+HEALTH_PING_TIMEOUT_MS = int(os.getenv("HEALTH_PING_TIMEOUT_MS", "1000"))
+HEALTH_SNAPSHOT_INTERVAL_SECONDS = int(os.getenv("HEALTH_SNAPSHOT_INTERVAL_SECONDS", "30"))
+HEALTH_SNAPSHOT_MAX_AGE_SECONDS = int(os.getenv("HEALTH_SNAPSHOT_MAX_AGE_SECONDS", "60"))
+
+# Storage backends, resolved once per process. The test suite runs on the in-memory ones.
+# Where incidents are stored: "mongo" or "memory" (local runs and simulations; nothing is persisted)
+INCIDENT_BACKEND = os.getenv("INCIDENT_BACKEND", "memory" if ENVIRONMENT == "test" else "mongo").lower()
+# How Mongo stores incidents: "collection" (regular) or "timeseries" (bucketed; migrate with
+# `python -m api.database.incidents.timeseries`). Granularity and retention apply to timeseries only.
+INCIDENT_STORAGE = os.getenv("INCIDENT_STORAGE", "collection").lower()
+INCIDENT_TIMESERIES_GRANULARITY = os.getenv("INCIDENT_TIMESERIES_GRANULARITY", "minutes").lower()
+INCIDENT_RETENTION_DAYS = int(os.getenv("INCIDENT_RETENTION_DAYS", "0"))
+# Where partials are correlated: "redis" (shared, multi-instance) or "memory" (single instance)
+CORRELATION_BACKEND = os.getenv("CORRELATION_BACKEND", "memory" if ENVIRONMENT == "test" else "redis").lower()
+MEMORY_MAX_PARTIALS = int(os.getenv("MEMORY_MAX_PARTIALS", "100000"))
+MEMORY_SNAPSHOT_PATH = os.getenv("MEMORY_SNAPSHOT_PATH", "")
+MEMORY_SNAPSHOT_INTERVAL_SECONDS = int(os.getenv("MEMORY_SNAPSHOT_INTERVAL_SECONDS", "30"))
+
 class DatabaseConfig:
     uri = MONGO_URI
     name = DB_NAME
-    environment = ENVIRONMENT 
+    environment = ENVIRONMENT
+    backend = INCIDENT_BACKEND
+    storage = INCIDENT_STORAGE
+    # "seconds", "minutes" or "hours": the expected gap between one vehicle's incidents
+    timeseries_granularity = INCIDENT_TIMESERIES_GRANULARITY
+    # 0 keeps incidents forever
+    retention_seconds = INCIDENT_RETENTION_DAYS * 86400
+
+class WriteBufferConfig:
+    enabled = INCIDENT_WRITE_BUFFER
+    batch_size = INCIDENT_WRITE_BATCH_SIZE
+    flush_interval = INCIDENT_WRITE_FLUSH_MS / 1000
+    max_pending = INCIDENT_WRITE_MAX_PENDING
+
+class IngestConfig:
+    mode = INGEST_MODE
+    stream = INGEST_STREAM
+    dead_letter_stream = f"{INGEST_STREAM}:dead"
+    group = INGEST_GROUP
+    maxlen = INGEST_STREAM_MAXLEN
+    claim_idle_ms = INGEST_CLAIM_IDLE_MS
+    max_deliveries = INGEST_MAX_DELIVERIES
+
+class PartialConfig:
+    # Partials older than this are orphans and get swept
+    ttl_ms = PARTIAL_TTL_SECONDS * 1000
+    # Redis expires the hash itself after ttl + grace, as a backstop when no sweeper runs
+    expire_ms = (PARTIAL_TTL_SECONDS + PARTIAL_EXPIRE_GRACE_SECONDS) * 1000
+    pending_index = "incident:pending"
+    sweep_interval = ORPHAN_SWEEP_INTERVAL_SECONDS
+    sweep_batch = ORPHAN_SWEEP_BATCH
+    archive = ORPHAN_ARCHIVE
+    # "json" or "msgpack"; readers accept both, see api/database/redis/codec.py
+    encoding = PARTIAL_ENCODING
+    compression = PARTIAL_COMPRESSION
+
+class AdmissionConfig:
+    enabled = ADMISSION_MAX_IN_FLIGHT > 0
+    max_in_flight = ADMISSION_MAX_IN_FLIGHT
+    max_queue = ADMISSION_MAX_QUEUE
+    queue_timeout = ADMISSION_QUEUE_TIMEOUT_MS / 1000
+    latency_target_ms = ADMISSION_LATENCY_TARGET_MS
+    retry_after = ADMISSION_RETRY_AFTER_SECONDS
+
+class DebugConfig:
+    token = DEBUG_TOKEN
+    profile_max_seconds = PROFILE_MAX_SECONDS
+    loop_lag_threshold = LOOP_LAG_THRESHOLD_MS / 1000
+    loop_monitor_interval = LOOP_MONITOR_INTERVAL_MS / 1000
+    max_stalls = 50
+
+class RollupConfig:
+    enabled = ROLLUPS_ENABLED
+    interval = ROLLUP_INTERVAL_SECONDS
+    lateness = ROLLUP_LATENESS_SECONDS
+
+class HealthConfig:
+    ping_timeout = HEALTH_PING_TIMEOUT_MS / 1000
+    snapshot_interval = HEALTH_SNAPSHOT_INTERVAL_SECONDS
+    snapshot_max_age = HEALTH_SNAPSHOT_MAX_AGE_SECONDS
+
+class CorrelationConfig:
+    backend = CORRELATION_BACKEND
+    max_partials = MEMORY_MAX_PARTIALS
+    snapshot_path = MEMORY_SNAPSHOT_PATH
+    snapshot_interval = MEMORY_SNAPSHOT_INTERVAL_SECONDS
+
+class DedupConfig:
+    enabled = DEDUP_WINDOW_SECONDS > 0
+    window_ms = DEDUP_WINDOW_SECONDS * 1000
+    key_prefix = "persisted:"
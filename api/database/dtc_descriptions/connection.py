@@ -1,170 +1,107 @@
 # DTCDatabase/connection.py
 
+import asyncio
+import logging
+import time
 from motor.motor_asyncio import AsyncIOMotorClient
-import os
-import openpyxl
+from pymongo import DeleteOne, ReplaceOne
+from pymongo.errors import BulkWriteError
+from typing import Dict
 from .schema import create_schema_validation, create_indexes
+from .sync import SYNC_STATE_ID, diff_rows, read_documents, workbook_hash
 from api.config import DatabaseConfig
+from api.services.metrics import MONGO_OPERATION_SECONDS, instrumented
 
+logger = logging.getLogger(__name__)
+
+@instrumented(MONGO_OPERATION_SECONDS, database="dtc_descriptions")
 class DTCDatabase:
     client: AsyncIOMotorClient = None
     db = None
     collection = None
+    sync_state = None
     db_name = DatabaseConfig.name
 
 
     @classmethod
-    def count_excel_rows(cls):
-        """Count the number of rows in the Excel file (excluding header)"""
+    async def sync_excel_data(cls, force: bool = False) -> Dict[str, int]:
+        """
+        Bring dtc_codes in line with the workbook, writing only the rows that
+        changed (see sync.py). Returns how many codes were upserted and
+        deleted; nothing is read but the file's hash when it is unchanged
+        and dtc_codes still holds as many codes as the last sync left.
+        """
         try:
-            excel_path = os.path.join('api', 'database', 'dtc_descriptions', 'dtc_descriptions.xlsx')
-            workbook = openpyxl.load_workbook(excel_path, data_only=True)
-            # print(workbook)
-            sheet = workbook.active
-            headers = [cell.value for cell in sheet[1]]
-            print(headers)
-            # Subtract 1 to exclude header row
-            return sheet.max_row - 1
-        except Exception as e:
-            print(f"Error counting Excel rows: {str(e)}")
-            raise
+            digest = await asyncio.to_thread(workbook_hash)
+            state = await cls.sync_state.find_one({"_id": SYNC_STATE_ID})
+            # The count catches dtc_codes emptied or restored behind the sync state's back; a
+            # metadata count that is off after an unclean shutdown only costs a diff of the rows
+            if (
+                not force and state and state.get("workbook_hash") == digest
+                and await cls.collection.estimated_document_count() == state.get("rows")
+            ):
+                logger.info("DTC descriptions are up to date (workbook %s)", digest[:12])
+                return {"upserted": 0, "deleted": 0}
 
-    @classmethod
-    async def import_excel_data(cls, force_update=False):
-        """Import DTC codes from Excel file"""
-        try:            
-            excel_path = os.path.join('api', 'database', 'dtc_descriptions', 'dtc_descriptions.xlsx')
-            workbook = openpyxl.load_workbook(excel_path, data_only=True)
-            # Get first sheet
-            sheet = workbook.active
-            data = []
-            headers = [cell.value for cell in sheet[1]]
-            
-            for row in sheet.iter_rows(min_row=2):
-                row_data = {}
-                for header, cell in zip(headers, row):
-                    row_data[header] = str(cell.value) if cell.value is not None else ""
-                data.append(row_data)
-            
-            documents = []
-            skipped_docs = []
-            # print(row)
-            for row in data:
-                try:
-                    document = {
-                        "Name": row.get("Name", ""),
-                        "Title": row.get("Title", ""),
-                        "DTC": row.get("DTC", ""),
-                        "Component": row.get("Component", ""),
-                        "SEVERITY": row.get("SEVERITY\n(Critical Y/N)", "").lower(),  # Convert to lowercase
-                        "Driver_reaction": row.get("Driver reaction", ""),
-                        "Test_Condition": row.get("Test Condition", ""),
-                        "Fault_Detection": row.get("Fault Detection", ""),
-                        "Performance_Limiter": row.get("Performance Limiter", ""),
-                        "Residual_torque": row.get("Residual torque [%]", ""),
-                        "RED_LAMP": row.get("RED LAMP", ""),
-                        "Amber_Lamp": row.get("Amber Lamp", ""),
-                        "MIL": row.get("MIL", ""),
-                        "Validation": row.get("Validation (MIL ON)", ""),
-                        "Healing": row.get("Healing (MIL OFF)", "")
-                    }
-                    documents.append(document)
-                except Exception as e:
-                    skipped_docs.append({"DTC": row.get("DTC", ""), "reason": str(e)})
-            
-            if documents:
-                if force_update:
-                    # Clear existing data
-                    await cls.collection.delete_many({})
-                    print("Cleared existing DTC data from database")
-                
-                # Insert all documents at once
-                try:
-                    result = await cls.collection.insert_many(documents, ordered=False)
-                    successful_inserts = len(result.inserted_ids)
-                    
-                    # If not all documents were inserted, raise an error
-                    if successful_inserts != len(data):
-                        raise ValueError(f"Failed to import all rows. Expected {len(data)} rows, but only imported {successful_inserts}.")
-                    
-                    print(f"\nImport Summary:")
-                    # print(f"✓ Successfully imported all {successful_inserts} DTC codes")
-                    
-                except Exception as e:
-                    # If there was a bulk write error, provide details
-                    if hasattr(e, 'details'):
-                        successful_inserts = e.details.get("nInserted", 0)
-                        errors = e.details.get("writeErrors", [])
-                        error_details = "\n".join([f"Row {err['index']}: {err['errmsg']}" for err in errors[:5]])
-                        if len(errors) > 5:
-                            error_details += f"\n... and {len(errors) - 5} more errors"
-                        
-                        raise ValueError(
-                            f"Failed to import all rows. Expected {len(data)} rows, but only imported {successful_inserts}.\n"
-                            f"First few errors:\n{error_details} {headers}"
-                        )
-                    raise
-            else:
+            documents = await asyncio.to_thread(read_documents)
+            if not documents:
                 raise ValueError("No valid data found in Excel file")
-                
-            return successful_inserts
-            
-        except Exception as e:
-            print(f"Error importing Excel data: {str(e)}")
-            raise
+            stored = {
+                document["DTC"]: document.get("row_hash")
+                async for document in cls.collection.find({}, {"DTC": 1, "row_hash": 1, "_id": 0})
+            }
+            upserts, deletes = diff_rows(stored, documents)
+            # Codes the collection holds once synced; a code repeated in the workbook is stored once
+            rows = len({document["DTC"] for document in documents})
+            operations = [ReplaceOne({"DTC": document["DTC"]}, document, upsert=True) for document in upserts]
+            operations += [DeleteOne({"DTC": code}) for code in deletes]
+            codes = [document["DTC"] for document in upserts] + deletes
+            if operations:
+                try:
+                    await cls.collection.bulk_write(operations, ordered=False)
+                except BulkWriteError as e:
+                    errors = e.details.get("writeErrors", [])
+                    error_details = "\n".join(f"DTC {codes[err['index']]}: {err['errmsg']}" for err in errors[:5])
+                    if len(errors) > 5:
+                        error_details += f"\n... and {len(errors) - 5} more errors"
+                    raise ValueError(f"Failed to sync {len(errors)} of {len(operations)} DTC codes.\nFirst few errors:\n{error_details}")
+
+            await cls.sync_state.replace_one(
+                {"_id": SYNC_STATE_ID},
+                {"workbook_hash": digest, "rows": rows, "synced_at": int(time.time())},
+                upsert=True
+            )
+            logger.info("Synced DTC descriptions: %s upserted, %s deleted, %s unchanged",
+                        len(upserts), len(deletes), rows - len(upserts))
+            return {"upserted": len(upserts), "deleted": len(deletes)}
 
-    @classmethod
-    async def verify_and_update_data(cls):
-        """Verify database count matches Excel and update if needed"""
-        try:
-            excel_count = cls.count_excel_rows()
-            db_count = await cls.count_documents()
-            
-            print(f"\nVerifying DTC data:")
-            print(f"Excel rows: {excel_count}")
-            print(f"Database documents: {db_count}")
-            
-            if excel_count != db_count:
-                print("\n⚠️  Data mismatch detected. Re-importing DTC data...")
-                await cls.import_excel_data(force_update=True)
-                new_count = await cls.count_documents()
-                print(f"✓ Database updated. New count: {new_count}")
-            else:
-                print("✓ Data verification passed")
-            
         except Exception as e:
-            print(f"Error during data verification: {str(e)}")
+            logger.error("Error syncing DTC descriptions: %s", e)
             raise
 
     @classmethod
     async def connect(cls):
-        """Connect to MongoDB and initialize database"""
+        """Connect to MongoDB and sync the DTC descriptions"""
         try:
             # Connect to MongoDB
             cls.client = AsyncIOMotorClient(DatabaseConfig.uri)
             cls.db = cls.client[DatabaseConfig.name]
-            
-            # Drop and recreate collection to apply new schema
-            if "dtc_codes" in await cls.db.list_collection_names():
-                print("Dropping existing collection to apply new schema...")
-                await cls.db.dtc_codes.drop()
-            
-            print("Creating collection with updated schema...")
-            await cls.db.create_collection(
-                "dtc_codes",
-                validator=create_schema_validation()
-            )
+
+            if "dtc_codes" not in await cls.db.list_collection_names():
+                await cls.db.create_collection(
+                    "dtc_codes",
+                    validator=create_schema_validation()
+                )
             await create_indexes(cls.db.dtc_codes)
             cls.collection = cls.db.dtc_codes
-            
-            # Import data
-            print("Importing DTC codes from Excel...")
-            await cls.import_excel_data()
-            
-            print(f"\nConnected to MongoDB - Database: {DatabaseConfig.name}")
-            
+            cls.sync_state = cls.db.dtc_sync
+
+            await cls.sync_excel_data()
+
+            logger.info("Connected to MongoDB - Database: %s", DatabaseConfig.name)
+
         except Exception as e:
-            print(f"Error connecting to MongoDB: {e}")
+            logger.error("Error connecting to MongoDB: %s", e)
             raise e
 
     @classmethod
@@ -172,13 +109,20 @@ class DTCDatabase:
         """Close MongoDB connection"""
         if cls.client:
             cls.client.close()
-            print(f"Closed connection to database: {DatabaseConfig.name}")
+            logger.info("Closed connection to database: %s", DatabaseConfig.name)
 
     @classmethod
     async def is_connected(cls):
         """Check if the database is connected"""
         return cls.client is not None
 
+    @classmethod
+    async def ping(cls):
+        """Round trip to the server, raising if it can't be reached"""
+        if cls.client is None:
+            raise ConnectionError("Not connected to MongoDB")
+        await cls.client.admin.command("ping")
+
     @classmethod
     async def get_by_code(cls, dtc_code: str):
         """Get DTC information by code"""
@@ -195,8 +139,8 @@ class DTCDatabase:
 
     @classmethod
     async def count_documents(cls):
-        """Get total number of documents"""
-        return await cls.collection.count_documents({})
+        """Get total number of documents, from collection metadata rather than a scan"""
+        return await cls.collection.estimated_document_count()
 
     @classmethod
     async def get_latest_document(cls):
@@ -214,13 +158,12 @@ async def test_connection():
     try:
         await dtc_db.connect()
         count = await dtc_db.count_documents()
-        print(f"Total DTC codes: {count}")
+        logger.info("Total DTC codes: %s", count)
         await dtc_db.close()
-        print("Connection test completed successfully")
+        logger.info("Connection test completed successfully")
     except Exception as e:
-        print(f"Connection test failed: {e}")
+        logger.error("Connection test failed: %s", e)
         raise e
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(test_connection())
\ No newline at end of file
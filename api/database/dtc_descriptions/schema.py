@@ -1,9 +1,13 @@
 # app/database/dtc_schema.py
 
+import logging
 from motor.motor_asyncio import AsyncIOMotorClient
+from api.config import DatabaseConfig
 import asyncio
 import time
 
+logger = logging.getLogger(__name__)
+
 def create_schema_validation():
     """Create MongoDB schema validation rules for DTC Descriptions"""
     dtc_schema = {
@@ -98,16 +102,16 @@ def create_schema_validation():
     return dtc_schema
 
 async def create_indexes(collection):
-    """Create necessary indexes for DTC collection"""
-    await collection.create_index("DTC", unique=True)
-    await collection.create_index("Name")
-    await collection.create_index("SEVERITY")
-    await collection.create_index("Component")
+    """Create necessary indexes for DTC collection, leaving existing ones alone"""
+    existing = await collection.index_information()
+    for field, options in (("DTC", {"unique": True}), ("Name", {}), ("SEVERITY", {}), ("Component", {})):
+        if f"{field}_1" not in existing:
+            await collection.create_index(field, **options)
 
 async def setup_test_collection():
     """Setup test collection with schema and run tests"""
     # Connect to MongoDB
-    client = AsyncIOMotorClient('mongodb://localhost:27017/')
+    client = AsyncIOMotorClient(DatabaseConfig.uri)
     db = client['DTC_Descriptions_Test']
     
     # Create collection with schema validation
@@ -174,34 +178,34 @@ async def test_schema():
         }
     ]
     
-    print("\nRunning schema validation tests:")
+    logger.info("Running schema validation tests:")
     
     # Test valid document
     try:
         result = await collection.insert_one(valid_doc)
-        print("✓ Valid document inserted successfully")
+        logger.info("Valid document inserted successfully")
         
         # Verify retrieval
         retrieved = await collection.find_one({"DTC": "2630-0"})
-        print(f"✓ Document retrieved successfully with DTC: {retrieved['DTC']}")
+        logger.info("Document retrieved successfully with DTC: %s", retrieved['DTC'])
         
     except Exception as e:
-        print(f"❌ Error with valid document: {str(e)}")
+        logger.error("Error with valid document: %s", e)
     
     # Test invalid documents
     for i, doc in enumerate(invalid_docs, 1):
         try:
             result = await collection.insert_one(doc)
-            print(f"❌ Invalid document {i} was inserted (shouldn't happen)")
+            logger.warning("Invalid document %s was inserted (shouldn't happen)", i)
         except Exception as e:
-            print(f"✓ Invalid document {i} correctly rejected: {type(e).__name__}")
+            logger.info("Invalid document %s correctly rejected: %s", i, type(e).__name__)
     
     # Test index uniqueness
     try:
         await collection.insert_one(valid_doc)  # Try to insert same DTC code
-        print("❌ Duplicate DTC code was inserted (shouldn't happen)")
+        logger.warning("Duplicate DTC code was inserted (shouldn't happen)")
     except Exception as e:
-        print("✓ Duplicate DTC code correctly rejected")
+        logger.info("Duplicate DTC code correctly rejected")
 
 if __name__ == "__main__":
     asyncio.run(test_schema())
\ No newline at end of file
@@ -0,0 +1,92 @@
+# dtc_descriptions/sync.py
+"""
+Incremental sync of dtc_codes from dtc_descriptions.xlsx.
+
+The workbook's SHA-256, together with SYNC_VERSION, is recorded in the
+dtc_sync metadata document after each sync; while it matches, startup
+skips the import without opening the workbook. Otherwise every row becomes
+a document carrying a `row_hash` of its content, and only the rows whose
+hash differs from the stored one are written, plus deletes for codes no
+longer in the workbook, in one unordered bulk_write keyed on DTC. The
+collection is never emptied, so lookups keep working during a sync and
+several instances can sync at once.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, List, Tuple
+import openpyxl
+
+logger = logging.getLogger(__name__)
+
+WORKBOOK_PATH = os.path.join(os.path.dirname(__file__), "dtc_descriptions.xlsx")
+# Bump when the row -> document mapping changes, so the next start re-syncs an unchanged workbook
+SYNC_VERSION = 1
+SYNC_STATE_ID = "dtc_codes"
+
+# Document field -> workbook column
+COLUMNS = {
+    "Name": "Name",
+    "Title": "Title",
+    "DTC": "DTC",
+    "Component": "Component",
+    "SEVERITY": "SEVERITY\n(Critical Y/N)",
+    "Driver_reaction": "Driver reaction",
+    "Test_Condition": "Test Condition",
+    "Fault_Detection": "Fault Detection",
+    "Performance_Limiter": "Performance Limiter",
+    "Residual_torque": "Residual torque [%]",
+    "RED_LAMP": "RED LAMP",
+    "Amber_Lamp": "Amber Lamp",
+    "MIL": "MIL",
+    "Validation": "Validation (MIL ON)",
+    "Healing": "Healing (MIL OFF)",
+}
+
+def workbook_hash(path: str = WORKBOOK_PATH) -> str:
+    """SHA-256 of the workbook file and the mapping version"""
+    digest = hashlib.sha256(f"v{SYNC_VERSION}:".encode())
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def row_hash(document: dict) -> str:
+    content = {key: value for key, value in document.items() if key != "row_hash"}
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+def read_documents(path: str = WORKBOOK_PATH) -> List[dict]:
+    """One dtc_codes document per workbook row, each with its row_hash (blocking; run it off the loop)"""
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = next(rows)
+        documents = []
+        for values in rows:
+            if all(value is None for value in values):
+                continue
+            row = {header: str(value) if value is not None else "" for header, value in zip(headers, values)}
+            document = {field: row.get(column, "") for field, column in COLUMNS.items()}
+            document["SEVERITY"] = document["SEVERITY"].lower()
+            document["row_hash"] = row_hash(document)
+            documents.append(document)
+        return documents
+    finally:
+        workbook.close()
+
+def diff_rows(stored: Dict[str, str], documents: List[dict]) -> Tuple[List[dict], List[str]]:
+    """
+    The documents to upsert and the DTC codes to delete to turn the stored
+    {DTC: row_hash} into `documents`. A code repeated in the workbook keeps
+    its last row.
+    """
+    wanted: Dict[str, dict] = {}
+    for document in documents:
+        if document["DTC"] in wanted:
+            logger.warning("DTC %s appears more than once in the workbook; keeping the last row", document["DTC"])
+        wanted[document["DTC"]] = document
+    upserts = [document for code, document in wanted.items() if stored.get(code) != document["row_hash"]]
+    deletes = [code for code in stored if code not in wanted]
+    return upserts, deletes
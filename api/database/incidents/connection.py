@@ -1,170 +1,411 @@
 # incidents/connection.py
 
+import logging
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from dotenv import load_dotenv
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 import os
-from .schema import create_schema_validation, create_indexes
+from .schema import ROLLUP_INDEXES, TIMESERIES_INCIDENT_INDEXES, create_schema_validation, create_indexes
 from api.models.IncidentWebhook import IncidentModel
 from api.config import DatabaseConfig
+from api.database.protocols import IncidentStore
+from api.services.metrics import MONGO_OPERATION_SECONDS, instrumented
+from .errors import duplicate_key_message, is_duplicate_key_error
+from .geo import near_pipeline, within_query
+from .rollups import DAY, HOUR, ROLLUP_COLLECTIONS, ROLLUP_FIELDS, counts_pipeline, floor_to, rollup_pipeline
+from .memory import MemoryIncidentDatabase
+from .timeseries import from_timeseries, timeseries_field, timeseries_options, timeseries_query, to_timeseries
 import asyncio
 
+logger = logging.getLogger(__name__)
+
 # Load environment variables
 load_dotenv()
 
 # Get environment variables
-ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-DB_NAME = "blue_energy"
-if ENVIRONMENT == "test":
-    DB_NAME = "blue_energy_test"
 
+@instrumented(MONGO_OPERATION_SECONDS, database="incidents")
 class IncidentDatabase:
     client: AsyncIOMotorClient = None
     db = None
     collection = None
-    _test_data = {}  # In-memory storage for testing
+    orphans = None
+    # "hour" and "day" rollup collections, and the refresh watermark
+    rollups = {}
+    rollup_state = None
     
     @classmethod
     async def connect(cls):
         """Connect to MongoDB and initialize database"""
         try:
-            if os.getenv("ENVIRONMENT") == "test":
-                cls._test_data = {}  # Reset test data
-                print("Connected to MongoDB - Database: blue_energy_test")
-            else:
-                # Get the current event loop
-                loop = asyncio.get_event_loop()
-                
-                # Create a new client with the current event loop
-                cls.client = AsyncIOMotorClient(
-                    DatabaseConfig.uri,
-                    io_loop=loop,
-                    serverSelectionTimeoutMS=5000
-                )
-                cls.db = cls.client["blue_energy"]
-                collections = await cls.db.list_collection_names()
-                
-                # Setup collection if it doesn't exist
-                if "incidents" not in collections:
-                    await cls.db.create_collection(
-                        "incidents",
-                        validator=create_schema_validation()
-                    )
-                    await create_indexes(cls.db.incidents)
-                
-                cls.collection = cls.db.incidents
-                print(f"Connected to MongoDB - Database: {cls.db.name}")
+            # Get the current event loop
+            loop = asyncio.get_event_loop()
+            
+            # Create a new client with the current event loop
+            cls.client = AsyncIOMotorClient(
+                DatabaseConfig.uri,
+                io_loop=loop,
+                serverSelectionTimeoutMS=5000
+            )
+            cls.db = cls.client["blue_energy"]
+            await cls._setup_collection()
+            
+            cls.collection = cls.db.incidents
+            cls.orphans = cls.db.orphaned_incidents
+            cls.rollups = {granularity: cls.db[name] for granularity, name in ROLLUP_COLLECTIONS.items()}
+            cls.rollup_state = cls.db.incident_rollup_state
+            for rollup in cls.rollups.values():
+                await create_indexes(rollup, ROLLUP_INDEXES)
+            logger.info("Connected to MongoDB - Database: %s", cls.db.name)
             
         except Exception as e:
-            print(f"Error connecting to MongoDB: {e}")
+            logger.error("Error connecting to MongoDB: %s", e)
             raise e
 
+    @classmethod
+    async def _setup_collection(cls):
+        collections = await cls.db.list_collection_names()
+        
+        # Setup collection if it doesn't exist
+        if "incidents" not in collections:
+            await cls.db.create_collection(
+                "incidents",
+                validator=create_schema_validation()
+            )
+        else:
+            # Keep the validator in step with IncidentModel, e.g. across the move to GeoJSON locations
+            await cls.db.command("collMod", "incidents", validator=create_schema_validation())
+        await create_indexes(cls.db.incidents)
+
+    # How incidents are laid out in the collection; TimeSeriesIncidentDatabase stores them differently
+    _sort = [("timestamp", -1), ("_id", -1)]
+    _latest_sort = [("_id", -1)]
+
+    @staticmethod
+    def _stored_query(query: dict) -> dict:
+        return query
+
+    @staticmethod
+    def _stored_field(field: str) -> str:
+        return field
+
+    @staticmethod
+    def _to_stored(document: dict) -> dict:
+        return document
+
+    @staticmethod
+    def _from_stored(document: Optional[dict]) -> Optional[dict]:
+        return document
+
+    @classmethod
+    def _document(cls, payload: IncidentModel) -> dict:
+        data = payload.model_dump(by_alias=True)
+        if "_id" not in data:
+            data["_id"] = str(data.get("incident_id"))
+        return cls._to_stored(data)
+
     @classmethod
     async def close(cls):
         """Close MongoDB connection"""
-        if cls.client and not os.getenv("ENVIRONMENT") == "test":
+        if cls.client:
             cls.client.close()
-            print(f"Closed connection to database: {cls.db.name}")
+            logger.info("Closed connection to database: %s", cls.db.name)
 
     @classmethod
     async def get_by_vehicle(cls, vehicle_id: str):
         """Get incidents by vehicle ID"""
-        if os.getenv("ENVIRONMENT") == "test":
-            return [doc for doc in cls._test_data.values() if doc["vehicle_id"] == vehicle_id]
-        else:
-            cursor = cls.collection.find({"vehicle_id": vehicle_id})
-            return await cursor.to_list(length=100)
+        cursor = cls.collection.find(cls._stored_query({"vehicle_id": vehicle_id}))
+        return [cls._from_stored(document) for document in await cursor.to_list(length=100)]
 
     @classmethod
     async def get_by_account(cls, account_id: str):
         """Get incidents by account ID"""
-        if os.getenv("ENVIRONMENT") == "test":
-            return [doc for doc in cls._test_data.values() if doc["account_id"] == account_id]
-        else:
-            cursor = cls.collection.find({"account_id": account_id})
-            return await cursor.to_list(length=100)
+        cursor = cls.collection.find(cls._stored_query({"account_id": account_id}))
+        return [cls._from_stored(document) for document in await cursor.to_list(length=100)]
+
+    @staticmethod
+    def _incident_query(
+        filters: Dict[str, str],
+        since: Optional[int],
+        until: Optional[int],
+        after: Optional[Tuple[int, str]]
+    ) -> dict:
+        query = dict(filters)
+        time_range = {}
+        if since is not None:
+            time_range["$gte"] = since
+        if until is not None:
+            time_range["$lt"] = until
+        if after is not None:
+            timestamp, incident_id = after
+            # The bound starts the index scan at the cursor; the $or only settles ties on its timestamp
+            time_range["$lte"] = timestamp
+            query["$or"] = [
+                {"timestamp": {"$lt": timestamp}},
+                {"timestamp": timestamp, "_id": {"$lt": incident_id}}
+            ]
+        if time_range:
+            query["timestamp"] = time_range
+        return query
+
+    @classmethod
+    def _incident_cursor(cls, filters, since, until, after, fields):
+        projection = {cls._stored_field(field): 1 for field in ["timestamp", *fields]} if fields else None
+        return cls.collection.find(
+            cls._stored_query(cls._incident_query(filters, since, until, after)), projection
+        ).sort(cls._sort)
+
+    @classmethod
+    async def find_incidents(
+        cls,
+        filters: Dict[str, str],
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        after: Optional[Tuple[int, str]] = None,
+        limit: int = 100,
+        fields: Optional[List[str]] = None
+    ) -> List[dict]:
+        """
+        Incidents equal to `filters` with since <= timestamp < until, newest
+        first by (timestamp, _id). `after` is the (timestamp, _id) of the last
+        incident of the previous page; the next page starts right after it,
+        so paging never skips over earlier pages. `fields` limits what comes
+        back; _id and timestamp are always included.
+        """
+        cursor = cls._incident_cursor(filters, since, until, after, fields).limit(limit)
+        return [cls._from_stored(document) for document in await cursor.to_list(length=limit)]
+
+    @classmethod
+    async def iter_incidents(
+        cls,
+        filters: Dict[str, str],
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        after: Optional[Tuple[int, str]] = None,
+        batch_size: int = 1000,
+        fields: Optional[List[str]] = None
+    ) -> AsyncIterator[dict]:
+        """Every incident find_incidents would page through, fetched `batch_size` at a time from one cursor"""
+        cursor = cls._incident_cursor(filters, since, until, after, fields).batch_size(batch_size)
+        try:
+            async for document in cursor:
+                yield cls._from_stored(document)
+        finally:
+            await cursor.close()
+
+    @classmethod
+    async def find_near(
+        cls,
+        longitude: float,
+        latitude: float,
+        radius_km: float,
+        filters: Dict[str, str],
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        limit: int = 100
+    ) -> List[dict]:
+        """Incidents equal to `filters` within `radius_km` of the point, nearest first, each with its distance_km"""
+        query = cls._stored_query(cls._incident_query(filters, since, until, None))
+        cursor = cls.collection.aggregate(near_pipeline(longitude, latitude, radius_km, query, limit))
+        return [cls._from_stored(document) for document in await cursor.to_list(length=limit)]
+
+    @classmethod
+    async def find_within(
+        cls,
+        geometry: dict,
+        filters: Dict[str, str],
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        limit: int = 100
+    ) -> List[dict]:
+        """Incidents equal to `filters` inside the GeoJSON polygon `geometry`, newest first"""
+        query = cls._stored_query(within_query(geometry, cls._incident_query(filters, since, until, None)))
+        cursor = cls.collection.find(query).sort(cls._sort).limit(limit)
+        return [cls._from_stored(document) for document in await cursor.to_list(length=limit)]
+
+    @classmethod
+    async def refresh_rollups(cls, since: int, until: int):
+        """
+        Recount the hourly rollups from the incidents in [since, until),
+        widened to whole hours, then re-sum the whole days those hours fall
+        in from the hourly rollups.
+        Records `until` as the refresh watermark.
+        """
+        hours = cls._stored_query({"timestamp": {"$gte": floor_to(since, HOUR), "$lt": until}})
+        fields = {field: cls._stored_field(field) for field in ROLLUP_FIELDS}
+        await cls.collection.aggregate(
+            rollup_pipeline(hours, fields, "timestamp", HOUR, {"$sum": 1}, ROLLUP_COLLECTIONS["hour"])
+        ).to_list(length=None)
+
+        # Whole days, including hours after `until` counted by earlier refreshes
+        days = {"start": {"$gte": floor_to(since, DAY), "$lt": floor_to(until - 1, DAY) + DAY}}
+        await cls.rollups["hour"].aggregate(
+            rollup_pipeline(days, {field: field for field in ROLLUP_FIELDS}, "start", DAY, {"$sum": "$count"}, ROLLUP_COLLECTIONS["day"])
+        ).to_list(length=None)
+        await cls.rollup_state.update_one({"_id": "rollups"}, {"$max": {"refreshed_until": until}}, upsert=True)
+
+    @classmethod
+    async def rollups_refreshed_until(cls) -> Optional[int]:
+        """Up to when the rollups were last refreshed, None before the first refresh"""
+        state = await cls.rollup_state.find_one({"_id": "rollups"})
+        return state["refreshed_until"] if state else None
+
+    @classmethod
+    async def rollup_counts(
+        cls,
+        granularity: str,
+        filters: Dict[str, str],
+        since: int,
+        until: int,
+        bucket_seconds: int,
+        group_by: List[str]
+    ) -> List[dict]:
+        """
+        Incident counts from the `granularity` ("hour" or "day") rollups,
+        summed into `bucket_seconds`-long buckets by the `group_by` fields:
+        [{start, <group_by fields>, count}], oldest bucket first and the
+        largest count first within a bucket.
+        """
+        cursor = cls.rollups[granularity].aggregate(counts_pipeline(filters, since, until, bucket_seconds, group_by))
+        return await cursor.to_list(length=None)
 
     @classmethod
     async def count_documents(cls):
-        """Get total number of documents"""
-        if os.getenv("ENVIRONMENT") == "test":
-            return len(cls._test_data)
-        else:
-            return await cls.collection.count_documents({})
+        """Get total number of documents, from collection metadata rather than a scan"""
+        return await cls.collection.estimated_document_count()
     
     @classmethod
     async def store_incident_data(cls, payload: IncidentModel):
-        """Store incident data"""
+        """Store incident data, raising DuplicateKeyError if it is already stored"""
+        try:
+            await cls.collection.insert_one(cls._document(payload))
+        except DuplicateKeyError as e:
+            # A retried webhook, not a failure; the caller decides what to report
+            raise e
+        except Exception as e:
+            logger.error("Error storing incident data: %s", e)
+            raise e
+
+    @classmethod
+    async def store_many_incidents(cls, payloads: List[IncidentModel]) -> Dict[int, str]:
+        """Store incidents with one unordered insert_many; returns error messages keyed by payload index"""
+        try:
+            documents = [cls._document(payload) for payload in payloads]
+            try:
+                await cls.collection.insert_many(documents, ordered=False)
+                return {}
+            except BulkWriteError as e:
+                return {err["index"]: err["errmsg"] for err in e.details.get("writeErrors", [])}
+        except Exception as e:
+            logger.error("Error storing incident data: %s", e)
+            raise e
+
+    @classmethod
+    async def archive_orphans(cls, documents: List[dict]):
+        """Keep swept, never-completed partials in orphaned_incidents for later analysis"""
         try:
-            data = payload.model_dump(by_alias=True)
-            if "_id" not in data:
-                data["_id"] = str(data.get("incident_id"))
-            if os.getenv("ENVIRONMENT") == "test":
-                cls._test_data[data["_id"]] = data
-            else:
-                await cls.collection.insert_one(data)
+            await cls.orphans.insert_many(documents, ordered=False)
         except Exception as e:
-            print(f"Error storing incident data: {str(e)}")
+            logger.error("Error archiving orphaned partials: %s", e)
             raise e
 
     @classmethod
     async def get_incident_data(cls, incident_id: str):
         """Get incident data by ID"""
-        if os.getenv("ENVIRONMENT") == "test":
-            return cls._test_data.get(incident_id)
-        else:
-            return await cls.collection.find_one({"_id": incident_id})
+        return cls._from_stored(await cls.collection.find_one({"_id": incident_id}))
     
     @classmethod
     async def get_latest_document(cls):
         """Get the latest document"""
-        if os.getenv("ENVIRONMENT") == "test":
-            if not cls._test_data:
-                return None
-            latest_id = max(cls._test_data.keys())
-            return cls._test_data[latest_id]
-        else:
-            document = await cls.collection.find_one(sort=[("_id", -1)])
-            if document and "_id" in document:
-                document["_id"] = str(document["_id"])
-            return document
+        document = cls._from_stored(await cls.collection.find_one(sort=cls._latest_sort))
+        if document and "_id" in document:
+            document["_id"] = str(document["_id"])
+        return document
 
     @classmethod
     async def is_connected(cls):
         """Check if the database is connected"""
-        if os.getenv("ENVIRONMENT") == "test":
-            return True
-        else:
-            return cls.client is not None
+        return cls.client is not None
+
+    @classmethod
+    async def ping(cls):
+        """Round trip to the server, raising if it can't be reached"""
+        if cls.client is None:
+            raise ConnectionError("Not connected to MongoDB")
+        await cls.client.admin.command("ping")
 
     @classmethod
     async def delete_many(cls, filter_query=None):
         """Delete multiple documents matching the filter query"""
         try:
-            if os.getenv("ENVIRONMENT") == "test":
-                cls._test_data = {}
-                return len(cls._test_data)
-            else:
-                if filter_query is None:
-                    filter_query = {}
-                result = await cls.collection.delete_many(filter_query)
-                return result.deleted_count
+            if filter_query is None:
+                filter_query = {}
+            result = await cls.collection.delete_many(cls._stored_query(filter_query))
+            return result.deleted_count
         except Exception as e:
-            print(f"Error deleting documents: {e}")
+            logger.error("Error deleting documents: %s", e)
             raise e
 
-incident_db = IncidentDatabase()
+@instrumented(MONGO_OPERATION_SECONDS, database="incidents")
+class TimeSeriesIncidentDatabase(IncidentDatabase):
+    """IncidentDatabase over a time-series collection; see timeseries.py for the stored shape"""
+    _sort = [("time", -1), ("_id", -1)]
+    # No _id order to lean on, so "latest" is the most recent incident
+    _latest_sort = _sort
+    _stored_query = staticmethod(timeseries_query)
+    _stored_field = staticmethod(timeseries_field)
+    _to_stored = staticmethod(to_timeseries)
+    _from_stored = staticmethod(from_timeseries)
+
+    @classmethod
+    async def _setup_collection(cls):
+        found = (await cls.db.command("listCollections", filter={"name": "incidents"}))["cursor"]["firstBatch"]
+        options = timeseries_options()
+        if not found:
+            await cls.db.create_collection("incidents", **options)
+        elif found[0].get("type") != "timeseries":
+            raise RuntimeError(
+                "incidents is a regular collection; migrate it with "
+                "`python -m api.database.incidents.timeseries` before setting INCIDENT_STORAGE=timeseries"
+            )
+        else:
+            current = found[0]["options"]
+            expire = options.get("expireAfterSeconds", "off")
+            if current.get("expireAfterSeconds", "off") != expire:
+                await cls.db.command("collMod", "incidents", expireAfterSeconds=expire)
+                logger.info("Incident retention set to %s seconds", expire)
+            if current["timeseries"].get("granularity") != options["timeseries"]["granularity"]:
+                logger.warning(
+                    "incidents keeps its time-series granularity %s; %s needs a new collection",
+                    current["timeseries"].get("granularity"), options["timeseries"]["granularity"]
+                )
+        await create_indexes(cls.db.incidents, TIMESERIES_INCIDENT_INDEXES)
+
+    @classmethod
+    async def count_documents(cls):
+        """Get total number of documents; a time-series collection is a view with no stored count"""
+        return await cls.collection.count_documents({})
+
+# Resolved once per process; the test suite and local simulations run without Mongo
+if DatabaseConfig.backend == "memory":
+    incident_db: IncidentStore = MemoryIncidentDatabase()
+elif DatabaseConfig.storage == "timeseries":
+    incident_db = TimeSeriesIncidentDatabase()
+else:
+    incident_db = IncidentDatabase()
 
 # Test connection
 async def test_connection():
     try:
         await incident_db.connect()
         count = await incident_db.count_documents()
-        print(f"Total incidents: {count}")
+        logger.info("Total incidents: %s", count)
         await incident_db.close()
-        print("Connection test completed successfully")
+        logger.info("Connection test completed successfully")
     except Exception as e:
-        print(f"Connection test failed: {e}")
+        logger.error("Connection test failed: %s", e)
         raise e
 
 if __name__ == "__main__":
@@ -0,0 +1,11 @@
+# incidents/errors.py
+
+from api.config import DatabaseConfig
+
+def duplicate_key_message(incident_id: str) -> str:
+    """Mongo's message for an insert whose _id is already stored"""
+    return f'E11000 duplicate key error collection: {DatabaseConfig.name}.incidents index: _id_ dup key: {{ _id: "{incident_id}" }}'
+
+def is_duplicate_key_error(message: str) -> bool:
+    """Whether a write error message from store_many_incidents means the incident was already stored"""
+    return message.startswith("E11000")
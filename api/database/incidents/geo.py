@@ -0,0 +1,135 @@
+# incidents/geo.py
+"""
+Map queries over incident locations, and the backfill to GeoJSON.
+
+Incidents store `location` as a GeoJSON point, {"type": "Point",
+"coordinates": [longitude, latitude]}, which the location_2dsphere index
+(schema.py) reads. Two query shapes use it:
+
+    near      incidents within a radius of a point, nearest first ($geoNear)
+    within    incidents inside a polygon such as a map's bounding box, newest first ($geoWithin)
+
+Distances are great-circle distances in kilometres and polygon edges are
+great-circle arcs; for a box the size of a city that is indistinguishable
+from lines of constant latitude.
+
+Incidents stored before the move to GeoJSON have a {latitude, longitude}
+location, which the index reads as a legacy pair with the latitude taken
+for the longitude. Once the app has been deployed (connecting brings the
+collection's validator up to date), convert them with
+
+    python -m api.database.incidents.geo [--batch-size 1000]
+
+It only touches documents still in the old shape, so it can be rerun after
+an interruption. Run it before migrating to a time-series collection
+(timeseries.py); updating measurements of a time-series collection needs
+MongoDB 7.0 or later.
+"""
+
+import argparse
+import asyncio
+import logging
+import math
+from typing import List, Sequence
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from api.config import DatabaseConfig
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+# Set on every `near` result
+DISTANCE_FIELD = "distance_km"
+LEGACY_LOCATION = {"location.latitude": {"$exists": True}}
+
+def point(longitude: float, latitude: float) -> dict:
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+def bbox_polygon(min_longitude: float, min_latitude: float, max_longitude: float, max_latitude: float) -> dict:
+    """The GeoJSON polygon of a bounding box, corners counter-clockwise"""
+    return {"type": "Polygon", "coordinates": [[
+        [min_longitude, min_latitude], [max_longitude, min_latitude],
+        [max_longitude, max_latitude], [min_longitude, max_latitude],
+        [min_longitude, min_latitude],
+    ]]}
+
+def to_geojson(location: dict) -> dict:
+    """A {latitude, longitude} location as a GeoJSON point"""
+    return point(location["longitude"], location["latitude"])
+
+def near_pipeline(longitude: float, latitude: float, radius_km: float, query: dict, limit: int) -> List[dict]:
+    """Aggregation for the `limit` incidents matching `query` nearest to the point, at most `radius_km` away"""
+    return [
+        {"$geoNear": {
+            "near": point(longitude, latitude),
+            "key": "location",
+            "spherical": True,
+            "maxDistance": radius_km * 1000,
+            # $geoNear measures in metres
+            "distanceField": DISTANCE_FIELD,
+            "distanceMultiplier": 0.001,
+            "query": query,
+        }},
+        {"$limit": limit},
+    ]
+
+def within_query(geometry: dict, query: dict) -> dict:
+    """`query` narrowed to incidents inside the GeoJSON polygon `geometry`"""
+    return {**query, "location": {"$geoWithin": {"$geometry": geometry}}}
+
+# The same tests in process, for MemoryIncidentDatabase
+
+def distance_km(a: Sequence[float], b: Sequence[float]) -> float:
+    """Great-circle distance between two [longitude, latitude] points"""
+    lng1, lat1, lng2, lat2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+def _in_ring(coordinates: Sequence[float], ring: List[List[float]]) -> bool:
+    # Ray casting in the plane, which is close enough for polygons much smaller than a hemisphere
+    x, y = coordinates
+    inside = False
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:]):
+        if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+    return inside
+
+def in_polygon(coordinates: Sequence[float], geometry: dict) -> bool:
+    """Whether a [longitude, latitude] point is inside the polygon's outer ring and outside its holes"""
+    outer, *holes = geometry["coordinates"]
+    return _in_ring(coordinates, outer) and not any(_in_ring(coordinates, hole) for hole in holes)
+
+async def backfill(collection, batch_size: int = 1000) -> int:
+    """Rewrite {latitude, longitude} locations as GeoJSON points; returns how many were converted"""
+    converted = 0
+    batch: List[UpdateOne] = []
+    async for document in collection.find(LEGACY_LOCATION, {"location": 1}).batch_size(batch_size):
+        batch.append(UpdateOne({"_id": document["_id"]}, {"$set": {"location": to_geojson(document["location"])}}))
+        if len(batch) >= batch_size:
+            converted += (await collection.bulk_write(batch, ordered=False)).modified_count
+            batch = []
+            logger.info("Converted %s incident locations", converted)
+    if batch:
+        converted += (await collection.bulk_write(batch, ordered=False)).modified_count
+    return converted
+
+async def main(batch_size: int):
+    client = AsyncIOMotorClient(DatabaseConfig.uri)
+    try:
+        incidents = client["blue_energy"].incidents
+        converted = await backfill(incidents, batch_size)
+        remaining = await incidents.count_documents(LEGACY_LOCATION)
+        logger.info("Converted %s incident locations to GeoJSON; %s left in the old shape", converted, remaining)
+        if remaining:
+            raise SystemExit("Some locations were not converted; rerun to retry them")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    from api.log import setup_logging
+
+    parser = argparse.ArgumentParser(description="Convert incident locations to GeoJSON points")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    setup_logging()
+    asyncio.run(main(args.batch_size))
@@ -0,0 +1,326 @@
+# incidents/memory.py
+
+import heapq
+import logging
+from itertools import islice
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from pymongo.errors import DuplicateKeyError
+from api.models.IncidentWebhook import IncidentModel
+from api.services.metrics import MONGO_OPERATION_SECONDS, instrumented
+from .errors import duplicate_key_message
+from .geo import DISTANCE_FIELD, distance_km, in_polygon
+from .rollups import DAY, HOUR, ROLLUP_FIELDS, ROLLUP_SECONDS, floor_to
+
+logger = logging.getLogger(__name__)
+
+@instrumented(MONGO_OPERATION_SECONDS, database="incidents")
+class MemoryIncidentDatabase:
+    """
+    In-process implementation of the incident store, for the test suite and
+    local simulations (INCIDENT_BACKEND=memory). Nothing survives a restart.
+
+    Documents are kept by _id, with the same secondary indexes as the Mongo
+    collection (account_id, vehicle_id) as value -> ids maps in insertion
+    order, so lookups cost the size of the result rather than of the store.
+    Like Mongo, a repeated _id raises DuplicateKeyError and lookups return
+    at most `max_results` documents.
+    """
+    indexed_fields = ("account_id", "vehicle_id")
+    max_results: int = 100
+
+    _documents: Dict[str, dict] = {}
+    # field -> value -> {_id: None}, a dict used as an insertion-ordered set
+    _indexes: Dict[str, Dict[str, Dict[str, None]]] = {}
+    _latest_id: Optional[str] = None
+    _orphans: List[dict] = []
+    # "hour"/"day" -> (account_id, vehicle_id, dtc_code, start) -> count
+    _rollups: Dict[str, Dict[tuple, int]] = {}
+    _rollups_until: Optional[int] = None
+    _connected: bool = False
+
+    @classmethod
+    async def connect(cls):
+        """Start from an empty store"""
+        cls._documents = {}
+        cls._indexes = {field: {} for field in cls.indexed_fields}
+        cls._latest_id = None
+        cls._orphans = []
+        cls._rollups = {granularity: {} for granularity in ROLLUP_SECONDS}
+        cls._rollups_until = None
+        cls._connected = True
+        logger.info("Connected to in-memory incident store")
+
+    @classmethod
+    async def close(cls):
+        cls._connected = False
+        logger.info("Closed in-memory incident store")
+
+    @classmethod
+    async def is_connected(cls):
+        """Check if the store has been connected"""
+        return cls._connected
+
+    @classmethod
+    async def ping(cls):
+        """Raise unless the store has been connected"""
+        if not cls._connected:
+            raise ConnectionError("In-memory incident store is not connected")
+
+    @classmethod
+    async def get_by_vehicle(cls, vehicle_id: str):
+        """Get incidents by vehicle ID"""
+        return cls._lookup("vehicle_id", vehicle_id)
+
+    @classmethod
+    async def get_by_account(cls, account_id: str):
+        """Get incidents by account ID"""
+        return cls._lookup("account_id", account_id)
+
+    @classmethod
+    async def find_incidents(
+        cls,
+        filters: Dict[str, str],
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        after: Optional[Tuple[int, str]] = None,
+        limit: int = 100,
+        fields: Optional[List[str]] = None
+    ) -> List[dict]:
+        """Incidents equal to `filters` in [since, until), newest first by (timestamp, _id) after `after`"""
+        page = heapq.nlargest(
+            limit,
+            (
+                doc for doc in cls._window(filters, since, until)
+                if after is None or (doc["timestamp"], doc["_id"]) < after
+            ),
+            key=lambda doc: (doc["timestamp"], doc["_id"])
+        )
+        if fields:
+            keep = {"_id", "timestamp", *fields}
+            page = [{key: value for key, value in doc.items() if key in keep} for doc in page]
+        return page
+
+    @classmethod
+    async def iter_incidents(
+        cls,
+        filters: Dict[str, str],
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        after: Optional[Tuple[int, str]] = None,
+        batch_size: int = 1000,
+        fields: Optional[List[str]] = None
+    ) -> AsyncIterator[dict]:
+        """Every incident find_incidents would page through, one keyset page of `batch_size` at a time"""
+        while True:
+            page = await cls.find_incidents(filters, since, until, after, batch_size, fields)
+            for document in page:
+                yield document
+            if len(page) < batch_size:
+                return
+            after = (page[-1]["timestamp"], page[-1]["_id"])
+
+    @classmethod
+    async def find_near(
+        cls,
+        longitude: float,
+        latitude: float,
+        radius_km: float,
+        filters: Dict[str, str],
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        limit: int = 100
+    ) -> List[dict]:
+        """Incidents equal to `filters` within `radius_km` of the point, nearest first, each with its distance_km"""
+        center = (longitude, latitude)
+        distances = (
+            (distance_km(center, doc["location"]["coordinates"]), doc)
+            for doc in cls._window(filters, since, until)
+        )
+        nearest = heapq.nsmallest(
+            limit,
+            ((distance, doc) for distance, doc in distances if distance <= radius_km),
+            key=lambda pair: pair[0]
+        )
+        return [{**doc, DISTANCE_FIELD: distance} for distance, doc in nearest]
+
+    @classmethod
+    async def find_within(
+        cls,
+        geometry: dict,
+        filters: Dict[str, str],
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        limit: int = 100
+    ) -> List[dict]:
+        """Incidents equal to `filters` inside the GeoJSON polygon `geometry`, newest first"""
+        return heapq.nlargest(
+            limit,
+            (
+                doc for doc in cls._window(filters, since, until)
+                if in_polygon(doc["location"]["coordinates"], geometry)
+            ),
+            key=lambda doc: (doc["timestamp"], doc["_id"])
+        )
+
+    @classmethod
+    async def refresh_rollups(cls, since: int, until: int):
+        """Recount the hourly rollups in [since, until), widened to whole hours, then re-sum their days"""
+        hour_start = floor_to(since, HOUR)
+        hours = cls._rollups["hour"]
+        for key in [key for key in hours if hour_start <= key[-1] < until]:
+            del hours[key]
+        for doc in cls._window({}, hour_start, until):
+            key = (*(doc.get(field) for field in ROLLUP_FIELDS), floor_to(doc["timestamp"], HOUR))
+            hours[key] = hours.get(key, 0) + 1
+
+        day_start, day_end = floor_to(since, DAY), floor_to(until - 1, DAY) + DAY
+        days = cls._rollups["day"]
+        for key in [key for key in days if day_start <= key[-1] < day_end]:
+            del days[key]
+        for (*fields, start), count in hours.items():
+            if day_start <= start < day_end:
+                key = (*fields, floor_to(start, DAY))
+                days[key] = days.get(key, 0) + count
+        cls._rollups_until = max(until, cls._rollups_until or until)
+
+    @classmethod
+    async def rollups_refreshed_until(cls) -> Optional[int]:
+        """Up to when the rollups were last refreshed, None before the first refresh"""
+        return cls._rollups_until
+
+    @classmethod
+    async def rollup_counts(
+        cls,
+        granularity: str,
+        filters: Dict[str, str],
+        since: int,
+        until: int,
+        bucket_seconds: int,
+        group_by: List[str]
+    ) -> List[dict]:
+        """Incident counts from the `granularity` rollups summed into `bucket_seconds` buckets by `group_by`"""
+        since = floor_to(since, bucket_seconds)
+        counts: Dict[tuple, int] = {}
+        for key, count in cls._rollups[granularity].items():
+            bucket = dict(zip((*ROLLUP_FIELDS, "start"), key))
+            if since <= bucket["start"] < until and cls._matches(bucket, filters):
+                group = (floor_to(bucket["start"], bucket_seconds), *(bucket[field] for field in group_by))
+                counts[group] = counts.get(group, 0) + count
+        rows = [
+            {"start": start, **dict(zip(group_by, values)), "count": count}
+            for (start, *values), count in counts.items()
+        ]
+        return sorted(rows, key=lambda row: (row["start"], -row["count"]))
+
+    @classmethod
+    async def count_documents(cls):
+        """Get total number of documents"""
+        return len(cls._documents)
+
+    @classmethod
+    async def get_incident_data(cls, incident_id: str):
+        """Get incident data by ID"""
+        return cls._documents.get(incident_id)
+
+    @classmethod
+    async def get_latest_document(cls):
+        """Get the document with the highest _id"""
+        return cls._documents[cls._latest_id] if cls._latest_id is not None else None
+
+    @classmethod
+    async def store_incident_data(cls, payload: IncidentModel):
+        """Store incident data, raising DuplicateKeyError if it is already stored"""
+        data = cls._document(payload)
+        if data["_id"] in cls._documents:
+            raise DuplicateKeyError(duplicate_key_message(data["_id"]), code=11000)
+        cls._insert(data)
+
+    @classmethod
+    async def store_many_incidents(cls, payloads: List[IncidentModel]) -> Dict[int, str]:
+        """Store incidents, skipping ones already stored; returns error messages keyed by payload index"""
+        errors = {}
+        for index, payload in enumerate(payloads):
+            data = cls._document(payload)
+            if data["_id"] in cls._documents:
+                errors[index] = duplicate_key_message(data["_id"])
+            else:
+                cls._insert(data)
+        return errors
+
+    @classmethod
+    async def archive_orphans(cls, documents: List[dict]):
+        """Keep swept, never-completed partials for later analysis"""
+        cls._orphans.extend(documents)
+
+    @classmethod
+    async def delete_many(cls, filter_query=None):
+        """Delete the documents equal to every field of `filter_query` (all of them when empty)"""
+        if not filter_query:
+            deleted = len(cls._documents)
+            cls._documents = {}
+            cls._indexes = {field: {} for field in cls.indexed_fields}
+            cls._latest_id = None
+            return deleted
+        ids = [doc["_id"] for doc in cls._candidates(filter_query) if cls._matches(doc, filter_query)]
+        for incident_id in ids:
+            cls._remove(cls._documents[incident_id])
+        return len(ids)
+
+    @staticmethod
+    def _document(payload: IncidentModel) -> dict:
+        data = payload.model_dump(by_alias=True)
+        if "_id" not in data:
+            data["_id"] = str(data.get("incident_id"))
+        return data
+
+    @classmethod
+    def _insert(cls, data: dict):
+        incident_id = data["_id"]
+        cls._documents[incident_id] = data
+        for field in cls.indexed_fields:
+            cls._indexes[field].setdefault(data.get(field), {})[incident_id] = None
+        if cls._latest_id is None or incident_id > cls._latest_id:
+            cls._latest_id = incident_id
+
+    @classmethod
+    def _remove(cls, data: dict):
+        incident_id = data["_id"]
+        del cls._documents[incident_id]
+        for field in cls.indexed_fields:
+            ids = cls._indexes[field].get(data.get(field))
+            if ids is not None:
+                ids.pop(incident_id, None)
+                if not ids:
+                    del cls._indexes[field][data.get(field)]
+        if incident_id == cls._latest_id:
+            cls._latest_id = max(cls._documents, default=None)
+
+    @classmethod
+    def _lookup(cls, field: str, value) -> List[dict]:
+        ids = cls._indexes[field].get(value, {})
+        return [cls._documents[incident_id] for incident_id in islice(ids, cls.max_results)]
+
+    @classmethod
+    def _candidates(cls, filter_query: dict) -> List[dict]:
+        """Documents that may match, narrowed by _id or an index when the filter has one"""
+        if "_id" in filter_query:
+            doc = cls._documents.get(filter_query["_id"])
+            return [doc] if doc else []
+        for field in cls.indexed_fields:
+            if field in filter_query:
+                return [cls._documents[incident_id] for incident_id in cls._indexes[field].get(filter_query[field], {})]
+        return list(cls._documents.values())
+
+    @classmethod
+    def _window(cls, filters: Dict[str, str], since: Optional[int], until: Optional[int]) -> Iterator[dict]:
+        """Documents equal to `filters` with since <= timestamp < until"""
+        return (
+            doc for doc in cls._candidates(filters)
+            if cls._matches(doc, filters)
+            and (since is None or doc["timestamp"] >= since)
+            and (until is None or doc["timestamp"] < until)
+        )
+
+    @staticmethod
+    def _matches(doc: dict, filter_query: dict) -> bool:
+        return all(doc.get(field) == value for field, value in filter_query.items())
@@ -0,0 +1,133 @@
+# incidents/rollup_refresher.py
+"""
+Keeps the incident rollups (rollups.py) current.
+
+Rebuild them for a stretch of history, e.g. once after deploying, or after
+incidents arrived later than ROLLUP_LATENESS_SECONDS:
+
+    python -m api.database.incidents.rollup_refresher --since 1704067200 [--chunk-days 7]
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from typing import Optional, Tuple
+from api.config import RollupConfig
+from .connection import incident_db
+from .rollups import DAY, floor_to
+
+logger = logging.getLogger(__name__)
+
+class RollupRefresher:
+    """
+    Background refresh of the hourly and daily incident rollups.
+
+    Every `interval` seconds the hours from the last refresh, less
+    `lateness` for incidents whose other half arrived late, up to now are
+    recounted and the days they fall in re-summed. A refresh only depends on
+    the incidents in its window, so it is safe on every instance and costs
+    the same however long the history is. After downtime the first refresh
+    covers everything since the last one.
+    """
+    enabled: bool = RollupConfig.enabled
+    interval: int = RollupConfig.interval
+    lateness: int = RollupConfig.lateness
+
+    _task: asyncio.Task = None
+    _stopping: bool = False
+    _wakeup: asyncio.Event = None
+    _stats = {}
+
+    @classmethod
+    def _reset_stats(cls):
+        cls._stats = {
+            "refreshes": 0,
+            "refresh_failures": 0,
+            "last_window": None,
+            "last_refresh_ms": 0.0,
+            "max_refresh_ms": 0.0,
+        }
+
+    @classmethod
+    async def start(cls):
+        """Start the background refresh task"""
+        cls._reset_stats()
+        cls._stopping = False
+        cls._wakeup = asyncio.Event()
+        cls._task = asyncio.create_task(cls._run())
+        logger.info("Rollup refresher started (every %ss, lateness %ss)", cls.interval, cls.lateness)
+
+    @classmethod
+    async def stop(cls, timeout: float = 5.0):
+        """Stop the background refresh task"""
+        if cls._task:
+            cls._stopping = True
+            cls._wakeup.set()
+            done, _ = await asyncio.wait({cls._task}, timeout=timeout)
+            if not done:
+                cls._task.cancel()
+            cls._task = None
+
+    @classmethod
+    async def refresh(cls, until: Optional[int] = None) -> Tuple[int, int]:
+        """Refresh the rollups from the last refresh, less the lateness, to `until` (now); returns the window"""
+        if not cls._stats:
+            cls._reset_stats()
+        until = int(time.time()) if until is None else until
+        refreshed_until = await incident_db.rollups_refreshed_until()
+        since = min(until, refreshed_until or until) - cls.lateness
+
+        started = time.perf_counter()
+        await incident_db.refresh_rollups(since, until)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        cls._stats["refreshes"] += 1
+        cls._stats["last_window"] = [since, until]
+        cls._stats["last_refresh_ms"] = round(elapsed_ms, 2)
+        cls._stats["max_refresh_ms"] = round(max(cls._stats["max_refresh_ms"], elapsed_ms), 2)
+        return since, until
+
+    @classmethod
+    async def _run(cls):
+        while not cls._stopping:
+            try:
+                await cls.refresh()
+            except Exception as e:
+                cls._stats["refresh_failures"] += 1
+                logger.error("Error refreshing incident rollups: %s", e)
+            try:
+                await asyncio.wait_for(cls._wakeup.wait(), timeout=cls.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    @classmethod
+    def stats(cls):
+        """Refresh counters"""
+        return dict(cls._stats)
+
+rollup_refresher = RollupRefresher()
+
+async def rebuild(since: int, until: int, chunk_days: int = 7):
+    """Recount the rollups for [since, until) a few days at a time"""
+    await incident_db.connect()
+    try:
+        start = floor_to(since, DAY)
+        while start < until:
+            end = min(start + chunk_days * DAY, until)
+            await incident_db.refresh_rollups(start, end)
+            logger.info("Rebuilt incident rollups up to %s", end)
+            start = end
+    finally:
+        await incident_db.close()
+
+if __name__ == "__main__":
+    from api.log import setup_logging
+
+    parser = argparse.ArgumentParser(description="Rebuild the incident rollups for a time range")
+    parser.add_argument("--since", type=int, required=True, help="Unix timestamp to rebuild from")
+    parser.add_argument("--until", type=int, default=None, help="Unix timestamp to rebuild to (default now)")
+    parser.add_argument("--chunk-days", type=int, default=7)
+    args = parser.parse_args()
+    setup_logging()
+    asyncio.run(rebuild(args.since, args.until or int(time.time()), args.chunk_days))
@@ -0,0 +1,60 @@
+# incidents/rollups.py
+"""
+Hourly and daily incident counts for the analytics routes.
+
+Two collections hold one document per (account_id, vehicle_id, dtc_code,
+start) bucket with the number of incidents in it:
+
+    incident_rollups_hourly   counted from the incidents
+    incident_rollups_daily    summed from the hourly buckets
+
+A refresh recounts whole buckets over a time window and writes them over
+the stored ones with $merge, so running it twice, or on several instances
+at once, gives the same counts (rollup_refresher.py decides the window).
+Dashboards read a handful of buckets per account and day, however long the
+incident history is. Weekly figures are summed from the daily buckets at
+query time; buckets are aligned so weeks start on Monday 00:00 UTC.
+"""
+
+from typing import Dict, List
+
+HOUR = 3600
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+# Monday 1970-01-05 00:00 UTC; hours and days divide it, so only weeks are shifted
+BUCKET_ORIGIN = 4 * DAY
+
+ROLLUP_FIELDS = ("account_id", "vehicle_id", "dtc_code")
+ROLLUP_COLLECTIONS = {"hour": "incident_rollups_hourly", "day": "incident_rollups_daily"}
+ROLLUP_SECONDS = {"hour": HOUR, "day": DAY}
+
+def floor_to(timestamp: int, seconds: int) -> int:
+    """Start of the `seconds`-long bucket holding `timestamp`"""
+    return timestamp - (timestamp - BUCKET_ORIGIN) % seconds
+
+def _bucket(field: str, seconds: int) -> dict:
+    return {"$subtract": [field, {"$mod": [{"$subtract": [field, BUCKET_ORIGIN]}, seconds]}]}
+
+def rollup_pipeline(match: dict, fields: Dict[str, str], time_field: str, seconds: int, count: dict, into: str) -> List[dict]:
+    """
+    Group the documents matching `match` into buckets of `seconds` by
+    `fields` (output name -> stored path) and `time_field`, and write each
+    bucket over the one stored in `into`. `count` sums the group.
+    """
+    key = {**{name: f"${path}" for name, path in fields.items()}, "start": _bucket(f"${time_field}", seconds)}
+    return [
+        {"$match": match},
+        {"$group": {"_id": key, "count": count}},
+        {"$set": {name: f"$_id.{name}" for name in key}},
+        {"$merge": {"into": into, "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+
+def counts_pipeline(filters: Dict[str, str], since: int, until: int, seconds: int, group_by: List[str]) -> List[dict]:
+    """Rollup counts equal to `filters` summed into `seconds`-long buckets by `group_by`, oldest bucket first, largest count first"""
+    key = {"start": _bucket("$start", seconds), **{field: f"${field}" for field in group_by}}
+    return [
+        {"$match": {**filters, "start": {"$gte": floor_to(since, seconds), "$lt": until}}},
+        {"$group": {"_id": key, "count": {"$sum": "$count"}}},
+        {"$project": {"_id": 0, "count": 1, **{name: f"$_id.{name}" for name in key}}},
+        {"$sort": {"start": 1, "count": -1}},
+    ]
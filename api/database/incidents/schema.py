@@ -1,13 +1,81 @@
+import logging
 from motor.motor_asyncio import AsyncIOMotorClient
+from api.config import DatabaseConfig
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from typing import Dict, List
 import asyncio
 import time
 
-async def create_indexes(collection):
-    await collection.create_index("account_id")
-    await collection.create_index("vehicle_id")
-    await collection.create_index("timestamp")
-    await collection.create_index([("location", "2dsphere")])
-    
+logger = logging.getLogger(__name__)
+
+# Every query IncidentDatabase issues is served by one of these. Equality
+# filters come first, then the (timestamp, _id) sort that find_incidents and
+# the keyset cursor use, which also bounds the timestamp range (equality,
+# sort, range). Each index serves its prefixes too: get_by_account uses
+# account_timestamp, and an account query without a DTC code never needs
+# account_dtc_timestamp. tests/test_index_plans.py checks the plans.
+INCIDENT_INDEXES = [
+    IndexModel([("account_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="account_timestamp"),
+    IndexModel([("account_id", ASCENDING), ("dtc_code", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="account_dtc_timestamp"),
+    IndexModel([("vehicle_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="vehicle_timestamp"),
+    IndexModel([("vehicle_id", ASCENDING), ("dtc_code", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="vehicle_dtc_timestamp"),
+    IndexModel([("dtc_code", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="dtc_timestamp"),
+    IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)], name="timestamp"),
+    # Map queries (geo.py): the timestamp key bounds since/until inside each geo cell
+    IndexModel([("location", "2dsphere"), ("timestamp", DESCENDING)], name="location_2dsphere"),
+]
+
+# The same query shapes on a time-series collection (see timeseries.py), where account_id and
+# vehicle_id live under `meta` and the sort runs on the `time` date rather than the timestamp
+TIMESERIES_INCIDENT_INDEXES = [
+    IndexModel([("meta.account_id", ASCENDING), ("time", DESCENDING), ("_id", DESCENDING)], name="account_time"),
+    IndexModel([("meta.account_id", ASCENDING), ("dtc_code", ASCENDING), ("time", DESCENDING), ("_id", DESCENDING)], name="account_dtc_time"),
+    IndexModel([("meta.vehicle_id", ASCENDING), ("time", DESCENDING), ("_id", DESCENDING)], name="vehicle_time"),
+    IndexModel([("meta.vehicle_id", ASCENDING), ("dtc_code", ASCENDING), ("time", DESCENDING), ("_id", DESCENDING)], name="vehicle_dtc_time"),
+    IndexModel([("dtc_code", ASCENDING), ("time", DESCENDING), ("_id", DESCENDING)], name="dtc_time"),
+    IndexModel([("time", DESCENDING), ("_id", DESCENDING)], name="time"),
+    # Time-series collections have no _id index of their own
+    IndexModel([("_id", ASCENDING)], name="id"),
+    IndexModel([("location", "2dsphere")], name="location_2dsphere"),
+]
+
+# The hourly and daily rollups (rollups.py): analytics read one account's or
+# vehicle's buckets in a time range, and a refresh re-sums the daily buckets
+# from a range of hourly ones
+ROLLUP_INDEXES = [
+    IndexModel([("account_id", ASCENDING), ("start", ASCENDING)], name="account_start"),
+    IndexModel([("vehicle_id", ASCENDING), ("start", ASCENDING)], name="vehicle_start"),
+    IndexModel([("start", ASCENDING)], name="start"),
+]
+
+# Indexes from earlier releases that the sets above supersede
+RETIRED_INDEXES = ["account_id_1", "vehicle_id_1", "timestamp_1"]
+
+def _key(key) -> List[tuple]:
+    return [(field, kind if isinstance(kind, str) else int(kind)) for field, kind in key]
+
+async def create_indexes(collection, indexes: List[IndexModel] = INCIDENT_INDEXES) -> Dict[str, List[str]]:
+    """
+    Bring the collection's indexes in line with `indexes`: create the
+    missing ones, rebuild any whose keys changed and drop retired ones.
+    Indexes this module doesn't know about are left alone. Safe to run on
+    every connect; when nothing changed it is a single listIndexes call.
+    """
+    wanted = {model.document["name"]: model for model in indexes}
+    existing = await collection.index_information()
+    dropped = []
+    for name, info in existing.items():
+        model = wanted.get(name)
+        if name in RETIRED_INDEXES or (model and _key(info["key"]) != _key(model.document["key"].items())):
+            await collection.drop_index(name)
+            dropped.append(name)
+    missing = [model for name, model in wanted.items() if name not in existing or name in dropped]
+    created = await collection.create_indexes(missing) if missing else []
+    if created or dropped:
+        logger.info("Incident indexes: created %s, dropped %s", created, dropped)
+    return {"created": created, "dropped": dropped}
+
+
 def create_schema_validation():
     # MongoDB schema validation rules
     incident_schema = {
@@ -42,17 +110,20 @@ def create_schema_validation():
                 },
                 "location": {
                     "bsonType": "object",
-                    "required": ["latitude", "longitude"],
+                    "required": ["type", "coordinates"],
+                    "description": "GeoJSON point, coordinates [longitude, latitude]",
                     "properties": {
-                        "latitude": {
-                            "bsonType": "double",
-                            "minimum": -90,
-                            "maximum": 90
+                        "type": {
+                            "enum": ["Point"]
                         },
-                        "longitude": {
-                            "bsonType": "double",
-                            "minimum": -180,
-                            "maximum": 180
+                        "coordinates": {
+                            "bsonType": "array",
+                            "minItems": 2,
+                            "maxItems": 2,
+                            "items": [
+                                {"bsonType": "double", "minimum": -180, "maximum": 180},
+                                {"bsonType": "double", "minimum": -90, "maximum": 90}
+                            ]
                         }
                     }
                 }
@@ -64,7 +135,7 @@ def create_schema_validation():
 
 async def setup_collection_with_schema():
     # Connect to MongoDB
-    client = AsyncIOMotorClient('mongodb://localhost:27017/')
+    client = AsyncIOMotorClient(DatabaseConfig.uri)
     db = client['blue_energy_test']
     
     # Drop collection if exists
@@ -77,11 +148,9 @@ async def setup_collection_with_schema():
     )
     
     # Create indexes
-    await db.incidents.create_index("account_id")
-    await db.incidents.create_index("vehicle_id")
-    await db.incidents.create_index("timestamp")
+    await create_indexes(db.incidents)
     
-    print("Collection created with schema validation")
+    logger.info("Collection created with schema validation")
     return db.incidents
 
 async def test_schema():
@@ -95,8 +164,8 @@ async def test_schema():
         "vehicle_tag": "MH12AB1234",
         "dtc_code": "123-4",
         "location": {
-            "latitude": 19.0760,
-            "longitude": 72.8777
+            "type": "Point",
+            "coordinates": [72.8777, 19.0760]
         },
         "extra_field": "This is allowed now"  
     }
@@ -110,8 +179,8 @@ async def test_schema():
             "vehicle_tag": "MH12AB1234",
             "dtc_code": "123-4",
             "location": {
-                "latitude": 19.0760,
-                "longitude": 72.8777
+                "type": "Point",
+                "coordinates": [72.8777, 19.0760]
             }
         },
         # Invalid DTC code format
@@ -122,8 +191,8 @@ async def test_schema():
             "vehicle_tag": "MH12AB1234",
             "dtc_code": "1234",  # Wrong format
             "location": {
-                "latitude": 19.0760,
-                "longitude": 72.8777
+                "type": "Point",
+                "coordinates": [72.8777, 19.0760]
             }
         },
         # Invalid location values
@@ -134,33 +203,32 @@ async def test_schema():
             "vehicle_tag": "MH12AB1234",
             "dtc_code": "123-4",
             "location": {
-                "latitude": 91.0,  # Invalid latitude (>90)
-                "longitude": 72.8777
+                "type": "Point",
+                "coordinates": [72.8777, 91.0]  # Invalid latitude (>90)
             }
         }
     ]
     
-    print("\nTesting schema validation:")
+    logger.info("Testing schema validation:")
     
     # Test valid document
     try:
         result = await incidents.insert_one(valid_doc)
-        print("✓ Valid document inserted successfully")
+        logger.info("Valid document inserted successfully")
         
         # Retrieve and print the inserted document
         inserted_doc = await incidents.find_one({"_id": result.inserted_id})
-        print("\nInserted document:")
-        print(inserted_doc)
+        logger.info("Inserted document: %s", inserted_doc)
         
     except Exception as e:
-        print(f"❌ Error inserting valid document: {str(e)}")
+        logger.error("Error inserting valid document: %s", e)
     
     for i, doc in enumerate(invalid_docs):
         try:
             result = await incidents.insert_one(doc)
-            print(f"❌ Invalid document {i+1} was inserted (shouldn't happen)")
+            logger.warning("Invalid document %s was inserted (shouldn't happen)", i+1)
         except Exception as e:
-            print(f"✓ Invalid document {i+1} correctly rejected: {str(e)}")
+            logger.info("Invalid document %s correctly rejected: %s", i+1, e)
 
 if __name__ == "__main__":
     asyncio.run(test_schema())
\ No newline at end of file
@@ -0,0 +1,175 @@
+# incidents/timeseries.py
+"""
+Incidents as a MongoDB time-series collection (INCIDENT_STORAGE=timeseries).
+
+Mongo groups a time-series collection's documents into buckets per meta
+value and time span and stores each bucket column-compressed. How much that
+saves on incidents depends on how many of them share a vehicle and bucket,
+and has not been measured yet: run benchmarks/timeseries_storage.py against
+a mongod before switching a deployment over. A stored incident differs from
+the API document in two ways:
+
+    time    the incident timestamp as a date; time-series collections need a
+            BSON date as the time field, and buckets are pruned by it
+    meta    {account_id, vehicle_id}, the series each bucket belongs to
+
+Everything else is stored as is, timestamp included. The helpers below
+translate queries and documents between the two shapes, so callers keep
+using account_id, vehicle_id and timestamp.
+
+Time-series collections have no unique _id index, so a repeated insert is
+not rejected there; retries are still acknowledged by the persisted-event
+index (redis/dedup.py). They also take no $jsonSchema validator.
+
+Migrating a regular `incidents` collection (pause ingest first, e.g. with
+INGEST_MODE=stream so webhooks queue up):
+
+    python -m api.database.incidents.timeseries [--batch-size 1000]
+
+renames it to `incidents_pre_timeseries`, creates the time-series
+collection and copies every incident across. While it runs, a marker in
+`incident_migrations` records that the time-series collection is a partial
+copy; rerunning after an interruption drops that copy and starts over. Once
+the copy finishes the marker is removed, and any later run refuses to touch
+either collection. The old collection is kept for checking and rollback;
+drop it once satisfied.
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import datetime, UTC
+from typing import Dict, List, Optional
+from motor.motor_asyncio import AsyncIOMotorClient
+from api.config import DatabaseConfig
+from .schema import TIMESERIES_INCIDENT_INDEXES, create_indexes
+
+logger = logging.getLogger(__name__)
+
+TIME_FIELD = "time"
+META_FIELD = "meta"
+META_FIELDS = ("account_id", "vehicle_id")
+BACKUP_SUFFIX = "_pre_timeseries"
+# Holds {"_id": <collection>, "started_at": ...} while that collection's copy is unfinished
+MIGRATION_STATE = "incident_migrations"
+
+def timeseries_options(granularity: str = DatabaseConfig.timeseries_granularity, retention_seconds: int = DatabaseConfig.retention_seconds) -> dict:
+    """Keyword arguments for create_collection"""
+    options = {"timeseries": {"timeField": TIME_FIELD, "metaField": META_FIELD, "granularity": granularity}}
+    if retention_seconds:
+        options["expireAfterSeconds"] = retention_seconds
+    return options
+
+def to_timeseries(document: dict) -> dict:
+    """An incident document as stored in the time-series collection"""
+    stored = {key: value for key, value in document.items() if key not in META_FIELDS}
+    stored[META_FIELD] = {field: document.get(field) for field in META_FIELDS}
+    stored[TIME_FIELD] = datetime.fromtimestamp(document["timestamp"], UTC)
+    return stored
+
+def from_timeseries(document: Optional[dict]) -> Optional[dict]:
+    """A stored time-series document back in the incident shape"""
+    if document is None:
+        return None
+    document.pop(TIME_FIELD, None)
+    document.update(document.pop(META_FIELD, None) or {})
+    return document
+
+def _time(value):
+    if isinstance(value, dict):
+        return {operator: _time(operand) for operator, operand in value.items()}
+    if isinstance(value, list):
+        return [_time(item) for item in value]
+    return datetime.fromtimestamp(value, UTC) if isinstance(value, int) else value
+
+def timeseries_query(query):
+    """An incident filter rewritten for the stored shape: meta fields under `meta`, timestamp bounds on `time`"""
+    if isinstance(query, list):
+        return [timeseries_query(item) for item in query]
+    if not isinstance(query, dict):
+        return query
+    mapped = {}
+    for key, value in query.items():
+        if key in META_FIELDS:
+            mapped[f"{META_FIELD}.{key}"] = value
+        elif key == "timestamp":
+            mapped[TIME_FIELD] = _time(value)
+        elif key.startswith("$"):
+            mapped[key] = timeseries_query(value)
+        else:
+            mapped[key] = value
+    return mapped
+
+def timeseries_field(field: str) -> str:
+    """Where an incident field lives in the stored shape, for projections"""
+    return f"{META_FIELD}.{field}" if field in META_FIELDS else field
+
+async def migrate(db, batch_size: int = 1000, name: str = "incidents") -> Dict[str, int]:
+    """Move the regular `name` collection's incidents into a new time-series collection of the same name"""
+    backup = f"{name}{BACKUP_SUFFIX}"
+    state = db[MIGRATION_STATE]
+    collections = {
+        info["name"]: info.get("type")
+        for info in (await db.command("listCollections"))["cursor"]["firstBatch"]
+    }
+    in_progress = await state.find_one({"_id": name})
+    if in_progress and backup in collections:
+        # An earlier run was interrupted after the rename, so `name` is at most a partial copy
+        if name in collections:
+            await db.drop_collection(name)
+    elif in_progress and collections.get(name) not in (None, "timeseries"):
+        # Interrupted between recording the start and the rename
+        await db[name].rename(backup)
+    elif in_progress:
+        raise RuntimeError(f"Migration of {name} was interrupted but {backup} is missing; restore it before rerunning")
+    elif collections.get(name) == "timeseries":
+        raise RuntimeError(f"{name} is already a time-series collection")
+    elif backup in collections:
+        raise RuntimeError(f"{backup} already exists; drop or rename it before migrating {name} again")
+    elif name in collections:
+        await state.insert_one({"_id": name, "started_at": datetime.now(UTC)})
+        await db[name].rename(backup)
+    else:
+        raise RuntimeError(f"No {name} collection to migrate")
+
+    await db.create_collection(name, **timeseries_options())
+    copied = 0
+    batch: List[dict] = []
+    async for document in db[backup].find().batch_size(batch_size):
+        batch.append(to_timeseries(document))
+        if len(batch) >= batch_size:
+            await db[name].insert_many(batch, ordered=False)
+            copied += len(batch)
+            batch = []
+            logger.info("Copied %s incidents", copied)
+    if batch:
+        await db[name].insert_many(batch, ordered=False)
+        copied += len(batch)
+    await create_indexes(db[name], TIMESERIES_INCIDENT_INDEXES)
+    # From here on `name` is the live collection, which a rerun must never drop
+    await state.delete_one({"_id": name})
+
+    source_count = await db[backup].count_documents({})
+    return {"source": source_count, "copied": copied}
+
+async def main(batch_size: int):
+    client = AsyncIOMotorClient(DatabaseConfig.uri)
+    try:
+        result = await migrate(client["blue_energy"], batch_size)
+        logger.info(
+            "Copied %s of %s incidents into the time-series collection; the original is kept as incidents%s",
+            result["copied"], result["source"], BACKUP_SUFFIX
+        )
+        if result["copied"] != result["source"]:
+            raise SystemExit("Incident counts differ; check before switching INCIDENT_STORAGE")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    from api.log import setup_logging
+
+    parser = argparse.ArgumentParser(description="Migrate incidents to a time-series collection")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    setup_logging()
+    asyncio.run(main(args.batch_size))
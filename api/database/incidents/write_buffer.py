@@ -0,0 +1,162 @@
+# incidents/write_buffer.py
+
+import logging
+import asyncio
+import time
+from typing import List
+from api.config import WriteBufferConfig
+from api.models.IncidentWebhook import IncidentModel
+from api.database.redis.dedup import persisted_events
+from .connection import incident_db, is_duplicate_key_error
+
+logger = logging.getLogger(__name__)
+
+class IncidentWriteBuffer:
+    """
+    Write-behind buffer for completed incidents.
+
+    Incidents are collected in memory and flushed with one unordered
+    insert_many when either `batch_size` documents are pending or
+    `flush_interval` seconds have passed. `stop()` drains everything
+    that is still pending.
+
+    The buffer does not refuse writes itself: callers check `is_full()`
+    before doing any work that cannot be retried (claiming the Redis
+    partials) and reject the webhook while the buffer is at `max_pending`.
+    """
+    enabled: bool = WriteBufferConfig.enabled
+    batch_size: int = WriteBufferConfig.batch_size
+    flush_interval: float = WriteBufferConfig.flush_interval
+    max_pending: int = WriteBufferConfig.max_pending
+
+    _pending: List[IncidentModel] = []
+    _task: asyncio.Task = None
+    _stopping: bool = False
+    _wakeup: asyncio.Event = None
+    _flush_lock: asyncio.Lock = None
+    _stats = {}
+
+    @classmethod
+    def _reset_stats(cls):
+        cls._stats = {
+            "flushes": 0,
+            "documents_flushed": 0,
+            "write_errors": 0,
+            # Already stored by an earlier delivery of the same event
+            "duplicates": 0,
+            "flush_failures": 0,
+            "last_batch_size": 0,
+            "max_batch_size": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    @classmethod
+    async def start(cls):
+        """Start the background flush task"""
+        cls._pending = []
+        cls._wakeup = asyncio.Event()
+        cls._flush_lock = asyncio.Lock()
+        cls._reset_stats()
+        cls._stopping = False
+        cls._task = asyncio.create_task(cls._run())
+        logger.info("Incident write buffer started (batch size %s, flush every %ss)", cls.batch_size, cls.flush_interval)
+
+    @classmethod
+    async def stop(cls, timeout: float = 5.0):
+        """Stop the background task and drain all pending incidents"""
+        if cls._task:
+            cls._stopping = True
+            cls._wakeup.set()
+            # _run returns on its own once it sees the stop flag; don't rely on cancellation
+            done, _ = await asyncio.wait({cls._task}, timeout=timeout)
+            if not done:
+                cls._task.cancel()
+            cls._task = None
+        while cls._pending:
+            await cls.flush()
+        logger.info("Incident write buffer drained")
+
+    @classmethod
+    def is_full(cls) -> bool:
+        """Whether the buffer has reached `max_pending` and new incidents should be refused"""
+        return len(cls._pending) >= cls.max_pending
+
+    @classmethod
+    async def add(cls, payload: IncidentModel):
+        """Queue an incident for the next flush"""
+        cls._pending.append(payload)
+        if len(cls._pending) >= cls.batch_size:
+            cls._wakeup.set()
+
+    @classmethod
+    async def flush(cls):
+        """Write up to one batch of pending incidents"""
+        async with cls._flush_lock:
+            batch = cls._pending[:cls.batch_size]
+            if not batch:
+                return
+            del cls._pending[:len(batch)]
+
+            start = time.perf_counter()
+            try:
+                errors = await incident_db.store_many_incidents(batch)
+            except Exception as e:
+                cls._stats["flush_failures"] += 1
+                # Put the batch back so it is retried on the next flush
+                cls._pending[:0] = batch
+                logger.error("Error flushing incident write buffer: %s", e)
+                raise e
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            duplicates = {index for index, message in errors.items() if is_duplicate_key_error(message)}
+            for index, message in errors.items():
+                if index not in duplicates:
+                    logger.error("Error storing incident: %s", message, extra={"event_id": batch[index].id})
+            await persisted_events.mark(
+                payload.id for index, payload in enumerate(batch) if index not in errors or index in duplicates
+            )
+
+            stats = cls._stats
+            stats["flushes"] += 1
+            stats["documents_flushed"] += len(batch) - len(errors)
+            stats["write_errors"] += len(errors) - len(duplicates)
+            stats["duplicates"] += len(duplicates)
+            stats["last_batch_size"] = len(batch)
+            stats["max_batch_size"] = max(stats["max_batch_size"], len(batch))
+            stats["last_flush_ms"] = elapsed_ms
+            stats["max_flush_ms"] = max(stats["max_flush_ms"], elapsed_ms)
+            stats["total_flush_ms"] += elapsed_ms
+
+    @classmethod
+    async def _run(cls):
+        while not cls._stopping:
+            try:
+                await asyncio.wait_for(cls._wakeup.wait(), timeout=cls.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            cls._wakeup.clear()
+            if cls._stopping:
+                # stop() drains whatever is left
+                return
+            try:
+                while cls._pending:
+                    await cls.flush()
+                    if len(cls._pending) < cls.batch_size:
+                        break
+            except Exception:
+                # Already logged by flush(); wait for the next interval to retry
+                await asyncio.sleep(cls.flush_interval)
+
+    @classmethod
+    def stats(cls):
+        """Flush latency and batch-size statistics"""
+        stats = dict(cls._stats)
+        flushes = stats.get("flushes", 0)
+        stats["pending"] = len(cls._pending)
+        stats["avg_batch_size"] = (stats.get("documents_flushed", 0) + stats.get("write_errors", 0) + stats.get("duplicates", 0)) / flushes if flushes else 0.0
+        stats["avg_flush_ms"] = stats.pop("total_flush_ms", 0.0) / flushes if flushes else 0.0
+        return stats
+
+incident_write_buffer = IncidentWriteBuffer()
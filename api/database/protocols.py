@@ -0,0 +1,103 @@
+# database/protocols.py
+"""
+The storage interfaces the routes, worker and background tasks rely on.
+
+Each store has a production implementation and an in-process one, picked
+once per process from config (CORRELATION_BACKEND, INCIDENT_BACKEND):
+
+    CorrelationStore   RedisDatabase (redis/main.py)        MemoryCorrelationDatabase (redis/memory.py)
+    IncidentStore      IncidentDatabase (incidents/connection.py)   MemoryIncidentDatabase (incidents/memory.py)
+
+Implementations are classmethod singletons, so these protocols describe the
+module-level instances (`redis_db`, `incident_db`).
+"""
+
+from typing import AsyncIterator, Dict, List, Optional, Protocol, Tuple, Union
+from api.models.IncidentWebhook import IncidentModel
+
+class CorrelationStore(Protocol):
+    """Pending partial incidents, persisted-event markers and the ingest stream"""
+    async def connect(self): ...
+    async def close(self): ...
+    async def ping(self): ...
+    async def flushdb(self): ...
+    async def hset(self, key: str, field: str, value: str): ...
+    async def hgetall(self, key: str) -> Dict[str, Union[str, bytes]]: ...
+    async def delete(self, key: str): ...
+    async def hset_and_claim(self, key: str, field: str, value: str, required_fields: List[str]) -> Optional[Dict[str, str]]: ...
+    async def hset_and_claim_many(self, writes: List[Tuple[str, str, str]], required_fields: List[str]) -> List[Union[Dict[str, str], Exception, None]]: ...
+    async def restore_partials(self, partials: List[Tuple[str, Dict[str, str]]], first_seen_ms: Optional[int] = None): ...
+    async def sweep_partials(self, first_seen_before_ms: int, limit: int) -> List[Tuple[str, Dict[str, str]]]: ...
+    async def pending_partials_stats(self) -> Dict[str, float]: ...
+    async def mark_persisted(self, event_ids: List[str], window_ms: int): ...
+    async def persisted_many(self, event_ids: List[str]) -> List[bool]: ...
+    async def xadd(self, stream: str, fields: Dict[str, str], maxlen: Optional[int] = None) -> str: ...
+    async def xadd_many(self, stream: str, entries: List[Dict[str, str]], maxlen: Optional[int] = None) -> List[str]: ...
+    async def xgroup_create(self, stream: str, group: str): ...
+    async def xreadgroup(self, stream: str, group: str, consumer: str, count: int, block_ms: int) -> List[Tuple[str, Dict[str, str]]]: ...
+    async def xautoclaim(self, stream: str, group: str, consumer: str, min_idle_ms: int, count: int) -> List[Tuple[str, Dict[str, str]]]: ...
+    async def xdelivery_count(self, stream: str, group: str, entry_id: str) -> int: ...
+    async def xack(self, stream: str, group: str, *entry_ids: str): ...
+
+class IncidentStore(Protocol):
+    """Combined incidents, their hourly and daily rollups, and archived orphan partials"""
+    async def connect(self): ...
+    async def close(self): ...
+    async def is_connected(self) -> bool: ...
+    async def ping(self): ...
+    async def get_by_vehicle(self, vehicle_id: str) -> List[dict]: ...
+    async def get_by_account(self, account_id: str) -> List[dict]: ...
+    async def get_incident_data(self, incident_id: str) -> Optional[dict]: ...
+    async def find_incidents(
+        self,
+        filters: Dict[str, str],
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        after: Optional[Tuple[int, str]] = None,
+        limit: int = 100,
+        fields: Optional[List[str]] = None
+    ) -> List[dict]: ...
+    def iter_incidents(
+        self,
+        filters: Dict[str, str],
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        after: Optional[Tuple[int, str]] = None,
+        batch_size: int = 1000,
+        fields: Optional[List[str]] = None
+    ) -> AsyncIterator[dict]: ...
+    async def find_near(
+        self,
+        longitude: float,
+        latitude: float,
+        radius_km: float,
+        filters: Dict[str, str],
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        limit: int = 100
+    ) -> List[dict]: ...
+    async def find_within(
+        self,
+        geometry: dict,
+        filters: Dict[str, str],
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        limit: int = 100
+    ) -> List[dict]: ...
+    async def refresh_rollups(self, since: int, until: int): ...
+    async def rollups_refreshed_until(self) -> Optional[int]: ...
+    async def rollup_counts(
+        self,
+        granularity: str,
+        filters: Dict[str, str],
+        since: int,
+        until: int,
+        bucket_seconds: int,
+        group_by: List[str]
+    ) -> List[dict]: ...
+    async def get_latest_document(self) -> Optional[dict]: ...
+    async def count_documents(self) -> int: ...
+    async def store_incident_data(self, payload: IncidentModel): ...
+    async def store_many_incidents(self, payloads: List[IncidentModel]) -> Dict[int, str]: ...
+    async def archive_orphans(self, documents: List[dict]): ...
+    async def delete_many(self, filter_query=None) -> int: ...
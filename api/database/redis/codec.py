@@ -0,0 +1,73 @@
+# redis/codec.py
+"""
+Encoding of partial incidents held in Redis (or the in-memory store).
+
+    json     the partial's JSON text, as written before this codec existed
+    msgpack  a 2-byte header followed by msgpack of the projected fields,
+             zlib-compressed when PARTIAL_COMPRESSION=zlib
+
+Header: byte 0 is 0xB0 | format version, byte 1 holds flags (bit 0: zlib).
+JSON text always starts with "{", so a reader tells the formats apart by the
+first byte and both can be pending at once while a rollout is in progress.
+msgpack is an optional dependency, only needed when PARTIAL_ENCODING=msgpack
+or when reading partials another instance wrote in that format.
+"""
+
+import json
+import zlib
+from typing import Any, Dict, Type, TypeVar, Union
+from pydantic import BaseModel
+from api.config import PartialConfig
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - exercised only without the extra installed
+    msgpack = None
+
+_MAGIC = 0xB0
+_VERSION = 1
+_FLAG_ZLIB = 0x01
+
+Model = TypeVar("Model", bound=BaseModel)
+
+def check_encoding():
+    """Fail fast at startup when the configured encoding can't be used"""
+    if PartialConfig.encoding not in ("json", "msgpack"):
+        raise ValueError(f"Unknown PARTIAL_ENCODING: {PartialConfig.encoding}")
+    if PartialConfig.compression not in ("none", "zlib"):
+        raise ValueError(f"Unknown PARTIAL_COMPRESSION: {PartialConfig.compression}")
+    if PartialConfig.encoding == "msgpack" and msgpack is None:
+        raise ValueError("PARTIAL_ENCODING=msgpack requires the msgpack package")
+
+def encode_partial(partial: BaseModel) -> Union[str, bytes]:
+    """Encode a partial in the configured format"""
+    if PartialConfig.encoding == "json":
+        return partial.model_dump_json()
+    body = msgpack.packb(partial.model_dump(), use_bin_type=True)
+    flags = 0
+    if PartialConfig.compression == "zlib":
+        body = zlib.compress(body)
+        flags |= _FLAG_ZLIB
+    return bytes((_MAGIC | _VERSION, flags)) + body
+
+def decode_fields(value: Union[str, bytes]) -> Dict[str, Any]:
+    """Decode a partial written in any supported format to its fields"""
+    if isinstance(value, str):
+        return json.loads(value)
+    if not value or value[0] & 0xF0 != _MAGIC:
+        return json.loads(value)
+    version, flags = value[0] & 0x0F, value[1]
+    if version != _VERSION:
+        raise ValueError(f"Unsupported partial encoding version: {version}")
+    if msgpack is None:
+        raise ValueError("Reading msgpack partials requires the msgpack package")
+    body = value[2:]
+    if flags & _FLAG_ZLIB:
+        body = zlib.decompress(body)
+    return msgpack.unpackb(body, raw=False)
+
+def decode_partial(value: Union[str, bytes], model: Type[Model]) -> Model:
+    """Decode a partial written in any supported format into `model`"""
+    if isinstance(value, str) or (value and value[0] & 0xF0 != _MAGIC):
+        return model.model_validate_json(value)
+    return model.model_validate(decode_fields(value))
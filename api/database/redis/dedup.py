@@ -0,0 +1,65 @@
+# redis/dedup.py
+
+import logging
+from typing import Iterable, List
+from api.config import DedupConfig
+from .main import redis_db
+
+logger = logging.getLogger(__name__)
+
+class PersistedEventIndex:
+    """
+    Recently persisted event IDs, so provider retries are acknowledged
+    without redoing any correlation work.
+
+    An event is marked once its incident is in Mongo and stays marked for
+    `window_ms` (one expiring key per event in Redis, or a dict in the
+    memory backend). Exact keys rather than a Bloom filter: a false positive
+    would silently drop a real webhook. Lookups fail open, since a missed
+    duplicate is still caught by Mongo's unique _id.
+    """
+    enabled: bool = DedupConfig.enabled
+    window_ms: int = DedupConfig.window_ms
+
+    _stats = {"checks": 0, "hits": 0, "marked": 0, "check_errors": 0}
+
+    @classmethod
+    async def seen(cls, event_id: str) -> bool:
+        """Whether the incident for `event_id` was persisted within the window"""
+        return (await cls.seen_many([event_id]))[0]
+
+    @classmethod
+    async def seen_many(cls, event_ids: List[str]) -> List[bool]:
+        """`seen` for many events in one round trip, in order"""
+        if not cls.enabled or not event_ids:
+            return [False] * len(event_ids)
+        try:
+            found = await redis_db.persisted_many(event_ids)
+        except Exception as e:
+            cls._stats["check_errors"] += 1
+            logger.error("Error checking persisted events, processing as new: %s", e)
+            return [False] * len(event_ids)
+        cls._stats["checks"] += len(event_ids)
+        cls._stats["hits"] += sum(found)
+        return found
+
+    @classmethod
+    async def mark(cls, event_ids: Iterable[str]):
+        """Record that these events' incidents are stored; failures are logged, not raised"""
+        event_ids = list(event_ids)
+        if not cls.enabled or not event_ids:
+            return
+        try:
+            await redis_db.mark_persisted(event_ids, cls.window_ms)
+            cls._stats["marked"] += len(event_ids)
+        except Exception as e:
+            logger.error("Error marking persisted events: %s", e)
+
+    @classmethod
+    def stats(cls):
+        """Lookup counters and the share of lookups that were duplicates"""
+        stats = dict(cls._stats)
+        stats["hit_rate"] = stats["hits"] / stats["checks"] if stats["checks"] else 0.0
+        return stats
+
+persisted_events = PersistedEventIndex()
@@ -1,92 +1,348 @@
+import logging
 from redis.asyncio import Redis
 import os
 from dotenv import load_dotenv
 import asyncio
+import time
+from redis.exceptions import ResponseError
+from typing import Dict, List, Optional, Tuple, Union
+from api.config import CorrelationConfig, DedupConfig, PartialConfig
+from api.services.metrics import CORRELATION_OPERATION_SECONDS, instrumented
+from api.database.protocols import CorrelationStore
+from .memory import MemoryCorrelationDatabase
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
+# Atomically write one field of a partial incident and, if every required
+# field is now present, return the whole hash and delete it. Only the caller
+# that completes the hash gets it back, so concurrent webhooks for the same
+# event can never both combine it. A newly created partial gets an expiry and
+# an entry in the pending index so the orphan sweeper can find it.
+# KEYS[1] = hash key, KEYS[2] = pending index
+# ARGV[1] = field, ARGV[2] = value, ARGV[3] = expiry ms, ARGV[4] = now ms, ARGV[5..] = required fields
+CLAIM_SCRIPT = """
+local created = redis.call('EXISTS', KEYS[1]) == 0
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+for i = 5, #ARGV do
+    if redis.call('HEXISTS', KEYS[1], ARGV[i]) == 0 then
+        if created then
+            redis.call('PEXPIRE', KEYS[1], ARGV[3])
+            redis.call('ZADD', KEYS[2], ARGV[4], KEYS[1])
+        end
+        return false
+    end
+end
+local data = redis.call('HGETALL', KEYS[1])
+redis.call('DEL', KEYS[1])
+redis.call('ZREM', KEYS[2], KEYS[1])
+return data
+"""
+
+# Remove up to ARGV[2] partials first seen at or before ARGV[1] (ms) and
+# return them as [key, [field, value, ...], ...]. An already expired hash
+# comes back with no fields. Runs atomically, so it cannot race a claim.
+# The partial keys come from the index rather than KEYS, which is fine on
+# a single Redis but would need hash tags on a cluster.
+# KEYS[1] = pending index
+SWEEP_SCRIPT = """
+local keys = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+local result = {}
+for _, key in ipairs(keys) do
+    table.insert(result, key)
+    table.insert(result, redis.call('HGETALL', key))
+    redis.call('DEL', key)
+    redis.call('ZREM', KEYS[1], key)
+end
+return result
+"""
+
+@instrumented(CORRELATION_OPERATION_SECONDS, backend="redis")
 class RedisDatabase:
     client: Redis = None
-    _test_data = {}
+    _claim_script = None
+    _sweep_script = None
     
     @classmethod
     async def connect(cls):
         """Connect to Redis"""
         try:
-            if os.getenv("ENVIRONMENT") == "test":
-                cls._test_data = {}  
-            else:
-                cls.client = Redis.from_url(
-                    os.getenv("REDIS_URL", "redis://localhost:6379"),
-                    decode_responses=True,
-                    socket_connect_timeout=1,
-                    socket_keepalive=True,
-                    socket_timeout=1,
-                    retry_on_timeout=True,
-                    retry_on_error=[asyncio.TimeoutError],
-                    max_connections=10
-                )
-            print("Connected to Redis")
-        except Exception as e:
-            print(f"Error connecting to Redis: {e}")
+            cls.client = Redis.from_url(
+                os.getenv("REDIS_URL", "redis://localhost:6379"),
+                # Partial values may be binary (see codec.py); keys and field names are decoded below
+                decode_responses=False,
+                socket_connect_timeout=1,
+                socket_keepalive=True,
+                socket_timeout=1,
+                retry_on_timeout=True,
+                retry_on_error=[asyncio.TimeoutError],
+                max_connections=10
+            )
+            cls._claim_script = cls.client.register_script(CLAIM_SCRIPT)
+            cls._sweep_script = cls.client.register_script(SWEEP_SCRIPT)
+            logger.info("Connected to Redis")
+        except Exception as e:
+            logger.error("Error connecting to Redis: %s", e)
             raise e
     
     @classmethod
     async def close(cls):
         """Close Redis connection"""
-        if cls.client and not os.getenv("ENVIRONMENT") == "test":
+        if cls.client:
             await cls.client.aclose()
-            print("Closed connection to Redis")
+            logger.info("Closed connection to Redis")
+
+    @classmethod
+    async def ping(cls):
+        """Round trip to the server, raising if it can't be reached"""
+        if cls.client is None:
+            raise ConnectionError("Not connected to Redis")
+        await cls.client.ping()
     
     @classmethod
     async def flushdb(cls):
         """Clear all data in Redis"""
         try:
-            if os.getenv("ENVIRONMENT") == "test":
-                cls._test_data = {}
-            else:
-                await cls.client.flushdb()
+            await cls.client.flushdb()
         except Exception as e:
-            print(f"Error flushing Redis database: {e}")
+            logger.error("Error flushing Redis database: %s", e)
             raise e
     
     @classmethod
     async def hset(cls, key: str, field: str, value: str):
         """Set hash field to value"""
         try:
-            if os.getenv("ENVIRONMENT") == "test":
-                if key not in cls._test_data:
-                    cls._test_data[key] = {}
-                cls._test_data[key][field] = value
-            else:
-                await cls.client.hset(key, field, value)
+            await cls.client.hset(key, field, value)
         except Exception as e:
-            print(f"Error setting hash field in Redis: {e}")
+            logger.error("Error setting hash field in Redis: %s", e)
             raise e
     
     @classmethod
     async def hgetall(cls, key: str):
         """Get all fields and values in a hash"""
         try:
-            if os.getenv("ENVIRONMENT") == "test":
-                return cls._test_data.get(key, {})
-            else:
-                return await cls.client.hgetall(key)
+            return cls._hash(await cls.client.hgetall(key))
         except Exception as e:
-            print(f"Error getting hash fields from Redis: {e}")
+            logger.error("Error getting hash fields from Redis: %s", e)
             raise e
     
     @classmethod
     async def delete(cls, key: str):
         """Delete a key"""
         try:
-            if os.getenv("ENVIRONMENT") == "test":
-                cls._test_data.pop(key, None)
-            else:
-                await cls.client.delete(key)
+            await cls.client.delete(key)
+        except Exception as e:
+            logger.error("Error deleting key from Redis: %s", e)
+            raise e
+
+    @staticmethod
+    def _hash(result) -> Dict[str, Union[str, bytes]]:
+        """Hash from HGETALL (dict or flat list) with field names decoded and values left as stored"""
+        pairs = result.items() if isinstance(result, dict) else zip(result[::2], result[1::2])
+        return {field.decode() if isinstance(field, bytes) else field: value for field, value in pairs}
+
+    @staticmethod
+    def _stream_entry(entry) -> Tuple[str, Dict[str, Union[str, bytes]]]:
+        """Stream entry with its ID and fields decoded, except the partial's encoded `data`"""
+        entry_id, fields = entry
+        decoded = {}
+        for field, value in fields.items():
+            field = field.decode()
+            decoded[field] = value if field == "data" else value.decode()
+        return entry_id.decode(), decoded
+
+    @classmethod
+    def _claim_keys(cls, key: str) -> List[str]:
+        return [key, PartialConfig.pending_index]
+
+    @classmethod
+    def _claim_args(cls, field: str, value: str, required_fields: List[str]) -> List:
+        return [field, value, PartialConfig.expire_ms, int(time.time() * 1000), *required_fields]
+
+    @classmethod
+    async def hset_and_claim(cls, key: str, field: str, value: str, required_fields: List[str]) -> Optional[Dict[str, str]]:
+        """Set hash field and, if all required fields are present, return and delete the hash in one step"""
+        try:
+            result = await cls._claim_script(keys=cls._claim_keys(key), args=cls._claim_args(field, value, required_fields))
+            if not result:
+                return None
+            return cls._hash(result)
+        except Exception as e:
+            logger.error("Error claiming hash in Redis: %s", e)
+            raise e
+
+    @classmethod
+    async def hset_and_claim_many(cls, writes: List[Tuple[str, str, str]], required_fields: List[str]) -> List[Union[Dict[str, str], Exception, None]]:
+        """Run hset_and_claim for each (key, field, value) in one pipeline, returning results in order
+
+        An item whose script failed gets the exception in its slot instead of raising for the whole batch.
+        """
+        try:
+            if not writes:
+                return []
+            pipe = cls.client.pipeline(transaction=False)
+            for key, field, value in writes:
+                await cls._claim_script(keys=cls._claim_keys(key), args=cls._claim_args(field, value, required_fields), client=pipe)
+            # A failing script only fails its own item; the rest of the batch has already run
+            results = await pipe.execute(raise_on_error=False)
+            return [
+                result if isinstance(result, Exception)
+                else cls._hash(result) if result else None
+                for result in results
+            ]
+        except Exception as e:
+            logger.error("Error claiming hashes in Redis: %s", e)
+            raise e
+
+    @classmethod
+    async def restore_partials(cls, partials: List[Tuple[str, Dict[str, str]]], first_seen_ms: Optional[int] = None):
+        """Write claimed or swept (key, fields) partials back as pending, e.g. when storing them failed
+
+        Fields written to the same key in the meantime are kept alongside; each
+        partial gets a fresh expiry and, unless already pending again, is
+        indexed as first seen at `first_seen_ms` (default now).
+        """
+        try:
+            if not partials:
+                return
+            first_seen_ms = int(time.time() * 1000) if first_seen_ms is None else first_seen_ms
+            pipe = cls.client.pipeline(transaction=True)
+            for key, fields in partials:
+                pipe.hset(key, mapping=fields)
+                pipe.pexpire(key, PartialConfig.expire_ms)
+                pipe.zadd(PartialConfig.pending_index, {key: first_seen_ms}, nx=True)
+            await pipe.execute()
+        except Exception as e:
+            logger.error("Error restoring partials in Redis: %s", e)
+            raise e
+
+    @classmethod
+    async def sweep_partials(cls, first_seen_before_ms: int, limit: int) -> List[Tuple[str, Dict[str, str]]]:
+        """Remove and return partials first seen at or before the cutoff; expired ones come back empty"""
+        try:
+            result = await cls._sweep_script(keys=[PartialConfig.pending_index], args=[first_seen_before_ms, limit])
+            return [
+                (key.decode(), cls._hash(fields))
+                for key, fields in zip(result[::2], result[1::2])
+            ]
+        except Exception as e:
+            logger.error("Error sweeping partials in Redis: %s", e)
+            raise e
+
+    @classmethod
+    async def pending_partials_stats(cls) -> Dict[str, float]:
+        """Number of pending partials and the age of the oldest one"""
+        try:
+            pipe = cls.client.pipeline(transaction=False)
+            pipe.zcard(PartialConfig.pending_index)
+            pipe.zrange(PartialConfig.pending_index, 0, 0, withscores=True)
+            count, first = await pipe.execute()
+            oldest = first[0][1] if first else None
+            now_ms = time.time() * 1000
+            return {
+                "pending": count,
+                "oldest_age_seconds": round((now_ms - oldest) / 1000, 3) if oldest is not None else 0.0
+            }
+        except Exception as e:
+            logger.error("Error reading pending partials from Redis: %s", e)
+            raise e
+
+    @classmethod
+    async def mark_persisted(cls, event_ids: List[str], window_ms: int):
+        """Remember that these events' incidents are stored, for `window_ms`"""
+        try:
+            if not event_ids:
+                return
+            pipe = cls.client.pipeline(transaction=False)
+            for event_id in event_ids:
+                pipe.set(f"{DedupConfig.key_prefix}{event_id}", 1, px=window_ms)
+            await pipe.execute()
+        except Exception as e:
+            logger.error("Error marking persisted events in Redis: %s", e)
+            raise e
+
+    @classmethod
+    async def persisted_many(cls, event_ids: List[str]) -> List[bool]:
+        """Whether each event was marked persisted within its window, in order"""
+        try:
+            if not event_ids:
+                return []
+            pipe = cls.client.pipeline(transaction=False)
+            for event_id in event_ids:
+                pipe.exists(f"{DedupConfig.key_prefix}{event_id}")
+            return [bool(found) for found in await pipe.execute()]
+        except Exception as e:
+            logger.error("Error checking persisted events in Redis: %s", e)
+            raise e
+
+    @classmethod
+    async def xadd_many(cls, stream: str, entries: List[Dict[str, str]], maxlen: Optional[int] = None) -> List[str]:
+        """Append entries to a stream in one pipeline, returning their IDs"""
+        try:
+            pipe = cls.client.pipeline(transaction=False)
+            for fields in entries:
+                pipe.xadd(stream, fields, maxlen=maxlen, approximate=True)
+            return [entry_id.decode() for entry_id in await pipe.execute()]
+        except Exception as e:
+            logger.error("Error appending to Redis stream: %s", e)
+            raise e
+
+    @classmethod
+    async def xadd(cls, stream: str, fields: Dict[str, str], maxlen: Optional[int] = None) -> str:
+        """Append an entry to a stream"""
+        return (await cls.xadd_many(stream, [fields], maxlen))[0]
+
+    @classmethod
+    async def xgroup_create(cls, stream: str, group: str):
+        """Create a consumer group (and the stream) if it does not exist yet"""
+        try:
+            await cls.client.xgroup_create(stream, group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                logger.error("Error creating Redis consumer group: %s", e)
+                raise e
+
+    @classmethod
+    async def xreadgroup(cls, stream: str, group: str, consumer: str, count: int, block_ms: int) -> List[Tuple[str, Dict[str, str]]]:
+        """Read new entries for a consumer, returning (entry_id, fields) pairs"""
+        try:
+            response = await cls.client.xreadgroup(group, consumer, {stream: ">"}, count=count, block=block_ms)
+            return [cls._stream_entry(entry) for entry in response[0][1]] if response else []
+        except Exception as e:
+            logger.error("Error reading Redis stream: %s", e)
+            raise e
+
+    @classmethod
+    async def xautoclaim(cls, stream: str, group: str, consumer: str, min_idle_ms: int, count: int) -> List[Tuple[str, Dict[str, str]]]:
+        """Take over entries another consumer has left pending for at least min_idle_ms"""
+        try:
+            response = await cls.client.xautoclaim(stream, group, consumer, min_idle_ms, start_id="0-0", count=count)
+            # Entries deleted from the stream while pending come back as None
+            return [cls._stream_entry(entry) for entry in response[1] if entry and entry[1]]
+        except Exception as e:
+            logger.error("Error claiming Redis stream entries: %s", e)
+            raise e
+
+    @classmethod
+    async def xdelivery_count(cls, stream: str, group: str, entry_id: str) -> int:
+        """Number of times a pending entry has been delivered"""
+        try:
+            response = await cls.client.xpending_range(stream, group, min=entry_id, max=entry_id, count=1)
+            return response[0]["times_delivered"] if response else 0
+        except Exception as e:
+            logger.error("Error reading Redis stream pending entries: %s", e)
+            raise e
+
+    @classmethod
+    async def xack(cls, stream: str, group: str, *entry_ids: str):
+        """Acknowledge processed entries"""
+        try:
+            await cls.client.xack(stream, group, *entry_ids)
         except Exception as e:
-            print(f"Error deleting key from Redis: {e}")
+            logger.error("Error acknowledging Redis stream entries: %s", e)
             raise e
 
-redis_db = RedisDatabase()
\ No newline at end of file
+# Resolved once per process: single-instance deployments and the test suite keep partials in process
+redis_db: CorrelationStore = MemoryCorrelationDatabase() if CorrelationConfig.backend == "memory" else RedisDatabase()
\ No newline at end of file
@@ -0,0 +1,312 @@
+# redis/memory.py
+
+import logging
+import asyncio
+import base64
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+from api.config import CorrelationConfig, IngestConfig, PartialConfig
+from api.services.metrics import CORRELATION_OPERATION_SECONDS, instrumented
+
+logger = logging.getLogger(__name__)
+
+@instrumented(CORRELATION_OPERATION_SECONDS, backend="memory")
+class MemoryCorrelationDatabase:
+    """
+    In-process implementation of the correlation store, for single-instance
+    deployments and the test suite (CORRELATION_BACKEND=memory).
+
+    Partials live in an OrderedDict kept in least-recently-written order.
+    Past `max_partials` the oldest partial is evicted, and partials older
+    than the partial TTL are dropped on access or by the orphan sweeper.
+    With MEMORY_SNAPSHOT_PATH set, pending partials are written to disk
+    every `snapshot_interval` seconds and on close, and reloaded on connect.
+
+    Everything runs on the event loop without awaiting in between, so each
+    method is atomic the same way the Redis scripts are. Streams and
+    consumer groups are emulated for code running in this process only, so
+    INGEST_MODE=stream, where the worker is a separate process, still needs
+    the Redis backend.
+    """
+    max_partials: int = CorrelationConfig.max_partials
+    snapshot_path: str = CorrelationConfig.snapshot_path
+    snapshot_interval: int = CorrelationConfig.snapshot_interval
+
+    # key -> (first seen ms, {field: value})
+    _partials: "OrderedDict[str, Tuple[int, Dict[str, str]]]" = OrderedDict()
+    _evicted: int = 0
+    # event id -> expiry ms, in expiry order (every marker gets the same window)
+    _persisted: "OrderedDict[str, float]" = OrderedDict()
+    # stream -> {"entries": [(id, fields)], "groups": {group: {"next", "pending": {id: [consumer, ms, deliveries]}}}, "seq"}
+    _streams: Dict[str, dict] = {}
+    _snapshot_task: asyncio.Task = None
+    _stopping: bool = False
+    _wakeup: asyncio.Event = None
+
+    @classmethod
+    async def connect(cls):
+        """Load the last snapshot, if any, and start snapshotting"""
+        if IngestConfig.mode == "stream":
+            raise ValueError("INGEST_MODE=stream requires CORRELATION_BACKEND=redis")
+        cls._partials = OrderedDict()
+        cls._persisted = OrderedDict()
+        cls._streams = {}
+        cls._evicted = 0
+        if cls.snapshot_path:
+            await asyncio.to_thread(cls._load_snapshot)
+            cls._stopping = False
+            cls._wakeup = asyncio.Event()
+            cls._snapshot_task = asyncio.create_task(cls._run_snapshots())
+        logger.info("Connected to in-memory correlation store (%s pending partials)", len(cls._partials))
+
+    @classmethod
+    async def close(cls):
+        """Stop snapshotting and write a final snapshot"""
+        if cls._snapshot_task:
+            cls._stopping = True
+            cls._wakeup.set()
+            done, _ = await asyncio.wait({cls._snapshot_task}, timeout=5.0)
+            if not done:
+                cls._snapshot_task.cancel()
+            cls._snapshot_task = None
+            await cls.snapshot()
+        logger.info("Closed in-memory correlation store")
+
+    @classmethod
+    async def ping(cls):
+        """Always reachable: the store lives in this process"""
+
+    @classmethod
+    async def flushdb(cls):
+        """Clear all pending partials, persisted-event markers and streams"""
+        cls._partials = OrderedDict()
+        cls._persisted = OrderedDict()
+        cls._streams = {}
+
+    @classmethod
+    async def hgetall(cls, key: str) -> Dict[str, str]:
+        """Get all fields of a pending partial"""
+        entry = cls._live(key)
+        return dict(entry[1]) if entry else {}
+
+    @classmethod
+    async def hset(cls, key: str, field: str, value: str):
+        """Set one field of a partial without checking for completion"""
+        cls._write(key, field, value)
+
+    @classmethod
+    async def delete(cls, key: str):
+        """Delete a partial"""
+        cls._partials.pop(key, None)
+
+    @classmethod
+    async def hset_and_claim(cls, key: str, field: str, value: str, required_fields: List[str]) -> Optional[Dict[str, str]]:
+        """Set a field and, if all required fields are present, return and remove the partial"""
+        data = cls._write(key, field, value)
+        if all(f in data for f in required_fields):
+            del cls._partials[key]
+            return data
+        return None
+
+    @classmethod
+    async def hset_and_claim_many(cls, writes: List[Tuple[str, str, str]], required_fields: List[str]) -> List[Union[Dict[str, str], Exception, None]]:
+        """Run hset_and_claim for each (key, field, value), returning results in order"""
+        return [await cls.hset_and_claim(key, field, value, required_fields) for key, field, value in writes]
+
+    @classmethod
+    async def restore_partials(cls, partials: List[Tuple[str, Dict[str, str]]], first_seen_ms: Optional[int] = None):
+        """Write claimed or swept (key, fields) partials back as pending, e.g. when storing them failed"""
+        for key, fields in partials:
+            created = cls._live(key) is None
+            for field, value in fields.items():
+                cls._write(key, field, value)
+            if created and first_seen_ms is not None:
+                cls._partials[key] = (first_seen_ms, cls._partials[key][1])
+
+    @classmethod
+    async def sweep_partials(cls, first_seen_before_ms: int, limit: int) -> List[Tuple[str, Dict[str, str]]]:
+        """Remove and return partials first seen at or before the cutoff"""
+        keys = sorted(
+            (key for key, (first_seen, _) in cls._partials.items() if first_seen <= first_seen_before_ms),
+            key=lambda key: cls._partials[key][0]
+        )[:limit]
+        return [(key, cls._partials.pop(key)[1]) for key in keys]
+
+    @classmethod
+    async def pending_partials_stats(cls) -> Dict[str, float]:
+        """Number of pending partials, the age of the oldest one and LRU evictions"""
+        oldest = min((first_seen for first_seen, _ in cls._partials.values()), default=None)
+        now_ms = time.time() * 1000
+        return {
+            "pending": len(cls._partials),
+            "oldest_age_seconds": round((now_ms - oldest) / 1000, 3) if oldest is not None else 0.0,
+            "evicted": cls._evicted,
+        }
+
+    @classmethod
+    async def mark_persisted(cls, event_ids: List[str], window_ms: int):
+        """Remember that these events' incidents are stored, for `window_ms`"""
+        now = time.time() * 1000
+        while cls._persisted and next(iter(cls._persisted.values())) <= now:
+            cls._persisted.popitem(last=False)
+        for event_id in event_ids:
+            cls._persisted.pop(event_id, None)
+            cls._persisted[event_id] = now + window_ms
+
+    @classmethod
+    async def persisted_many(cls, event_ids: List[str]) -> List[bool]:
+        """Whether each event was marked persisted within its window, in order"""
+        now = time.time() * 1000
+        return [cls._persisted.get(event_id, 0) > now for event_id in event_ids]
+
+    @classmethod
+    async def snapshot(cls):
+        """Write pending partials to `snapshot_path` (atomically replacing the previous one)"""
+        if not cls.snapshot_path:
+            return
+        data = {
+            key: [first_seen, {field: cls._dump_value(value) for field, value in fields.items()}]
+            for key, (first_seen, fields) in cls._partials.items()
+        }
+        try:
+            await asyncio.to_thread(cls._write_snapshot, data)
+        except Exception as e:
+            logger.error("Error writing correlation snapshot: %s", e)
+
+    @classmethod
+    def _write(cls, key: str, field: str, value: str) -> Dict[str, str]:
+        entry = cls._live(key)
+        if entry is None:
+            entry = (int(time.time() * 1000), {})
+            cls._partials[key] = entry
+            while len(cls._partials) > cls.max_partials:
+                cls._partials.popitem(last=False)
+                cls._evicted += 1
+        else:
+            cls._partials.move_to_end(key)
+        entry[1][field] = value
+        return entry[1]
+
+    @classmethod
+    def _live(cls, key: str) -> Optional[Tuple[int, Dict[str, str]]]:
+        """Return a partial unless it has outlived the Redis-equivalent expiry"""
+        entry = cls._partials.get(key)
+        if entry and time.time() * 1000 - entry[0] > PartialConfig.expire_ms:
+            del cls._partials[key]
+            return None
+        return entry
+
+    @classmethod
+    def _write_snapshot(cls, data: dict):
+        tmp_path = f"{cls.snapshot_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, cls.snapshot_path)
+
+    @classmethod
+    def _load_snapshot(cls):
+        if not os.path.exists(cls.snapshot_path):
+            return
+        try:
+            with open(cls.snapshot_path) as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning("Ignoring unreadable correlation snapshot %s: %s", cls.snapshot_path, e)
+            return
+        for key, (first_seen, fields) in sorted(data.items(), key=lambda item: item[1][0]):
+            cls._partials[key] = (first_seen, {field: cls._load_value(value) for field, value in fields.items()})
+
+    @staticmethod
+    def _dump_value(value):
+        # Binary partials (PARTIAL_ENCODING=msgpack) don't fit in JSON as is
+        if isinstance(value, bytes):
+            return {"b64": base64.b64encode(value).decode()}
+        return value
+
+    @staticmethod
+    def _load_value(value):
+        if isinstance(value, dict):
+            return base64.b64decode(value["b64"])
+        return value
+
+    @classmethod
+    async def _run_snapshots(cls):
+        while not cls._stopping:
+            try:
+                await asyncio.wait_for(cls._wakeup.wait(), timeout=cls.snapshot_interval)
+            except asyncio.TimeoutError:
+                pass
+            if cls._stopping:
+                return
+            await cls.snapshot()
+
+    @classmethod
+    def _stream(cls, stream: str) -> dict:
+        return cls._streams.setdefault(stream, {"entries": [], "groups": {}, "seq": 0})
+
+    @classmethod
+    async def xadd_many(cls, stream: str, entries: List[Dict[str, str]], maxlen: Optional[int] = None) -> List[str]:
+        """Append entries to a stream, returning their IDs"""
+        data = cls._stream(stream)
+        ids = []
+        for fields in entries:
+            data["seq"] += 1
+            entry_id = f"{int(time.time() * 1000)}-{data['seq']}"
+            data["entries"].append((entry_id, dict(fields)))
+            ids.append(entry_id)
+        return ids
+
+    @classmethod
+    async def xadd(cls, stream: str, fields: Dict[str, str], maxlen: Optional[int] = None) -> str:
+        """Append an entry to a stream"""
+        return (await cls.xadd_many(stream, [fields], maxlen))[0]
+
+    @classmethod
+    async def xgroup_create(cls, stream: str, group: str):
+        """Create a consumer group (and the stream) if it does not exist yet"""
+        cls._stream(stream)["groups"].setdefault(group, {"next": 0, "pending": {}})
+
+    @classmethod
+    async def xreadgroup(cls, stream: str, group: str, consumer: str, count: int, block_ms: int) -> List[Tuple[str, Dict[str, str]]]:
+        """Read new entries for a consumer without blocking, returning (entry_id, fields) pairs"""
+        data = cls._stream(stream)
+        state = data["groups"][group]
+        entries = data["entries"][state["next"]:state["next"] + count]
+        state["next"] += len(entries)
+        now = time.time() * 1000
+        for entry_id, _ in entries:
+            state["pending"][entry_id] = [consumer, now, 1]
+        return entries
+
+    @classmethod
+    async def xautoclaim(cls, stream: str, group: str, consumer: str, min_idle_ms: int, count: int) -> List[Tuple[str, Dict[str, str]]]:
+        """Take over entries another consumer has left pending for at least min_idle_ms"""
+        data = cls._stream(stream)
+        pending = data["groups"][group]["pending"]
+        now = time.time() * 1000
+        claimed = []
+        for entry_id, fields in data["entries"]:
+            if entry_id in pending and now - pending[entry_id][1] >= min_idle_ms:
+                pending[entry_id][0] = consumer
+                pending[entry_id][1] = now
+                pending[entry_id][2] += 1
+                claimed.append((entry_id, fields))
+                if len(claimed) >= count:
+                    break
+        return claimed
+
+    @classmethod
+    async def xdelivery_count(cls, stream: str, group: str, entry_id: str) -> int:
+        """Number of times a pending entry has been delivered"""
+        pending = cls._stream(stream)["groups"][group]["pending"]
+        return pending[entry_id][2] if entry_id in pending else 0
+
+    @classmethod
+    async def xack(cls, stream: str, group: str, *entry_ids: str):
+        """Acknowledge processed entries"""
+        pending = cls._stream(stream)["groups"][group]["pending"]
+        for entry_id in entry_ids:
+            pending.pop(entry_id, None)
@@ -0,0 +1,142 @@
+# redis/sweeper.py
+
+import logging
+import asyncio
+import time
+from api.config import PartialConfig
+from api.database.incidents.connection import incident_db
+from .codec import decode_fields
+from .main import redis_db
+
+logger = logging.getLogger(__name__)
+
+class OrphanSweeper:
+    """
+    Background sweeper for partial incidents whose other half never arrived.
+
+    Every `sweep_interval` seconds, partials first seen more than the partial
+    TTL ago are removed from Redis, counted by the field they were missing and,
+    with ORPHAN_ARCHIVE=true, archived to Mongo. A batch that fails to archive
+    is written back to Redis for the next sweep. Safe to run on every
+    instance: each partial is removed by exactly one sweep.
+    """
+    sweep_interval: int = PartialConfig.sweep_interval
+    sweep_batch: int = PartialConfig.sweep_batch
+    archive: bool = PartialConfig.archive
+    required_fields = ["dtc_data", "alert_data"]
+
+    _task: asyncio.Task = None
+    _stopping: bool = False
+    _wakeup: asyncio.Event = None
+    _stats = {}
+
+    @classmethod
+    def _reset_stats(cls):
+        cls._stats = {
+            "sweeps": 0,
+            "orphans_swept": 0,
+            "orphans_archived": 0,
+            # Hash was already expired by Redis before the sweeper got to it
+            "orphans_expired": 0,
+            "missing_by_field": {field: 0 for field in cls.required_fields},
+        }
+
+    @classmethod
+    async def start(cls):
+        """Start the background sweep task"""
+        cls._reset_stats()
+        cls._stopping = False
+        cls._wakeup = asyncio.Event()
+        cls._task = asyncio.create_task(cls._run())
+        logger.info("Orphan sweeper started (TTL %ss, every %ss)", PartialConfig.ttl_ms // 1000, cls.sweep_interval)
+
+    @classmethod
+    async def stop(cls, timeout: float = 5.0):
+        """Stop the background sweep task"""
+        if cls._task:
+            cls._stopping = True
+            cls._wakeup.set()
+            done, _ = await asyncio.wait({cls._task}, timeout=timeout)
+            if not done:
+                cls._task.cancel()
+            cls._task = None
+
+    @classmethod
+    async def sweep(cls) -> int:
+        """Sweep every partial older than the TTL; returns how many were removed"""
+        if not cls._stats:
+            cls._reset_stats()
+        cutoff_ms = int(time.time() * 1000) - PartialConfig.ttl_ms
+        total = 0
+        while True:
+            swept = await redis_db.sweep_partials(cutoff_ms, cls.sweep_batch)
+            if not swept:
+                break
+
+            archived = []
+            missing_by_field = {field: 0 for field in cls.required_fields}
+            for key, data in swept:
+                if not data:
+                    continue
+                missing = [field for field in cls.required_fields if field not in data]
+                for field in missing:
+                    missing_by_field[field] += 1
+                if cls.archive:
+                    archived.append({
+                        "event_id": key.split(":", 1)[1],
+                        "missing": missing,
+                        "partials": {field: cls._decode(value) for field, value in data.items()},
+                        "swept_at": int(time.time()),
+                    })
+            if archived:
+                try:
+                    await incident_db.archive_orphans(archived)
+                except Exception:
+                    # Put the batch back, still due, so the next sweep archives it instead of it being lost
+                    await redis_db.restore_partials([(key, data) for key, data in swept if data], first_seen_ms=cutoff_ms)
+                    raise
+                cls._stats["orphans_archived"] += len(archived)
+
+            total += len(swept)
+            cls._stats["orphans_expired"] += sum(1 for _, data in swept if not data)
+            for field, count in missing_by_field.items():
+                cls._stats["missing_by_field"][field] += count
+
+            if len(swept) < cls.sweep_batch:
+                break
+
+        cls._stats["sweeps"] += 1
+        cls._stats["orphans_swept"] += total
+        return total
+
+    @staticmethod
+    def _decode(value):
+        try:
+            return decode_fields(value)
+        except ValueError:
+            return value.decode(errors="replace") if isinstance(value, bytes) else value
+
+    @classmethod
+    async def _run(cls):
+        while not cls._stopping:
+            try:
+                await asyncio.wait_for(cls._wakeup.wait(), timeout=cls.sweep_interval)
+            except asyncio.TimeoutError:
+                pass
+            if cls._stopping:
+                return
+            try:
+                swept = await cls.sweep()
+                if swept:
+                    logger.info("Swept %s orphaned partial incidents", swept)
+            except Exception as e:
+                logger.error("Error sweeping orphaned partials: %s", e)
+
+    @classmethod
+    def stats(cls):
+        """Sweep counters"""
+        stats = dict(cls._stats)
+        stats["missing_by_field"] = dict(stats.get("missing_by_field", {}))
+        return stats
+
+orphan_sweeper = OrphanSweeper()
@@ -0,0 +1,134 @@
+# log.py
+"""
+Logging for the app and the ingest worker.
+
+Records from the `api` loggers go onto an in-process queue. A listener
+thread formats and writes them, so a slow or blocked stdout never stalls
+the event loop. Output is one JSON object per line (LOG_FORMAT=json, the
+default) or plain text (LOG_FORMAT=text). Extra fields passed with
+`extra={...}` become JSON keys.
+
+    LOG_LEVEL=INFO                                    level of the `api` logger
+    LOG_LEVELS=api.routes.webhooks=DEBUG,api.database=WARNING   per-logger overrides
+    LOG_SAMPLE_EVERY=100                              keep 1 in N of records logged with extra={"sample": True}
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, UTC
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "100"))
+
+# Attributes every LogRecord has; anything else on a record came from `extra`
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, extra fields and exception"""
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created, UTC).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_text:
+            data["exception"] = record.exc_text
+        return json.dumps(data, default=str)
+
+class SampleFilter(logging.Filter):
+    """
+    Keep one in `every` records logged with extra={"sample": True}, counted
+    per message template. A kept record carries `sampled_every` so totals can
+    be scaled back up.
+    """
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, every)
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sample", False):
+            return True
+        del record.sample
+        if self.every == 1:
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        if count % self.every:
+            return False
+        record.sampled_every = self.every
+        return True
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Hand records to the listener with as little work as possible on the caller's thread"""
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        # Args and exceptions may reference objects that change after the call returns
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class _StdoutHandler(logging.StreamHandler):
+    """Writes to whatever sys.stdout is at the time, so redirected or captured stdout keeps working"""
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+_listener: logging.handlers.QueueListener = None
+
+def setup_logging():
+    """Route the `api` loggers through the queue; safe to call more than once"""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = _StdoutHandler()
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(
+        "%(asctime)s %(levelname)s %(name)s: %(message)s"
+    ))
+    log_queue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    # Filter before enqueueing, so dropped records cost nothing further
+    handler.addFilter(SampleFilter(LOG_SAMPLE_EVERY))
+
+    logger = logging.getLogger("api")
+    logger.handlers = [handler]
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+    for override in filter(None, (item.strip() for item in LOG_LEVELS.split(","))):
+        name, _, level = override.partition("=")
+        logging.getLogger(name.strip()).setLevel(level.strip().upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """Write out everything still queued and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,32 +1,47 @@
+import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from api.routes import webhooks
 from api.database.dtc_descriptions.connection import dtc_db
 from api.database.incidents.connection import incident_db
+from api.database.incidents.write_buffer import incident_write_buffer
+from api.database.incidents.rollup_refresher import rollup_refresher
 from api.routes import health
+from api.routes import incidents
+from api.routes import analytics
+from api.routes import metrics
+from api.routes import debug
 from api.database.dtc_descriptions.schema import test_schema as test_dtc_schema
 from api.database.incidents.schema import test_schema as test_incident_schema
 from api.database.redis.main import redis_db
+from api.database.redis.sweeper import orphan_sweeper
+from api.database.redis.codec import check_encoding
+from api.services.profiling import loop_lag_monitor
+from api.services.health import health_monitor
+from api.log import setup_logging
 import uvicorn
 
+setup_logging()
+logger = logging.getLogger(__name__)
+
 async def run_startup_tests():
     """Run all database tests before startup"""
-    print("\n🔍 Running pre-startup database tests...")
+    logger.info("Running pre-startup database tests...")
     
     try:
         # Test DTC Database
-        print("\nTesting DTC Database Schema:")
+        logger.info("Testing DTC Database Schema:")
         await test_dtc_schema()
         
         # Test Incidents Database
-        print("\nTesting Incidents Database:")
+        logger.info("Testing Incidents Database:")
         await test_incident_schema()
 
-        print("\n✅ All database schema tests passed")
+        logger.info("All database schema tests passed")
         return True
         
     except Exception as e:
-        print(f"\n❌ Pre-startup tests failed: {str(e)}")
+        logger.error("Pre-startup tests failed: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Database initialization failed: {str(e)}"
@@ -38,38 +53,65 @@ async def lifespan(app: FastAPI):
     try:
         await run_startup_tests()
     except Exception as e:
-        print(f"❌ Startup tests failed. Application will not start. Error: {str(e)}")
+        logger.error("Startup tests failed. Application will not start. Error: %s", e)
         raise e
     
     # If tests pass, proceed with normal startup
-    print("\nStarting up database connections...")
+    logger.info("Starting up database connections...")
+    await loop_lag_monitor.start()
+    check_encoding()
     await incident_db.connect()
-    print("✓ Incidents database connected")
+    logger.info("Incidents database connected")
     await dtc_db.connect()
-    print("✓ DTC database connected")
+    logger.info("DTC database connected")
     await redis_db.connect()
-    print("✓ Redis database connected")
+    logger.info("Redis database connected")
+    if incident_write_buffer.enabled:
+        await incident_write_buffer.start()
+        logger.info("Incident write buffer started")
+    await orphan_sweeper.start()
+    logger.info("Orphan sweeper started")
+    if rollup_refresher.enabled:
+        await rollup_refresher.start()
+        logger.info("Rollup refresher started")
+    await health_monitor.start()
     
-    print("\n🚀 Application is ready and running!")
-    print("-----------------------------------")
-    print("API Documentation: http://localhost:8000/docs")
-    print("Alternative Documentation: http://localhost:8000/redoc")
-    print("-----------------------------------")
+    logger.info("Application is ready and running!")
+    logger.info("API Documentation: http://localhost:8000/docs")
+    logger.info("Alternative Documentation: http://localhost:8000/redoc")
     
     yield
     
     # Shutdown
-    print("\nShutting down database connections...")
-    await incident_db.close()
-    print("✓ Incidents database closed")
-    await dtc_db.close()
-    print("✓ DTC database closed")
+    logger.info("Shutting down database connections...")
+    await orphan_sweeper.stop()
+    await rollup_refresher.stop()
+    await health_monitor.stop()
+    await loop_lag_monitor.stop()
+    try:
+        if incident_write_buffer.enabled:
+            await incident_write_buffer.stop()
+            logger.info("Incident write buffer drained")
+    except Exception as e:
+        logger.error("Failed to drain incident write buffer, %s incidents lost: %s", incident_write_buffer.stats()['pending'], e)
+    finally:
+        await incident_db.close()
+        logger.info("Incidents database closed")
+        await dtc_db.close()
+        logger.info("DTC database closed")
+        await redis_db.close()
+        logger.info("Redis database closed")
 
 app = FastAPI(lifespan=lifespan)
 
 # Include routers
 app.include_router(webhooks.router, prefix="/api/v1")
 app.include_router(health.router, prefix="/api/v1")
+app.include_router(incidents.router, prefix="/api/v1")
+app.include_router(analytics.router, prefix="/api/v1")
+app.include_router(debug.router, prefix="/api/v1")
+# Unprefixed, where Prometheus scrapes by default
+app.include_router(metrics.router)
 
 # app.include_router(dtc.router, prefix="/api/v1")
 
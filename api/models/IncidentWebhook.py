@@ -1,5 +1,6 @@
-from typing import Any, Dict, List, Optional
-from pydantic import BaseModel, Field
+from typing import Annotated, Any, Dict, List, Literal, Optional, Union
+from pydantic import BaseModel, Field, TypeAdapter, field_validator, model_validator
+from api.services.dtc_normalization import normalize_dtc_code
 
 
 class WebhookData(BaseModel):
@@ -93,6 +94,39 @@ class Location(BaseModel):
         le=180
     )
 
+class GeoPoint(BaseModel):
+    """
+    A GeoJSON point, the shape the 2dsphere index on incidents reads.
+    Coordinates are [longitude, latitude], in that order.
+
+    Also reads the {latitude, longitude} object incidents were stored with
+    before.
+    """
+    type: Literal["Point"] = Field("Point", description="GeoJSON geometry type")
+    coordinates: List[float] = Field(..., description="[longitude, latitude] in degrees", min_length=2, max_length=2)
+
+    @model_validator(mode="before")
+    @classmethod
+    def _from_location(cls, values: Any) -> Any:
+        if isinstance(values, dict) and "latitude" in values:
+            values = {"type": "Point", "coordinates": [values.get("longitude"), values["latitude"]]}
+        return values
+
+    @field_validator("coordinates")
+    @classmethod
+    def _in_range(cls, value: List[float]) -> List[float]:
+        longitude, latitude = value
+        if not -180 <= longitude <= 180:
+            raise ValueError("longitude must be between -180 and 180")
+        if not -90 <= latitude <= 90:
+            raise ValueError("latitude must be between -90 and 90")
+        return value
+
+    @classmethod
+    def from_location(cls, location: Location) -> "GeoPoint":
+        # Already range-checked as a Location
+        return cls.model_construct(type="Point", coordinates=[location.longitude, location.latitude])
+
 class IncidentModel(BaseModel):
     """
     This Pydantic model mirrors your MongoDB schema:
@@ -102,7 +136,7 @@ class IncidentModel(BaseModel):
       - vehicle_id: string
       - vehicle_tag: string
       - dtc_code: string in the pattern XXX-X
-      - location: nested object with latitude and longitude
+      - location: GeoJSON point, coordinates [longitude, latitude]
     Any additional fields (like 'extra_field') are allowed.
     """
     id: str = Field(
@@ -130,12 +164,94 @@ class IncidentModel(BaseModel):
         ...,
         description="DTC code in XXX-X format.",
     )
-    location: Location = Field(
+    location: GeoPoint = Field(
         ...,
-        description="Location of the incident with latitude and longitude."
+        description="Location of the incident as a GeoJSON point."
     )
 
     class Config:
         # Allow extra fields (to match `additionalProperties: true` in MongoDB schema)
         extra = 'allow'
         populate_by_name = True
+
+class DTCWebhook(BaseModel):
+    """
+    A DTC webhook envelope with its data validated as DTCData.
+    """
+    data: DTCData = Field(..., description="DTC payload data")
+    action: str = Field(..., description="Action type (e.g. create, update)")
+    entity: Literal["dtcs_change_log"] = Field(..., description="Entity type")
+
+class AlertWebhook(BaseModel):
+    """
+    An alert webhook envelope with its data validated as AlertData.
+    """
+    data: AlertData = Field(..., description="Alert payload data")
+    action: str = Field(..., description="Action type (e.g. create, update)")
+    entity: Literal["alert_log"] = Field(..., description="Entity type")
+
+# Any supported envelope, picked by its `entity` in a single validation pass
+IncidentWebhook = Annotated[Union[DTCWebhook, AlertWebhook], Field(discriminator="entity")]
+incident_webhook_adapter = TypeAdapter(IncidentWebhook)
+
+class DTCPartial(BaseModel):
+    """
+    The part of a DTC payload that the incident needs, as held in Redis
+    until the matching alert arrives.
+
+    Also reads partials written as full DTCData JSON, where the code is
+    still the raw `type`.
+    """
+    timestamp: int = Field(..., description="Timestamp in epoch ms")
+    account_id: str = Field(..., description="Account ID")
+    vehicle_id: str = Field(..., description="Vehicle ID")
+    dtc_code: str = Field(..., description="DTC code in XXX-X format")
+
+    @model_validator(mode="before")
+    @classmethod
+    def _from_dtc_data(cls, values: Any) -> Any:
+        if isinstance(values, dict) and "dtc_code" not in values and "type" in values:
+            values = {**values, "dtc_code": values["type"]}
+        return values
+
+    @field_validator("dtc_code")
+    @classmethod
+    def _normalize(cls, value: str) -> str:
+        return normalize_dtc_code(value)
+
+    @classmethod
+    def from_dtc_data(cls, data: DTCData) -> "DTCPartial":
+        return cls(
+            timestamp=data.timestamp,
+            account_id=data.account_id,
+            vehicle_id=data.vehicle_id,
+            dtc_code=normalize_dtc_code(data.type)
+        )
+
+class AlertPartial(BaseModel):
+    """
+    The part of an alert payload that the incident needs, as held in Redis
+    until the matching DTC arrives.
+
+    Also reads partials written as full AlertData JSON, where the location
+    is still the "lat,lng" string.
+    """
+    vehicle_tag: str = Field(..., description="Tag of the vehicle")
+    location: Location = Field(..., description="Where the alert triggered")
+
+    @model_validator(mode="before")
+    @classmethod
+    def _from_alert_data(cls, values: Any) -> Any:
+        if isinstance(values, dict) and isinstance(values.get("location"), str):
+            values = {**values, "location": parse_location(values["location"])}
+        return values
+
+    @classmethod
+    def from_alert_data(cls, data: AlertData) -> "AlertPartial":
+        return cls(vehicle_tag=data.vehicle_tag, location=parse_location(data.location))
+
+def parse_location(location: str) -> Dict[str, float]:
+    """Parse the provider's "lat,lng" location string"""
+    lat_str, lon_str = location.split(",")
+    return {"latitude": float(lat_str), "longitude": float(lon_str)}
+
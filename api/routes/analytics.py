@@ -0,0 +1,83 @@
+import time
+from fastapi import APIRouter, HTTPException, Query
+from typing import Dict, List, Literal, Optional, Tuple
+from api.database.incidents.connection import incident_db
+from api.database.incidents.rollups import DAY, HOUR, WEEK
+
+router = APIRouter(
+    prefix="/analytics",
+    tags=["Analytics"]
+)
+
+# Granularity -> (rollup it is summed from, bucket length in seconds)
+GRANULARITIES = {"hour": ("hour", HOUR), "day": ("day", DAY), "week": ("day", WEEK)}
+# Buckets one request may span; together with the rollups this bounds the work per request
+MAX_BUCKETS = 1000
+
+Granularity = Literal["hour", "day", "week"]
+
+def rollup_window(since: int, until: Optional[int], granularity: str) -> Tuple[str, int, int]:
+    """The rollup to read, the bucket length and the end of the window (now by default)"""
+    rollup, seconds = GRANULARITIES[granularity]
+    until = int(time.time()) if until is None else until
+    if until <= since:
+        raise HTTPException(status_code=400, detail="until must be after since")
+    if (until - since) / seconds > MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"More than {MAX_BUCKETS} {granularity} buckets; narrow since/until")
+    return rollup, seconds, until
+
+def buckets(rows: List[dict], field: str, name: str, limit: int) -> List[dict]:
+    """Rows sorted by start and count grouped into one entry per bucket, keeping the `limit` largest"""
+    grouped: Dict[int, dict] = {}
+    for row in rows:
+        bucket = grouped.setdefault(row["start"], {"start": row["start"], "total": 0, name: []})
+        bucket["total"] += row["count"]
+        if len(bucket[name]) < limit:
+            bucket[name].append({field: row[field], "count": row["count"]})
+    return list(grouped.values())
+
+@router.get("/dtc-codes")
+async def top_dtc_codes(
+    account_id: str,
+    since: int = Query(..., description="Unix timestamp; buckets from the one holding it"),
+    until: Optional[int] = Query(None, description="Unix timestamp; buckets starting before it (default now)"),
+    granularity: Granularity = "day",
+    vehicle_id: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=100, description="DTC codes per bucket")
+):
+    """
+    The most frequent DTC codes of an account (or one of its vehicles) per
+    hour, day or week, with each bucket's total. Read from the rollups, so
+    counts are as of `refreshed_until`.
+    """
+    rollup, seconds, until = rollup_window(since, until, granularity)
+    filters = {"account_id": account_id, **({"vehicle_id": vehicle_id} if vehicle_id is not None else {})}
+    rows = await incident_db.rollup_counts(rollup, filters, since, until, seconds, ["dtc_code"])
+    return {
+        "granularity": granularity,
+        "refreshed_until": await incident_db.rollups_refreshed_until(),
+        "buckets": buckets(rows, "dtc_code", "dtc_codes", limit)
+    }
+
+@router.get("/vehicles")
+async def incidents_per_vehicle(
+    account_id: str,
+    since: int = Query(..., description="Unix timestamp; buckets from the one holding it"),
+    until: Optional[int] = Query(None, description="Unix timestamp; buckets starting before it (default now)"),
+    granularity: Granularity = "week",
+    dtc_code: Optional[str] = Query(None, description="DTC code in XXX-X format"),
+    limit: int = Query(100, ge=1, le=1000, description="Vehicles per bucket, most incidents first")
+):
+    """
+    Incidents per vehicle of an account per hour, day or week, optionally
+    for one DTC code. Read from the rollups, so counts are as of
+    `refreshed_until`.
+    """
+    rollup, seconds, until = rollup_window(since, until, granularity)
+    filters = {"account_id": account_id, **({"dtc_code": dtc_code} if dtc_code is not None else {})}
+    rows = await incident_db.rollup_counts(rollup, filters, since, until, seconds, ["vehicle_id"])
+    return {
+        "granularity": granularity,
+        "refreshed_until": await incident_db.rollups_refreshed_until(),
+        "buckets": buckets(rows, "vehicle_id", "vehicles", limit)
+    }
@@ -0,0 +1,45 @@
+import asyncio
+import hmac
+import threading
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from api.config import DebugConfig
+from api.services.profiling import loop_lag_monitor, sampling_profiler
+
+async def require_debug_token(authorization: str = Header(None)):
+    """Bearer DEBUG_TOKEN; the debug routes don't exist at all while it is unset"""
+    if not DebugConfig.token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    supplied = (authorization or "").removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(supplied.encode(), DebugConfig.token.encode()):
+        raise HTTPException(status_code=401, detail="Invalid debug token")
+
+router = APIRouter(
+    prefix="/debug",
+    tags=["Debug"],
+    dependencies=[Depends(require_debug_token)]
+)
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(10.0, gt=0, le=DebugConfig.profile_max_seconds),
+    hz: int = Query(100, ge=1, le=1000)
+):
+    """
+    Sample the event loop for `seconds` across live traffic and return
+    collapsed stacks (flamegraph.pl / speedscope input)
+    """
+    if sampling_profiler.is_running():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    loop_thread = threading.get_ident()
+    try:
+        return await asyncio.to_thread(sampling_profiler.profile, loop_thread, seconds, hz)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/loop-lag")
+async def loop_lag():
+    """
+    Recent event-loop stalls over the threshold, each with the stack that was running
+    """
+    return {**loop_lag_monitor.stats(), "recent": loop_lag_monitor.stalls()}
@@ -1,45 +1,75 @@
 from fastapi import APIRouter, HTTPException
-from api.database.dtc_descriptions.connection import dtc_db
-from api.database.incidents.connection import incident_db
+from fastapi.responses import JSONResponse
+from api.database.incidents.write_buffer import incident_write_buffer
+from api.database.incidents.rollup_refresher import rollup_refresher
+from api.database.redis.dedup import persisted_events
+from api.database.redis.sweeper import orphan_sweeper
+from api.services.admission import admission_controller
+from api.services.health import health_monitor
 
 router = APIRouter(
     prefix="/health",
     tags=["Health"]
 )
 
+@router.get("/live")
+async def liveness():
+    """
+    The process is up and serving requests; touches no backend
+    """
+    return {"status": "alive"}
+
+@router.get("/ready")
+async def readiness():
+    """
+    Ping MongoDB and Redis concurrently; 503 if any of them is unreachable
+    """
+    backends = await health_monitor.ready()
+    ready = all(backend["status"] == "up" for backend in backends.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "unavailable", "backends": backends}
+    )
+
 @router.get("/")
 async def health_check():
     """
-    Check the health of all system components
+    Check the health of all system components.
+
+    Database figures come from a cached snapshot (see `snapshot.age_seconds`);
+    the in-process stats are current.
     """
     try:
-        # Check DTC Database
-        dtc_status = await dtc_db.is_connected()
-        
-        # Check Incidents Database
-        incident_status = await incident_db.is_connected()
-        
+        snapshot = await health_monitor.snapshot()
+        healthy = all(backend["status"] == "up" for backend in snapshot["backends"].values())
         return {
-            "status": "healthy" if (dtc_status and incident_status) else "degraded",
-            "databases": {
-                "dtc_database": {
-                    "status": "connected" if dtc_status else "disconnected",
-                    "type": "MongoDB",
-                    "name": dtc_db.db_name if hasattr(dtc_db, 'db_name') else None,
-                    "count": await dtc_db.count_documents(),
-                    "latest_doc": await dtc_db.get_latest_document()
-                },
-                "incidents_database": {
-                    "status": "connected" if incident_status else "disconnected",
-                    "type": "MongoDB",
-                    "name": incident_db.db_name if hasattr(incident_db, 'db_name') else None,
-                    "count": await incident_db.count_documents(),
-                    "latest_doc": await incident_db.get_latest_document()
-                }
+            "status": "healthy" if healthy else "degraded",
+            "snapshot": {"taken_at": snapshot["taken_at"], "age_seconds": snapshot["age_seconds"]},
+            "backends": snapshot["backends"],
+            "databases": snapshot["databases"],
+            "partials": {
+                **snapshot["partials"],
+                "sweeper": orphan_sweeper.stats()
+            },
+            "dedup": {
+                "enabled": persisted_events.enabled,
+                **persisted_events.stats()
+            },
+            "admission": {
+                "enabled": admission_controller.enabled,
+                **admission_controller.stats()
+            },
+            "incident_write_buffer": {
+                "enabled": incident_write_buffer.enabled,
+                **incident_write_buffer.stats()
+            },
+            "rollups": {
+                "enabled": rollup_refresher.enabled,
+                **rollup_refresher.stats()
             }
         }
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Health check failed: {str(e)}"
-        ) 
\ No newline at end of file
+        )
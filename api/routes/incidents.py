@@ -0,0 +1,227 @@
+import base64
+import binascii
+import json
+import zlib
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from api.database.incidents.connection import incident_db
+from api.database.incidents.geo import bbox_polygon
+
+router = APIRouter(
+    prefix="/incidents",
+    tags=["Incidents"]
+)
+
+MAX_PAGE_SIZE = 500
+MAX_EXPORT_BATCH_SIZE = 10000
+MAX_RADIUS_KM = 1000
+
+# Fields `fields=` may select; _id and timestamp always come back
+PROJECTABLE_FIELDS = {"account_id", "vehicle_id", "vehicle_tag", "dtc_code", "location"}
+
+def encode_cursor(incident: dict) -> str:
+    """Opaque cursor pointing just past `incident` in (timestamp, _id) order"""
+    key = json.dumps([incident["timestamp"], incident["_id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[int, str]:
+    try:
+        timestamp, incident_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(timestamp, int) or not isinstance(incident_id, str):
+            raise ValueError(cursor)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return timestamp, incident_id
+
+def incident_filters(account_id: Optional[str], vehicle_id: Optional[str], dtc_code: Optional[str]) -> Dict[str, str]:
+    return {
+        name: value for name, value in
+        (("account_id", account_id), ("vehicle_id", vehicle_id), ("dtc_code", dtc_code))
+        if value is not None
+    }
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Comma-separated projection, rejecting fields incidents don't have"""
+    if not fields:
+        return None
+    projection = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = set(projection) - PROJECTABLE_FIELDS - {"_id", "timestamp"}
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return projection
+
+@router.get("")
+async def list_incidents(
+    account_id: Optional[str] = None,
+    vehicle_id: Optional[str] = None,
+    dtc_code: Optional[str] = Query(None, description="DTC code in XXX-X format"),
+    since: Optional[int] = Query(None, description="Unix timestamp; only incidents at or after it"),
+    until: Optional[int] = Query(None, description="Unix timestamp; only incidents before it"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return; _id and timestamp are always included"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page")
+):
+    """
+    Page through incidents, newest first.
+
+    Pages are keyed on (timestamp, _id) rather than skipped over, so every
+    page costs the same however deep into the results it is. Pass the
+    returned `next_cursor` to get the following page; it is null on the last.
+    """
+    # One extra incident tells whether there is a next page without another query
+    incidents = await incident_db.find_incidents(
+        incident_filters(account_id, vehicle_id, dtc_code),
+        since=since,
+        until=until,
+        after=decode_cursor(cursor) if cursor else None,
+        limit=limit + 1,
+        fields=parse_fields(fields)
+    )
+    has_more = len(incidents) > limit
+    incidents = incidents[:limit]
+    return {
+        "incidents": incidents,
+        "next_cursor": encode_cursor(incidents[-1]) if has_more else None
+    }
+
+@router.get("/export")
+async def export_incidents(
+    account_id: Optional[str] = None,
+    vehicle_id: Optional[str] = None,
+    dtc_code: Optional[str] = Query(None, description="DTC code in XXX-X format"),
+    since: Optional[int] = Query(None, description="Unix timestamp; only incidents at or after it"),
+    until: Optional[int] = Query(None, description="Unix timestamp; only incidents before it"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return; _id and timestamp are always included"),
+    cursor: Optional[str] = Query(None, description="Start after this cursor from /incidents"),
+    after_timestamp: Optional[int] = Query(None, description="With after_id: resume after the last incident received"),
+    after_id: Optional[str] = None,
+    batch_size: int = Query(1000, ge=1, le=MAX_EXPORT_BATCH_SIZE, description="Incidents fetched and written per chunk"),
+    gzip: bool = Query(False, description="Compress the stream (Content-Encoding: gzip)")
+):
+    """
+    Stream every matching incident as NDJSON, newest first, in the same
+    order as /incidents.
+
+    Incidents are read from one database cursor and written out a batch at a
+    time, so memory use depends on `batch_size`, not on how many incidents
+    match. To resume an interrupted export, pass the `timestamp` and `_id`
+    of the last complete line as after_timestamp and after_id.
+    """
+    if (after_timestamp is None) != (after_id is None):
+        raise HTTPException(status_code=400, detail="after_timestamp and after_id go together")
+    after = decode_cursor(cursor) if cursor else None
+    if after_id is not None:
+        after = (after_timestamp, after_id)
+
+    documents = incident_db.iter_incidents(
+        incident_filters(account_id, vehicle_id, dtc_code),
+        since=since,
+        until=until,
+        after=after,
+        batch_size=batch_size,
+        fields=parse_fields(fields)
+    )
+    headers = {"Content-Encoding": "gzip"} if gzip else {}
+    return StreamingResponse(ndjson_chunks(documents, batch_size, gzip), media_type="application/x-ndjson", headers=headers)
+
+async def ndjson_chunks(documents: AsyncIterator[dict], batch_size: int, compress: bool) -> AsyncIterator[bytes]:
+    """One chunk of NDJSON lines per `batch_size` documents, gzipped as a single stream when `compress`"""
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    lines = []
+    async for document in documents:
+        lines.append(json.dumps(document, default=str))
+        if len(lines) >= batch_size:
+            chunk = ("\n".join(lines) + "\n").encode()
+            lines = []
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+    chunk = ("\n".join(lines) + "\n").encode() if lines else b""
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+def parse_bbox(bbox: str) -> dict:
+    """min_lng,min_lat,max_lng,max_lat as a GeoJSON polygon"""
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox is min_lng,min_lat,max_lng,max_lat")
+    if not (-180 <= min_lng < max_lng <= 180 and -90 <= min_lat < max_lat <= 90):
+        raise HTTPException(status_code=400, detail="bbox is out of range or empty")
+    return bbox_polygon(min_lng, min_lat, max_lng, max_lat)
+
+def parse_polygon(polygon: str) -> dict:
+    """lng,lat;lng,lat;... as a closed GeoJSON polygon"""
+    try:
+        ring = [[float(value) for value in vertex.split(",")] for vertex in polygon.split(";") if vertex.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="polygon is lng,lat;lng,lat;...")
+    if any(len(vertex) != 2 or not (-180 <= vertex[0] <= 180 and -90 <= vertex[1] <= 90) for vertex in ring):
+        raise HTTPException(status_code=400, detail="polygon vertices are lng,lat pairs in range")
+    if ring and ring[0] != ring[-1]:
+        ring.append(ring[0])
+    if len({tuple(vertex) for vertex in ring}) < 3:
+        raise HTTPException(status_code=400, detail="polygon needs at least three vertices")
+    return {"type": "Polygon", "coordinates": [ring]}
+
+@router.get("/near")
+async def incidents_near(
+    longitude: float = Query(..., ge=-180, le=180),
+    latitude: float = Query(..., ge=-90, le=90),
+    radius_km: float = Query(..., gt=0, le=MAX_RADIUS_KM),
+    account_id: Optional[str] = None,
+    vehicle_id: Optional[str] = None,
+    dtc_code: Optional[str] = Query(None, description="DTC code in XXX-X format"),
+    since: Optional[int] = Query(None, description="Unix timestamp; only incidents at or after it"),
+    until: Optional[int] = Query(None, description="Unix timestamp; only incidents before it"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE)
+):
+    """
+    Incidents within `radius_km` of a point, nearest first, each with its
+    `distance_km`. Served by the location index, not by filtering pages.
+    """
+    incidents = await incident_db.find_near(
+        longitude, latitude, radius_km,
+        incident_filters(account_id, vehicle_id, dtc_code),
+        since=since,
+        until=until,
+        limit=limit
+    )
+    return {"incidents": incidents}
+
+@router.get("/within")
+async def incidents_within(
+    bbox: Optional[str] = Query(None, description="min_lng,min_lat,max_lng,max_lat"),
+    polygon: Optional[str] = Query(None, description="Vertices as lng,lat;lng,lat;... (closed automatically)"),
+    account_id: Optional[str] = None,
+    vehicle_id: Optional[str] = None,
+    dtc_code: Optional[str] = Query(None, description="DTC code in XXX-X format"),
+    since: Optional[int] = Query(None, description="Unix timestamp; only incidents at or after it"),
+    until: Optional[int] = Query(None, description="Unix timestamp; only incidents before it"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE)
+):
+    """
+    The newest incidents inside a bounding box (e.g. the visible map) or a
+    polygon; pass exactly one of `bbox` and `polygon`.
+    """
+    if (bbox is None) == (polygon is None):
+        raise HTTPException(status_code=400, detail="Pass either bbox or polygon")
+    geometry = parse_bbox(bbox) if bbox is not None else parse_polygon(polygon)
+    incidents = await incident_db.find_within(
+        geometry,
+        incident_filters(account_id, vehicle_id, dtc_code),
+        since=since,
+        until=until,
+        limit=limit
+    )
+    return {"incidents": incidents}
+
+@router.get("/{incident_id}")
+async def get_incident(incident_id: str):
+    incident = await incident_db.get_incident_data(incident_id)
+    if incident is None:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    return incident
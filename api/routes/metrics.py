@@ -0,0 +1,23 @@
+import logging
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from api.database.redis.main import redis_db
+from api.services.metrics import OLDEST_PENDING_PARTIAL_AGE, PENDING_PARTIALS
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["Metrics"])
+
+@router.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics in the text exposition format
+    """
+    try:
+        stats = await redis_db.pending_partials_stats()
+        PENDING_PARTIALS.set(stats["pending"])
+        OLDEST_PENDING_PARTIAL_AGE.set(stats["oldest_age_seconds"])
+    except Exception as e:
+        # Still serve the other metrics; the gauges keep their last value
+        logger.error("Error reading pending partials for metrics: %s", e)
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,98 +1,291 @@
-import json
-from fastapi import APIRouter, Depends, HTTPException, Request
-from typing import Dict, Any, List
-from api.models.IncidentWebhook import IncidentModel, WebhookData, DTCData, AlertData
-from api.database.incidents.connection import incident_db
+import logging
+from fastapi import APIRouter, Body, Depends, HTTPException, Request, Response
+from typing import Dict, Any, List, Tuple, Union
+from api.models.IncidentWebhook import (
+    IncidentModel, DTCWebhook, AlertWebhook, DTCPartial, AlertPartial, GeoPoint, incident_webhook_adapter
+)
+from api.database.incidents.connection import incident_db, is_duplicate_key_error
+from api.database.incidents.write_buffer import incident_write_buffer
 from pydantic import BaseModel, Field
 from datetime import datetime, UTC
+from pymongo.errors import DuplicateKeyError
 from api.database.redis.main import redis_db
-router = APIRouter()
+from api.database.redis.dedup import persisted_events
+from api.database.redis.codec import decode_partial, encode_partial
+from api.config import IngestConfig
+from api.services.dtc_normalization import InvalidDTCCode
+from api.services.admission import admission_controller
+from api.services.metrics import INCIDENT_PAIRS_COMPLETED, INGEST_ERRORS, record_error, stage
+
+logger = logging.getLogger(__name__)
+
+# Every webhook route waits for a slot, or is shed with 429 when overloaded
+router = APIRouter(dependencies=[Depends(admission_controller.admit)])
 
 REQUIRED_FIELDS = ["dtc_data", "alert_data"]
 
+# Upper bound on envelopes accepted by one batch request
+MAX_BATCH_SIZE = 1000
+
 @router.post("/webhooks/dtc")
-async def dtc_webhook(payload: WebhookData):
+async def dtc_webhook(request: Request, response: Response):
+    return await ingest_webhook(await request.body(), DTCWebhook, response)
+
+@router.post("/webhooks/alert")
+async def alert_webhook(request: Request, response: Response):
+    return await ingest_webhook(await request.body(), AlertWebhook, response)
+
+async def ingest_webhook(body: bytes, expected: type, response: Response):
+    """
+    Validate a raw request body once, straight into the typed envelope, then
+    hand only the fields the incident needs on to correlation. A retry of an
+    event whose incident is already stored is acknowledged right away.
+    """
     try:
-        payload = DTCData(**payload.data)
+        with stage("validate"):
+            envelope = incident_webhook_adapter.validate_json(body)
+            if not isinstance(envelope, expected):
+                raise ValueError(f"Unexpected entity for this endpoint: {envelope.entity}")
+            event_id, field_name, partial_data = to_partial(envelope)
+        with stage("dedup"):
+            duplicate = await persisted_events.seen(event_id)
+        if duplicate:
+            return {"status": "Duplicate"}
+        if IngestConfig.mode == "stream":
+            with stage("enqueue"):
+                await enqueue_partial(event_id, field_name, partial_data)
+            response.status_code = 202
+            return {"status": "Accepted"}
         await store_and_maybe_combine(
-            event_id=payload.id,
-            field_name="dtc_data",
-            json_data=payload.model_dump_json(),
+            event_id=event_id,
+            field_name=field_name,
+            partial_data=partial_data,
             required_fields=REQUIRED_FIELDS
         )
         return {"status": "OK"}
+    except HTTPException as e:
+        raise e
+    except InvalidDTCCode as e:
+        # A code that can never be stored is refused before it is held as a partial
+        record_error(e)
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
+        record_error(e)
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/webhooks/alert")
-async def alert_webhook(payload: WebhookData):
+def to_partial(envelope: Union[DTCWebhook, AlertWebhook]) -> Tuple[str, str, Union[str, bytes]]:
+    """Project a validated envelope to (event_id, Redis field, encoded partial)"""
+    if isinstance(envelope, DTCWebhook):
+        return envelope.data.id, "dtc_data", encode_partial(DTCPartial.from_dtc_data(envelope.data))
+    return envelope.data.id, "alert_data", encode_partial(AlertPartial.from_alert_data(envelope.data))
+
+@router.post("/webhooks/batch")
+async def batch_webhook(response: Response, payloads: List[Dict[str, Any]] = Body(..., max_length=MAX_BATCH_SIZE)):
+    """
+    Ingest a mixed array of DTC and alert envelopes in one request.
+
+    1. Validate every item; invalid items are reported and skipped.
+    2. Skip items whose incident is already stored, reported as "duplicate".
+    3. Write all partials to Redis in a single pipeline.
+    4. Persist every incident completed by this batch with one insert_many.
+    Returns a status for each item, in request order. A completed partial
+    that fails to combine or store is written back to Redis, so the items
+    that went into it really are still "pending" and a retry of the item
+    reported as "error" completes it.
+
+    The incident write buffer is bypassed here: the batch is already a single
+    insert_many, and "stored" in the response means the incident is in Mongo.
+    In stream mode valid items are only appended to the ingest stream and
+    reported as "queued".
+    """
+    results: List[Dict[str, Any]] = [None] * len(payloads)
+    writes = []
     try:
-        payload = AlertData(**payload.data)
-        await store_and_maybe_combine(
-            event_id=payload.id,
-            field_name="alert_data",
-            json_data=payload.model_dump_json(),
-            required_fields=REQUIRED_FIELDS
-        )
-        return {"status": "OK"}
+        with stage("batch_validate"):
+            for index, item in enumerate(payloads):
+                try:
+                    event_id, field_name, partial_data = to_partial(incident_webhook_adapter.validate_python(item))
+                except Exception as e:
+                    record_error(e)
+                    results[index] = {"status": "error", "detail": str(e)}
+                    continue
+                writes.append((index, event_id, field_name, partial_data))
+
+        with stage("batch_dedup"):
+            seen = await persisted_events.seen_many([event_id for _, event_id, _, _ in writes])
+        for (index, event_id, _, _), duplicate in zip(writes, seen):
+            if duplicate:
+                results[index] = {"id": event_id, "status": "duplicate"}
+        writes = [write for write, duplicate in zip(writes, seen) if not duplicate]
+
+        if IngestConfig.mode == "stream":
+            with stage("batch_enqueue"):
+                await redis_db.xadd_many(
+                    IngestConfig.stream,
+                    [{"id": event_id, "field": field_name, "data": partial_data} for _, event_id, field_name, partial_data in writes],
+                    maxlen=IngestConfig.maxlen
+                )
+            for index, event_id, _, _ in writes:
+                results[index] = {"id": event_id, "status": "queued"}
+            response.status_code = 202
+            return {"status": "Accepted", "results": results}
+
+        with stage("batch_claim"):
+            claimed = await redis_db.hset_and_claim_many(
+                [(f"incident:{event_id}", field_name, partial_data) for _, event_id, field_name, partial_data in writes],
+                REQUIRED_FIELDS
+            )
+
+        incidents = []
+        # Item indexes whose writes went into each claimed hash, by incident position
+        incident_groups = []
+        # The claimed (key, fields) behind each incident, to hand back if it isn't stored
+        incident_claims = []
+        # Claimed partials that could not be combined or stored, written back as pending below
+        unstored = []
+        # Item indexes written to a partial that has not been claimed yet, by event id
+        open_writes: Dict[str, List[int]] = {}
+        for (index, event_id, _, _), all_data in zip(writes, claimed):
+            if isinstance(all_data, Exception):
+                record_error(all_data)
+                results[index] = {"id": event_id, "status": "error", "detail": str(all_data)}
+                continue
+            results[index] = {"id": event_id, "status": "pending"}
+            group = open_writes.setdefault(event_id, [])
+            group.append(index)
+            if all_data is None:
+                continue
+            del open_writes[event_id]
+            try:
+                incidents.append(combine_incident(event_id, all_data))
+                incident_groups.append(group)
+                incident_claims.append((f"incident:{event_id}", all_data))
+            except Exception as e:
+                logger.error("Error processing incident data: %s", e)
+                record_error(e)
+                results[index] = {"id": event_id, "status": "error", "detail": str(e)}
+                unstored.append((f"incident:{event_id}", all_data))
+
+        try:
+            with stage("batch_store"):
+                errors = await incident_db.store_many_incidents(incidents) if incidents else {}
+        except Exception:
+            await restore_claimed(unstored + incident_claims)
+            raise
+        persisted = []
+        for position, group in enumerate(incident_groups):
+            if position in errors and not is_duplicate_key_error(errors[position]):
+                # The claiming write reports the failure; the partial is handed back, so earlier halves stay pending
+                results[group[-1]]["status"] = "error"
+                results[group[-1]]["detail"] = errors[position]
+                unstored.append(incident_claims[position])
+                INGEST_ERRORS.labels("WriteError").inc()
+                continue
+            # Every write in this batch that went into the claimed hash was stored, now or before
+            for index in group:
+                results[index]["status"] = "duplicate" if position in errors else "stored"
+            persisted.append(incidents[position].id)
+            if position not in errors:
+                INCIDENT_PAIRS_COMPLETED.inc()
+        await restore_claimed(unstored)
+        await persisted_events.mark(persisted)
+
+        return {"status": "OK", "results": results}
     except Exception as e:
+        logger.error("Error in batch_webhook: %s", e)
+        record_error(e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-async def store_and_maybe_combine(event_id: str, field_name: str, json_data: str, required_fields: List[str]):
+async def enqueue_partial(event_id: str, field_name: str, partial_data: Union[str, bytes]):
+    """Append a validated partial to the ingest stream for api.worker to combine and store"""
+    await redis_db.xadd(
+        IngestConfig.stream,
+        {"id": event_id, "field": field_name, "data": partial_data},
+        maxlen=IngestConfig.maxlen
+    )
+
+
+def combine_incident(event_id: str, all_data: Dict[str, Union[str, bytes]]) -> IncidentModel:
+    """Combine the claimed DTC and alert partials for an event into one incident doc"""
+    dtc = decode_partial(all_data["dtc_data"], DTCPartial)
+    alert = decode_partial(all_data["alert_data"], AlertPartial)
+
+    # Both partials are already validated, so skip validating the incident again
+    return IncidentModel.model_construct(
+        id=event_id,
+        # Convert timestamp from milliseconds to seconds
+        timestamp=dtc.timestamp // 1000,
+        account_id=dtc.account_id,
+        vehicle_id=dtc.vehicle_id,
+        vehicle_tag=alert.vehicle_tag,
+        dtc_code=dtc.dtc_code,
+        location=GeoPoint.from_location(alert.location)
+    )
+
+
+async def restore_claimed(partials: List[Tuple[str, Dict[str, Union[str, bytes]]]]):
+    """Write claimed (key, fields) partials back to Redis; logs rather than raises, as the caller is already failing"""
+    try:
+        await redis_db.restore_partials(partials)
+    except Exception as e:
+        logger.error("Failed to restore claimed partials %s, they are lost: %s", [key for key, _ in partials], e)
+        record_error(e)
+
+
+async def store_and_maybe_combine(event_id: str, field_name: str, partial_data: Union[str, bytes], required_fields: List[str]):
     """
     1. Save partial data to Redis under 'incident:{event_id}' with the given field name.
-    2. Check if all required fields are present.
-    3. If so, combine them into one incident doc, store in Mongo, and remove from Redis.
+    2. Atomically check if all required fields are present and, if so, claim and remove the hash.
+    3. If this call claimed it, combine the parts into one incident doc and store in Mongo
+       (or queue it on the write buffer when that is enabled). If that fails, the claimed
+       fields are written back so the partial is pending again.
+    4. Once stored, mark the event persisted so retries of it are acknowledged without reprocessing.
     """
     key = f"incident:{event_id}"
 
+    # Refuse before touching Redis rather than claim the partials only to hand them back
+    if incident_write_buffer.enabled and incident_write_buffer.is_full():
+        raise HTTPException(
+            status_code=503,
+            detail="Incident write buffer is full",
+            headers={"Retry-After": "1"}
+        )
+
     try:
-        await redis_db.hset(key, field_name, json_data)
-        all_data = await redis_db.hgetall(key)
-        if all(field in all_data for field in required_fields):
+        with stage("claim"):
+            all_data = await redis_db.hset_and_claim(key, field_name, partial_data, required_fields)
+        if all_data is not None:
             try:
-                dtc_data = json.loads(all_data["dtc_data"])
-                alert_data = json.loads(all_data["alert_data"])
-                
-                dtc_code = dtc_data["type"]
-                if dtc_code.startswith("P"):
-                    numeric_part = dtc_code[1:4]
-                    last_char = dtc_code[4] if len(dtc_code) > 4 else "0"
-                    if last_char.isalpha():
-                        last_digit = str(ord(last_char.upper()) - ord('A'))
-                    else:
-                        last_digit = last_char
-                    dtc_code = f"{numeric_part}-{last_digit}"
-                
-                # Convert timestamp from milliseconds to seconds
-                timestamp = int(dtc_data["timestamp"] / 1000)
-                
-                # Parse location string to float values
-                lat_str, lon_str = alert_data["location"].split(",")
-                lat = float(lat_str)
-                lon = float(lon_str)
-                
-                incident_doc = IncidentModel(
-                    id=event_id,  # Set the id field explicitly
-                    timestamp=timestamp,
-                    account_id=dtc_data["account_id"],
-                    vehicle_id=dtc_data["vehicle_id"],
-                    vehicle_tag=alert_data["vehicle_tag"],
-                    dtc_code=dtc_code,
-                    location={"latitude": lat, "longitude": lon}
-                )
-                
-                print(f"Storing incident document: {incident_doc.model_dump_json()}")
-                await incident_db.store_incident_data(incident_doc)
+                with stage("combine"):
+                    incident_doc = combine_incident(event_id, all_data)
                 
-                await redis_db.delete(key) 
+                if incident_write_buffer.enabled:
+                    with stage("buffer"):
+                        await incident_write_buffer.add(incident_doc)
+                    INCIDENT_PAIRS_COMPLETED.inc()
+                    logger.info("Queued incident", extra={"event_id": event_id, "sample": True})
+                else:
+                    try:
+                        with stage("store"):
+                            await incident_db.store_incident_data(incident_doc)
+                        INCIDENT_PAIRS_COMPLETED.inc()
+                        logger.info("Stored incident", extra={"event_id": event_id, "sample": True})
+                    except DuplicateKeyError:
+                        # Both halves were retried after the first pair was stored
+                        logger.info("Incident already stored", extra={"event_id": event_id})
+                    await persisted_events.mark([event_id])
            
             except Exception as e:
-                print(f"Error processing incident data: {str(e)}")
-                await redis_db.delete(key)
+                logger.error("Error processing incident data: %s", e, extra={"event_id": event_id})
+                record_error(e)
+                # Hand the claimed partials back, so a retry of either half completes the incident
+                await restore_claimed([(key, all_data)])
                 raise HTTPException(status_code=500, detail=str(e))
+    except HTTPException as e:
+        raise e
     except Exception as e:
-        print(f"Error in store_and_maybe_combine: {str(e)}")
+        logger.error("Error in store_and_maybe_combine: %s", e, extra={"event_id": event_id})
+        record_error(e)
         raise HTTPException(status_code=500, detail=str(e))
 
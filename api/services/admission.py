@@ -0,0 +1,151 @@
+# services/admission.py
+
+import asyncio
+import time
+from collections import deque
+from fastapi import HTTPException
+from api.config import AdmissionConfig
+
+class AdmissionController:
+    """
+    Admission control for the webhook routes.
+
+    At most `limit` requests do correlation and persistence work at once;
+    the rest wait in a bounded FIFO queue. `limit` starts at `max_in_flight`
+    and adapts to downstream latency (AIMD): it shrinks by 10% while the
+    average request time is above `latency_target_ms` and grows back by
+    about one slot per round of requests once it recovers.
+
+    A request is refused with 429 and Retry-After, rather than left to time
+    out, when the queue is full, when its expected wait already exceeds
+    `queue_timeout`, or when it has waited that long without a slot.
+    """
+    enabled: bool = AdmissionConfig.enabled
+    max_in_flight: int = AdmissionConfig.max_in_flight
+    max_queue: int = AdmissionConfig.max_queue
+    queue_timeout: float = AdmissionConfig.queue_timeout
+    latency_target_ms: int = AdmissionConfig.latency_target_ms
+    retry_after: int = AdmissionConfig.retry_after
+    min_limit: int = 1
+
+    _limit: float = AdmissionConfig.max_in_flight
+    _in_flight: int = 0
+    _waiters: deque = deque()
+    _latency_ms: float = 0.0
+    _last_decrease: float = 0.0
+    _stats = {}
+
+    @classmethod
+    def reset(cls):
+        """Forget the adapted limit, latency and counters"""
+        cls._limit = cls.max_in_flight
+        cls._in_flight = 0
+        cls._waiters = deque()
+        cls._latency_ms = 0.0
+        cls._last_decrease = 0.0
+        cls._stats = {
+            "admitted": 0,
+            "queued": 0,
+            "max_queue_depth": 0,
+            "shed": 0,
+            "shed_by_reason": {"queue_full": 0, "overloaded": 0, "queue_timeout": 0},
+        }
+
+    @classmethod
+    async def admit(cls):
+        """Router dependency: hold a slot for the duration of the request"""
+        if not cls.enabled:
+            yield
+            return
+        await cls._acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls._release((time.perf_counter() - start) * 1000)
+
+    @classmethod
+    async def _acquire(cls):
+        if cls._in_flight < cls._limit and not cls._waiters:
+            cls._in_flight += 1
+            cls._stats["admitted"] += 1
+            return
+
+        if len(cls._waiters) >= cls.max_queue:
+            cls._shed("queue_full")
+        # Requests ahead of this one, drained `limit` at a time
+        expected_wait = (len(cls._waiters) + 1) / cls._limit * cls._latency_ms / 1000
+        if expected_wait > cls.queue_timeout:
+            cls._shed("overloaded")
+
+        waiter = asyncio.get_running_loop().create_future()
+        cls._waiters.append(waiter)
+        cls._stats["queued"] += 1
+        cls._stats["max_queue_depth"] = max(cls._stats["max_queue_depth"], len(cls._waiters))
+        try:
+            await asyncio.wait_for(waiter, timeout=cls.queue_timeout)
+        except asyncio.TimeoutError:
+            cls._discard(waiter)
+            cls._shed("queue_timeout")
+        except asyncio.CancelledError:
+            # Client went away; hand the slot on if it was already given to us
+            if waiter.done() and not waiter.cancelled():
+                cls._in_flight -= 1
+                cls._wake()
+            cls._discard(waiter)
+            raise
+        cls._stats["admitted"] += 1
+
+    @classmethod
+    def _release(cls, elapsed_ms: float):
+        cls._latency_ms = elapsed_ms if not cls._latency_ms else cls._latency_ms * 0.8 + elapsed_ms * 0.2
+        now = time.monotonic()
+        if cls._latency_ms > cls.latency_target_ms:
+            # At most one decrease per target interval, not one per slow request
+            if now - cls._last_decrease >= cls.latency_target_ms / 1000:
+                cls._limit = max(cls.min_limit, cls._limit * 0.9)
+                cls._last_decrease = now
+        else:
+            cls._limit = min(cls.max_in_flight, cls._limit + 1 / cls._limit)
+        cls._in_flight -= 1
+        cls._wake()
+
+    @classmethod
+    def _wake(cls):
+        """Hand free slots to queued requests, oldest first"""
+        while cls._waiters and cls._in_flight < cls._limit:
+            waiter = cls._waiters.popleft()
+            if not waiter.done():
+                cls._in_flight += 1
+                waiter.set_result(None)
+
+    @classmethod
+    def _discard(cls, waiter: asyncio.Future):
+        try:
+            cls._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    @classmethod
+    def _shed(cls, reason: str):
+        cls._stats["shed"] += 1
+        cls._stats["shed_by_reason"][reason] += 1
+        raise HTTPException(
+            status_code=429,
+            detail="Too many webhooks in flight, retry later",
+            headers={"Retry-After": str(cls.retry_after)}
+        )
+
+    @classmethod
+    def stats(cls):
+        """Current limit, queue depth, latency and shed counters"""
+        stats = dict(cls._stats)
+        stats["shed_by_reason"] = dict(stats["shed_by_reason"])
+        stats["in_flight"] = cls._in_flight
+        stats["queue_depth"] = len(cls._waiters)
+        stats["limit"] = round(cls._limit, 2)
+        stats["latency_ms"] = round(cls._latency_ms, 2)
+        return stats
+
+admission_controller = AdmissionController()
+admission_controller.reset()
@@ -0,0 +1,69 @@
+# services/dtc_normalization.py
+"""
+Normalize DTC codes from the telematics provider to the XXX-X format the
+incidents collection validates against (^\\d{3}-\\d$).
+
+A provider code is the powertrain prefix P, three digits and an optional
+trailing character: P105C -> 105-2. The prefix is dropped, the digits are
+kept and the trailing character maps A-J to 0-9 (a digit is kept as is, a
+missing one means 0). Codes already in XXX-X form pass through.
+
+XXX-X has no room for the system letter, and the DTC descriptions are keyed
+on it without one, so only P codes are accepted: B0105, C0105 and U0105 are
+different faults from P0105 and must not be stored, or counted in the
+rollups, as 010-5. Anything else raises InvalidDTCCode, so a bad code is
+rejected at ingest rather than by Mongo's validator.
+"""
+
+from functools import lru_cache
+from typing import Iterable, List, Optional
+
+class InvalidDTCCode(ValueError):
+    """Raised when a DTC code cannot be normalized to XXX-X"""
+
+# The only system the XXX-X format can represent; see the module docstring
+DTC_PREFIXES = frozenset("P")
+
+# Trailing character -> digit: 0-9 map to themselves, A-J to 0-9
+_LAST_DIGIT = {
+    **{str(d): str(d) for d in range(10)},
+    **{chr(ord("A") + d): str(d) for d in range(10)},
+}
+
+_DIGITS = frozenset("0123456789")
+
+@lru_cache(maxsize=8192)
+def normalize_dtc_code(code: str) -> str:
+    """Normalize a single DTC code to XXX-X, raising InvalidDTCCode if it can't be"""
+    if not isinstance(code, str):
+        raise InvalidDTCCode(f"Invalid DTC code: {code!r}")
+    value = code.strip().upper()
+
+    # Already normalized
+    if len(value) == 5 and value[3] == "-" and _DIGITS.issuperset(value[:3]) and value[4] in _DIGITS:
+        return value
+
+    if len(value) in (4, 5) and value[0] in DTC_PREFIXES and _DIGITS.issuperset(value[1:4]):
+        last_digit = _LAST_DIGIT.get(value[4]) if len(value) == 5 else "0"
+        if last_digit is not None:
+            return f"{value[1:4]}-{last_digit}"
+
+    raise InvalidDTCCode(f"Invalid DTC code: {code!r}")
+
+def normalize_dtc_codes(codes: Iterable[str], strict: bool = True) -> List[Optional[str]]:
+    """
+    Normalize many codes at once, e.g. for backfills and migrations.
+
+    Accepts any iterable of codes (list, tuple, array). With strict=False an
+    invalid code becomes None instead of raising.
+    """
+    normalize = normalize_dtc_code
+    if strict:
+        return [normalize(code) for code in codes]
+    normalized = []
+    for code in codes:
+        try:
+            normalized.append(normalize(code))
+        except InvalidDTCCode:
+            normalized.append(None)
+    return normalized
@@ -0,0 +1,136 @@
+# services/health.py
+"""
+Health probes that stay cheap however often they are polled.
+
+ready() pings MongoDB (both databases) and Redis concurrently, each bounded
+by `ping_timeout`; that is all /health/ready does.
+
+The detail behind /health (estimated document counts, latest documents,
+pending partials) is read by a background task every `interval` seconds
+into a snapshot. /health serves the snapshot, and reads afresh only when it
+is older than `max_age`, e.g. before the task's first run, with one read at
+a time however many requests are waiting. Polling /health therefore costs
+the databases nothing beyond the background reads.
+"""
+
+import logging
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+from api.config import HealthConfig
+from api.database.dtc_descriptions.connection import dtc_db
+from api.database.incidents.connection import incident_db
+from api.database.redis.main import redis_db
+
+logger = logging.getLogger(__name__)
+
+class HealthMonitor:
+    """Readiness pings and the cached health snapshot"""
+    ping_timeout: float = HealthConfig.ping_timeout
+    interval: int = HealthConfig.snapshot_interval
+    max_age: int = HealthConfig.snapshot_max_age
+    # Bound on each snapshot read, so a hung backend can't hold up /health
+    read_timeout: float = 5.0
+
+    _snapshot: Optional[dict] = None
+    _taken_at: float = 0.0
+    _refresh_lock: asyncio.Lock = None
+    _task: asyncio.Task = None
+    _stopping: bool = False
+    _wakeup: asyncio.Event = None
+
+    @staticmethod
+    def _backends() -> Dict[str, Callable[[], Awaitable]]:
+        return {"incidents": incident_db.ping, "dtc_descriptions": dtc_db.ping, "redis": redis_db.ping}
+
+    @classmethod
+    async def start(cls):
+        """Take the first snapshot in the background and keep it fresh"""
+        cls._stopping = False
+        cls._wakeup = asyncio.Event()
+        cls._refresh_lock = asyncio.Lock()
+        cls._task = asyncio.create_task(cls._run())
+        logger.info("Health snapshots every %ss", cls.interval)
+
+    @classmethod
+    async def stop(cls, timeout: float = 5.0):
+        """Stop the background snapshot task"""
+        if cls._task:
+            cls._stopping = True
+            cls._wakeup.set()
+            done, _ = await asyncio.wait({cls._task}, timeout=timeout)
+            if not done:
+                cls._task.cancel()
+            cls._task = None
+
+    @classmethod
+    async def _ping(cls, ping: Callable[[], Awaitable]) -> dict:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(ping(), timeout=cls.ping_timeout)
+        except Exception as e:
+            return {"status": "down", "error": str(e) or type(e).__name__}
+        return {"status": "up", "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+    @classmethod
+    async def ready(cls) -> Dict[str, dict]:
+        """Ping every backend at once: {name: {status, latency_ms or error}}"""
+        backends = cls._backends()
+        results = await asyncio.gather(*(cls._ping(ping) for ping in backends.values()))
+        return dict(zip(backends, results))
+
+    @classmethod
+    async def _database(cls, store) -> dict:
+        try:
+            count, latest = await asyncio.wait_for(
+                asyncio.gather(store.count_documents(), store.get_latest_document()),
+                timeout=cls.read_timeout
+            )
+        except Exception as e:
+            return {"error": str(e) or type(e).__name__}
+        return {"count": count, "latest_doc": latest}
+
+    @classmethod
+    async def refresh(cls) -> dict:
+        """Take a new snapshot"""
+        backends, incidents, dtc_descriptions, partials = await asyncio.gather(
+            cls.ready(),
+            cls._database(incident_db),
+            cls._database(dtc_db),
+            asyncio.wait_for(redis_db.pending_partials_stats(), timeout=cls.read_timeout),
+            return_exceptions=True
+        )
+        cls._snapshot = {
+            "backends": backends,
+            "databases": {"incidents_database": incidents, "dtc_database": dtc_descriptions},
+            "partials": partials if not isinstance(partials, Exception) else {"error": str(partials) or type(partials).__name__},
+            "taken_at": int(time.time()),
+        }
+        cls._taken_at = time.monotonic()
+        return cls._snapshot
+
+    @classmethod
+    async def snapshot(cls) -> dict:
+        """The current snapshot, refreshed first if it is older than `max_age`, with its age"""
+        if cls._refresh_lock is None:
+            cls._refresh_lock = asyncio.Lock()
+        if cls._snapshot is None or time.monotonic() - cls._taken_at > cls.max_age:
+            async with cls._refresh_lock:
+                # Another request may have refreshed it while this one waited
+                if cls._snapshot is None or time.monotonic() - cls._taken_at > cls.max_age:
+                    await cls.refresh()
+        return {**cls._snapshot, "age_seconds": round(time.monotonic() - cls._taken_at, 1)}
+
+    @classmethod
+    async def _run(cls):
+        while not cls._stopping:
+            try:
+                await cls.refresh()
+            except Exception as e:
+                logger.error("Error taking health snapshot: %s", e)
+            try:
+                await asyncio.wait_for(cls._wakeup.wait(), timeout=cls.interval)
+            except asyncio.TimeoutError:
+                pass
+
+health_monitor = HealthMonitor()
@@ -0,0 +1,189 @@
+# services/profiling.py
+"""
+Production profiling that is cheap enough to leave running.
+
+SamplingProfiler: on request, a thread samples the event-loop thread's stack
+every 1/hz seconds for a few seconds and returns the samples in the collapsed
+format flamegraph.pl and speedscope read ("outer;inner;leaf count"). Nothing
+runs between requests.
+
+LoopLagMonitor: a heartbeat task on the loop wakes every `interval` and
+records how late it ran (event_loop_lag_seconds). A watchdog thread notices
+when the heartbeat has been stuck for more than `threshold` and captures the
+loop thread's stack at that moment: the callback that is blocking the loop.
+Each stall is kept, with its duration and that stack, in a short ring buffer.
+
+Both only see Python frames on the loop thread, which is where the request
+handlers and all background tasks (write buffer, orphan sweeper, snapshots)
+run.
+"""
+
+import logging
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, List, Optional
+from api.config import DebugConfig
+from api.services.metrics import EVENT_LOOP_LAG
+
+logger = logging.getLogger(__name__)
+
+_CWD = os.getcwd()
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    path = code.co_filename
+    if path.startswith(_CWD):
+        path = os.path.relpath(path, _CWD)
+    else:
+        path = os.path.basename(path)
+    # First line of the function rather than the current line, so samples of one function aggregate
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+def _stack(frame) -> List[str]:
+    """Frame names from the outermost call to `frame`"""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+class SamplingProfiler:
+    """On-demand sampling of the event-loop thread; one profile at a time"""
+    max_seconds: int = DebugConfig.profile_max_seconds
+
+    _lock = threading.Lock()
+
+    @classmethod
+    def is_running(cls) -> bool:
+        return cls._lock.locked()
+
+    @classmethod
+    def profile(cls, thread_id: int, seconds: float, hz: int = 100) -> str:
+        """Sample `thread_id` for `seconds` (blocking; run it off the loop) and return collapsed stacks"""
+        if not cls._lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            samples: Counter = Counter()
+            interval = 1 / hz
+            deadline = time.perf_counter() + min(seconds, cls.max_seconds)
+            while time.perf_counter() < deadline:
+                frame = sys._current_frames().get(thread_id)
+                if frame is None:
+                    break
+                samples[";".join(_stack(frame))] += 1
+                del frame
+                time.sleep(interval)
+            return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+        finally:
+            cls._lock.release()
+
+class LoopLagMonitor:
+    """Heartbeat task plus watchdog thread recording event-loop stalls with their stack"""
+    threshold: float = DebugConfig.loop_lag_threshold
+    interval: float = DebugConfig.loop_monitor_interval
+    max_stalls: int = DebugConfig.max_stalls
+
+    _task: asyncio.Task = None
+    _watchdog: threading.Thread = None
+    _stopping: bool = False
+    _wakeup: asyncio.Event = None
+    _watchdog_stop: threading.Event = None
+    _loop_thread: int = None
+    _last_beat: float = 0.0
+    _beats: int = 0
+    # (number of the heartbeat the stack was captured during, stack)
+    _captured: Optional[tuple] = None
+    _stalls: deque = deque()
+    _stats = {}
+
+    @classmethod
+    async def start(cls):
+        """Start monitoring the running loop"""
+        cls._loop_thread = threading.get_ident()
+        cls._last_beat = time.perf_counter()
+        cls._beats = 0
+        cls._captured = None
+        cls._stalls = deque(maxlen=cls.max_stalls)
+        cls._stats = {"stalls": 0, "max_lag_ms": 0.0}
+        cls._stopping = False
+        cls._wakeup = asyncio.Event()
+        cls._watchdog_stop = threading.Event()
+        cls._task = asyncio.create_task(cls._beat())
+        cls._watchdog = threading.Thread(target=cls._watch, name="loop-lag-watchdog", daemon=True)
+        cls._watchdog.start()
+        logger.info("Event loop monitor started (threshold %.0fms)", cls.threshold * 1000)
+
+    @classmethod
+    async def stop(cls, timeout: float = 5.0):
+        """Stop the heartbeat task and the watchdog thread"""
+        if cls._task:
+            cls._stopping = True
+            cls._wakeup.set()
+            cls._watchdog_stop.set()
+            done, _ = await asyncio.wait({cls._task}, timeout=timeout)
+            if not done:
+                cls._task.cancel()
+            cls._task = None
+            await asyncio.to_thread(cls._watchdog.join, timeout)
+            cls._watchdog = None
+
+    @classmethod
+    async def _beat(cls):
+        while not cls._stopping:
+            beat = cls._beats
+            expected = time.perf_counter() + cls.interval
+            try:
+                await asyncio.wait_for(cls._wakeup.wait(), timeout=cls.interval)
+            except asyncio.TimeoutError:
+                pass
+            now = time.perf_counter()
+            lag = max(0.0, now - expected)
+            cls._last_beat = now
+            cls._beats += 1
+            EVENT_LOOP_LAG.observe(lag)
+            if lag > cls.threshold and not cls._stopping:
+                cls._record_stall(lag, beat)
+
+    @classmethod
+    def _record_stall(cls, lag: float, beat: int):
+        captured, cls._captured = cls._captured, None
+        stack = captured[1] if captured and captured[0] == beat else None
+        cls._stalls.append({
+            "at": round(time.time() - lag, 3),
+            "duration_ms": round(lag * 1000, 1),
+            # None when the stall ended before the watchdog looked
+            "stack": stack,
+        })
+        cls._stats["stalls"] += 1
+        cls._stats["max_lag_ms"] = max(cls._stats["max_lag_ms"], round(lag * 1000, 1))
+        where = stack[-1] if stack else "unknown"
+        logger.warning("Event loop blocked for %.0fms in %s", lag * 1000, where, extra={"stack": stack})
+
+    @classmethod
+    def _watch(cls):
+        while not cls._watchdog_stop.wait(cls.interval):
+            beat, last_beat = cls._beats, cls._last_beat
+            stuck = time.perf_counter() - last_beat - cls.interval
+            if stuck > cls.threshold and (cls._captured is None or cls._captured[0] != beat):
+                frame = sys._current_frames().get(cls._loop_thread)
+                if frame is not None:
+                    cls._captured = (beat, _stack(frame))
+                    del frame
+
+    @classmethod
+    def stalls(cls) -> List[Dict]:
+        """Recent stalls, newest last"""
+        return list(cls._stalls)
+
+    @classmethod
+    def stats(cls):
+        """Stall count and the longest lag seen"""
+        return {**cls._stats, "threshold_ms": cls.threshold * 1000, "running": cls._task is not None}
+
+sampling_profiler = SamplingProfiler()
+loop_lag_monitor = LoopLagMonitor()
@@ -0,0 +1,131 @@
+# worker.py
+"""
+Ingest worker for INGEST_MODE=stream.
+
+The webhook handlers only append validated partials to the ingest stream;
+this process reads them through a consumer group and runs the same
+combine-and-store logic the handlers run in sync mode. Entries left pending
+by a crashed worker are taken over with XAUTOCLAIM, and entries that keep
+failing are moved to the dead-letter stream after INGEST_MAX_DELIVERIES.
+
+    python -m api.worker [--consumer NAME] [--metrics-port PORT]
+"""
+
+import argparse
+import logging
+import asyncio
+import os
+import signal
+import socket
+from prometheus_client import start_http_server
+from typing import Dict, List, Tuple
+from api.config import IngestConfig
+from api.database.incidents.connection import incident_db
+from api.database.incidents.write_buffer import incident_write_buffer
+from api.database.redis.main import redis_db
+from api.database.redis.dedup import persisted_events
+from api.database.redis.codec import check_encoding
+from api.services.profiling import loop_lag_monitor
+from api.routes.webhooks import REQUIRED_FIELDS, store_and_maybe_combine
+from api.log import setup_logging
+
+logger = logging.getLogger(__name__)
+
+BATCH_COUNT = int(os.getenv("INGEST_BATCH_COUNT", "100"))
+BLOCK_MS = int(os.getenv("INGEST_BLOCK_MS", "5000"))
+
+async def process_entry(consumer: str, entry_id: str, fields: Dict[str, str]):
+    """Combine-and-store one stream entry, acknowledging it once it is handled"""
+    try:
+        # The webhook may have been retried after its first delivery was queued
+        if await persisted_events.seen(fields["id"]):
+            await redis_db.xack(IngestConfig.stream, IngestConfig.group, entry_id)
+            return
+        await store_and_maybe_combine(
+            event_id=fields["id"],
+            field_name=fields["field"],
+            partial_data=fields["data"],
+            required_fields=REQUIRED_FIELDS
+        )
+        await redis_db.xack(IngestConfig.stream, IngestConfig.group, entry_id)
+    except Exception as e:
+        error = getattr(e, "detail", None) or str(e)
+        deliveries = await redis_db.xdelivery_count(IngestConfig.stream, IngestConfig.group, entry_id)
+        if deliveries >= IngestConfig.max_deliveries:
+            logger.warning("Giving up on ingest entry %s after %s deliveries: %s", entry_id, deliveries, error)
+            await redis_db.xadd(
+                IngestConfig.dead_letter_stream,
+                {**fields, "entry_id": entry_id, "error": error},
+                maxlen=IngestConfig.maxlen
+            )
+            await redis_db.xack(IngestConfig.stream, IngestConfig.group, entry_id)
+        else:
+            # Left pending; XAUTOCLAIM hands it out again after INGEST_CLAIM_IDLE_MS
+            logger.error("Error processing ingest entry %s (delivery %s): %s", entry_id, deliveries, error)
+
+async def process_batch(consumer: str, count: int = BATCH_COUNT, block_ms: int = BLOCK_MS) -> int:
+    """Process stuck entries first, otherwise new ones; returns the number of entries handled"""
+    entries: List[Tuple[str, Dict[str, str]]] = await redis_db.xautoclaim(
+        IngestConfig.stream, IngestConfig.group, consumer, IngestConfig.claim_idle_ms, count
+    )
+    if not entries:
+        entries = await redis_db.xreadgroup(IngestConfig.stream, IngestConfig.group, consumer, count, block_ms)
+    # Partials of the same event are safe to run together: claiming the pair is atomic
+    await asyncio.gather(*(process_entry(consumer, entry_id, fields) for entry_id, fields in entries))
+    return len(entries)
+
+async def run(consumer: str, stop: asyncio.Event):
+    """Connect, then process batches until `stop` is set"""
+    check_encoding()
+    await loop_lag_monitor.start()
+    await incident_db.connect()
+    await redis_db.connect()
+    await redis_db.xgroup_create(IngestConfig.stream, IngestConfig.group)
+    if incident_write_buffer.enabled:
+        await incident_write_buffer.start()
+    logger.info("Ingest worker %s reading %s as group %s", consumer, IngestConfig.stream, IngestConfig.group)
+
+    try:
+        while not stop.is_set():
+            try:
+                await process_batch(consumer)
+            except Exception as e:
+                logger.error("Error in ingest worker loop: %s", e)
+                await asyncio.sleep(1)
+    finally:
+        try:
+            if incident_write_buffer.enabled:
+                await incident_write_buffer.stop()
+        except Exception as e:
+            logger.error("Failed to drain incident write buffer, %s incidents lost: %s", incident_write_buffer.stats()['pending'], e)
+        finally:
+            await incident_db.close()
+            await redis_db.close()
+            await loop_lag_monitor.stop()
+            logger.info("Ingest worker %s stopped", consumer)
+
+async def main(consumer: str):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await run(consumer, stop)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consume the incident ingest stream")
+    parser.add_argument(
+        "--consumer",
+        default=os.getenv("INGEST_CONSUMER", f"{socket.gethostname()}-{os.getpid()}"),
+        help="Consumer name within the group (must be unique per worker process)"
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=int(os.getenv("WORKER_METRICS_PORT", "0")),
+        help="Serve Prometheus metrics on this port (0 disables)"
+    )
+    args = parser.parse_args()
+    setup_logging()
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+    asyncio.run(main(args.consumer))
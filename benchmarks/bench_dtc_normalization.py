@@ -0,0 +1,47 @@
+"""
+Compare DTC code normalization against the inline conversion it replaced.
+
+    python -m benchmarks.bench_dtc_normalization [--codes N]
+"""
+
+import argparse
+import random
+import timeit
+from api.services.dtc_normalization import normalize_dtc_code, normalize_dtc_codes
+
+def legacy_normalize(dtc_code: str) -> str:
+    """The conversion previously inlined in store_and_maybe_combine"""
+    if dtc_code.startswith("P"):
+        numeric_part = dtc_code[1:4]
+        last_char = dtc_code[4] if len(dtc_code) > 4 else "0"
+        if last_char.isalpha():
+            last_digit = str(ord(last_char.upper()) - ord('A'))
+        else:
+            last_digit = last_char
+        dtc_code = f"{numeric_part}-{last_digit}"
+    return dtc_code
+
+def make_codes(count: int, distinct: int = 500):
+    """A realistic stream: a fleet reports a few hundred distinct codes over and over"""
+    rng = random.Random(42)
+    pool = [f"P{rng.randint(0, 999):03d}{rng.choice('0123456789ABCDEFGHIJ')}" for _ in range(distinct)]
+    return [rng.choice(pool) for _ in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--codes", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    codes = make_codes(args.codes)
+
+    cases = {
+        "legacy inline": lambda: [legacy_normalize(code) for code in codes],
+        "normalize_dtc_code": lambda: [normalize_dtc_code(code) for code in codes],
+        "normalize_dtc_codes": lambda: normalize_dtc_codes(codes),
+    }
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=1, repeat=args.repeat))
+        print(f"{name:22s} {best * 1000:8.2f} ms  {best / len(codes) * 1e9:7.1f} ns/code")
+
+if __name__ == "__main__":
+    main()
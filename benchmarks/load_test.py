@@ -0,0 +1,268 @@
+"""
+End-to-end load test: paired DTC and alert webhooks against a running app.
+
+    python -m benchmarks.load_test --url http://localhost:8000 [--rate 200 --duration 30]
+    python -m benchmarks.load_test --launch [--output results.json]
+
+Traffic is open-loop: event pairs start at `--rate` per second whatever the
+response times. The second half of each pair follows after an exponentially
+distributed delay with mean `--pair-delay-ms`. A share of the pairs arrive
+alert-first (`--out-of-order`), and a share get one half delivered again
+later, like a provider retry (`--duplicates`).
+
+With --launch, a throwaway redis-server and mongod (both must be on PATH)
+and a uvicorn app on top of them are started and stopped again, so real
+I/O costs are measured instead of the in-memory backends.
+
+Prints a JSON report with throughput, p50/p95/p99 latency and error rates,
+overall and per request kind, followed by the app's /health stats.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import httpx
+
+DTC_CODES = [f"P{code:03d}{suffix}" for code in range(100, 140) for suffix in "0ACF"]
+
+def make_dtc(event_id: str, vehicle: int, timestamp_ms: int, rng: random.Random) -> dict:
+    code = rng.choice(DTC_CODES)
+    return {
+        "data": {
+            "id": event_id,
+            "timestamp": timestamp_ms,
+            "account_id": "load-test-account",
+            "vehicle_id": f"load-test-vehicle-{vehicle}",
+            "dtcs": [{"t": timestamp_ms, "code": code, "status": 1}],
+            "mid": "144",
+            "is_sid": True,
+            "type": code,
+            "status": "active",
+            "is_set": True
+        },
+        "action": "create",
+        "entity": "dtcs_change_log"
+    }
+
+def make_alert(event_id: str, vehicle: int, timestamp_ms: int, rng: random.Random) -> dict:
+    return {
+        "data": {
+            "id": event_id,
+            "account_id": "load-test-account",
+            "vehicle_id": f"load-test-vehicle-{vehicle}",
+            "location": f"{rng.uniform(8, 35):.6f},{rng.uniform(68, 97):.6f}",
+            "timestamp": timestamp_ms,
+            "vehicle_plate": f"LT{vehicle:06d}",
+            "vehicle_tag": f"LT {vehicle:06d}",
+            "type": "engine_temperature",
+            "alert_values": json.dumps({"temperature": rng.randint(80, 120)}),
+            "address": "Load Test"
+        },
+        "action": "create",
+        "entity": "alert_log"
+    }
+
+def make_schedule(args) -> List[tuple]:
+    """(send at seconds, kind, path, body) for every request, ordered by send time"""
+    rng = random.Random(args.seed)
+    run_id = f"{int(time.time())}-{rng.randrange(1 << 30):x}"
+    schedule = []
+    for i in range(int(args.rate * args.duration)):
+        start = i / args.rate
+        event_id = f"load-{run_id}-{i}"
+        vehicle = rng.randrange(args.vehicles)
+        timestamp_ms = int(time.time() * 1000)
+        halves = [
+            ("/api/v1/webhooks/dtc", make_dtc(event_id, vehicle, timestamp_ms, rng)),
+            ("/api/v1/webhooks/alert", make_alert(event_id, vehicle, timestamp_ms, rng)),
+        ]
+        if rng.random() < args.out_of_order:
+            halves.reverse()
+        second = start + rng.expovariate(1000 / args.pair_delay_ms) if args.pair_delay_ms else start
+        schedule.append((start, "first", *halves[0]))
+        schedule.append((second, "second", *halves[1]))
+        if rng.random() < args.duplicates:
+            path, body = rng.choice(halves)
+            schedule.append((second + rng.uniform(0, args.duplicate_delay_ms / 1000), "duplicate", path, body))
+    schedule.sort(key=lambda item: item[0])
+    return schedule
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))
+    return round(values[index], 3)
+
+def summarize(samples: List[tuple], elapsed: float) -> Dict:
+    """Throughput, latency percentiles and error rate for (latency ms, status) samples"""
+    latencies = sorted(latency for latency, _ in samples)
+    statuses: Dict[str, int] = {}
+    for _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+    return {
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": round(latencies[-1], 3) if latencies else None,
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else None,
+        },
+        "status_counts": statuses,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+    }
+
+async def run_load(args) -> Dict:
+    schedule = make_schedule(args)
+    samples: Dict[str, List[tuple]] = {"first": [], "second": [], "duplicate": []}
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        async def send(kind: str, path: str, body: dict):
+            start = time.perf_counter()
+            try:
+                status = (await client.post(path, json=body)).status_code
+            except httpx.TimeoutException:
+                status = "timeout"
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            samples[kind].append(((time.perf_counter() - start) * 1000, status))
+
+        tasks = []
+        began = time.perf_counter()
+        for send_at, kind, path, body in schedule:
+            delay = send_at - (time.perf_counter() - began)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(kind, path, body)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - began
+
+        try:
+            health = (await client.get("/api/v1/health/")).json()
+        except Exception as e:
+            health = {"error": str(e)}
+
+    everything = [sample for kind_samples in samples.values() for sample in kind_samples]
+    return {
+        "config": {
+            key: getattr(args, key)
+            for key in ("url", "rate", "duration", "pair_delay_ms", "out_of_order", "duplicates", "connections", "seed")
+        },
+        "elapsed_seconds": round(elapsed, 3),
+        "offered_rps": round(len(schedule) / args.duration, 2),
+        "overall": summarize(everything, elapsed),
+        "by_kind": {kind: summarize(kind_samples, elapsed) for kind, kind_samples in samples.items()},
+        "server": {key: health.get(key) for key in ("partials", "dedup", "admission", "incident_write_buffer")}
+        if "error" not in health else health,
+    }
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_for_port(port: int, process: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args[0]} exited with code {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{process.args[0]} did not listen on port {port} within {timeout}s")
+
+@contextmanager
+def launched_app(args):
+    """Start redis-server, mongod and the app on free ports; yield the app URL"""
+    for binary in ("redis-server", "mongod"):
+        if not shutil.which(binary):
+            raise SystemExit(f"--launch needs {binary} on PATH")
+    processes = []
+    with tempfile.TemporaryDirectory(prefix="bem-load-") as workdir:
+        try:
+            redis_port, mongo_port, app_port = free_port(), free_port(), free_port()
+            redis = subprocess.Popen(
+                ["redis-server", "--port", str(redis_port), "--save", "", "--appendonly", "no"],
+                stdout=subprocess.DEVNULL
+            )
+            processes.append(redis)
+            mongo = subprocess.Popen(
+                ["mongod", "--port", str(mongo_port), "--dbpath", workdir, "--bind_ip", "127.0.0.1"],
+                stdout=subprocess.DEVNULL
+            )
+            processes.append(mongo)
+            wait_for_port(redis_port, redis)
+            wait_for_port(mongo_port, mongo)
+
+            env = {
+                **os.environ,
+                "ENVIRONMENT": "dev",
+                "INCIDENT_BACKEND": "mongo",
+                "CORRELATION_BACKEND": "redis",
+                "REDIS_URL": f"redis://127.0.0.1:{redis_port}",
+                "MONGO_URI": f"mongodb://127.0.0.1:{mongo_port}",
+            }
+            app = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(app_port), "--log-level", "warning"],
+                env=env,
+                stdout=subprocess.DEVNULL if not args.app_output else None
+            )
+            processes.append(app)
+            wait_for_port(app_port, app, timeout=60.0)
+            yield f"http://127.0.0.1:{app_port}"
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000", help="App to load (ignored with --launch)")
+    parser.add_argument("--launch", action="store_true", help="Start local redis-server, mongod and the app")
+    parser.add_argument("--app-output", action="store_true", help="Show the launched app's output")
+    parser.add_argument("--rate", type=float, default=100.0, help="Event pairs started per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds over which pairs are started")
+    parser.add_argument("--pair-delay-ms", type=float, default=200.0, help="Mean delay between the two halves")
+    parser.add_argument("--out-of-order", type=float, default=0.3, help="Share of pairs sent alert first")
+    parser.add_argument("--duplicates", type=float, default=0.05, help="Share of pairs with one half redelivered")
+    parser.add_argument("--duplicate-delay-ms", type=float, default=2000.0, help="Maximum delay of a redelivery")
+    parser.add_argument("--vehicles", type=int, default=500)
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    if args.launch:
+        with launched_app(args) as url:
+            args.url = url
+            report = asyncio.run(run_load(args))
+    else:
+        report = asyncio.run(run_load(args))
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Microbenchmarks for the CPU-bound parts of webhook ingest (pytest-benchmark).
+
+Not collected by the normal test run. Save a baseline, then compare a change
+against it and fail if any median got more than 10% slower:
+
+    pytest benchmarks --benchmark-autosave
+    pytest benchmarks --benchmark-compare --benchmark-compare-fail=median:10%
+
+Runs are stored per machine under .benchmarks/, so compare only against a
+baseline taken on the same machine.
+"""
+
+import asyncio
+import json
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from api.database.incidents.connection import incident_db
+from api.database.redis.dedup import persisted_events
+from api.database.redis.main import redis_db
+from api.models.IncidentWebhook import (
+    AlertData, AlertPartial, DTCData, DTCPartial, IncidentModel, WebhookData,
+    incident_webhook_adapter, parse_location
+)
+from api.routes import webhooks
+from api.routes.webhooks import combine_incident, store_and_maybe_combine, to_partial
+from api.services.dtc_normalization import normalize_dtc_code
+
+DTC_WEBHOOK = {
+    "data": {
+        "id": "bench-id-123",
+        "timestamp": 1706630400000,
+        "account_id": "bench-account",
+        "vehicle_id": "bench-vehicle",
+        "dtcs": [{"t": 1706630400000, "code": "P105C", "status": 1}],
+        "mid": "144",
+        "is_sid": True,
+        "type": "P105C",
+        "status": "active",
+        "is_set": True
+    },
+    "action": "create",
+    "entity": "dtcs_change_log"
+}
+
+ALERT_WEBHOOK = {
+    "data": {
+        "id": "bench-id-123",
+        "account_id": "bench-account",
+        "vehicle_id": "bench-vehicle",
+        "location": "16.709181666666666,74.28041166666667",
+        "timestamp": 1706630400000,
+        "vehicle_plate": "AB01CD1234",
+        "vehicle_tag": "AB 01 CD 1234",
+        "type": "engine_temperature",
+        "alert_values": json.dumps({"temperature": 95}),
+        "address": "Bench Location"
+    },
+    "action": "create",
+    "entity": "alert_log"
+}
+
+DTC_BODY = json.dumps(DTC_WEBHOOK).encode()
+ALERT_BODY = json.dumps(ALERT_WEBHOOK).encode()
+
+CLAIMED = {
+    "dtc_data": to_partial(incident_webhook_adapter.validate_json(DTC_BODY))[2],
+    "alert_data": to_partial(incident_webhook_adapter.validate_json(ALERT_BODY))[2],
+}
+
+INCIDENT_FIELDS = {
+    "id": "bench-id-123",
+    "timestamp": 1706630400,
+    "account_id": "bench-account",
+    "vehicle_id": "bench-vehicle",
+    "vehicle_tag": "AB 01 CD 1234",
+    "dtc_code": "105-2",
+    "location": {"type": "Point", "coordinates": [74.28041166666667, 16.709181666666666]},
+}
+
+# Envelope validation
+
+def test_webhook_data(benchmark):
+    benchmark(WebhookData.model_validate, DTC_WEBHOOK)
+
+def test_dtc_data(benchmark):
+    benchmark(DTCData.model_validate, DTC_WEBHOOK["data"])
+
+def test_alert_data(benchmark):
+    benchmark(AlertData.model_validate, ALERT_WEBHOOK["data"])
+
+def test_validate_dtc_body(benchmark):
+    benchmark(incident_webhook_adapter.validate_json, DTC_BODY)
+
+def test_validate_alert_body(benchmark):
+    benchmark(incident_webhook_adapter.validate_json, ALERT_BODY)
+
+# Field conversions
+
+def test_normalize_dtc_code_cached(benchmark):
+    normalize_dtc_code("P105C")
+    benchmark(normalize_dtc_code, "P105C")
+
+def test_normalize_dtc_code_uncached(benchmark):
+    benchmark(normalize_dtc_code.__wrapped__, "P105C")
+
+def test_parse_location(benchmark):
+    benchmark(parse_location, ALERT_WEBHOOK["data"]["location"])
+
+# Partials and the incident document
+
+def test_to_partial(benchmark):
+    envelope = incident_webhook_adapter.validate_json(DTC_BODY)
+    benchmark(to_partial, envelope)
+
+def test_decode_partials(benchmark):
+    benchmark(lambda: (
+        DTCPartial.model_validate_json(CLAIMED["dtc_data"]),
+        AlertPartial.model_validate_json(CLAIMED["alert_data"])
+    ))
+
+def test_incident_model(benchmark):
+    benchmark(lambda: IncidentModel(**INCIDENT_FIELDS))
+
+def test_incident_model_dump(benchmark):
+    incident = IncidentModel(**INCIDENT_FIELDS)
+    benchmark(incident.model_dump, by_alias=True)
+
+def test_combine_incident(benchmark):
+    benchmark(combine_incident, "bench-id-123", CLAIMED)
+
+def test_store_and_maybe_combine(benchmark, monkeypatch):
+    """The claiming call end to end, with Redis and Mongo stubbed out"""
+    async def claim(*args):
+        return dict(CLAIMED)
+
+    async def noop(*args):
+        return None
+
+    monkeypatch.setattr(redis_db, "hset_and_claim", claim)
+    monkeypatch.setattr(incident_db, "store_incident_data", noop)
+    monkeypatch.setattr(persisted_events, "mark", noop)
+
+    loop = asyncio.new_event_loop()
+    try:
+        benchmark(lambda: loop.run_until_complete(store_and_maybe_combine(
+            "bench-id-123", "alert_data", CLAIMED["alert_data"], webhooks.REQUIRED_FIELDS
+        )))
+    finally:
+        loop.close()
@@ -0,0 +1,174 @@
+"""
+Storage size and range-query latency of the regular vs the time-series incident layout.
+
+    python -m benchmarks.timeseries_storage --uri mongodb://localhost:27017 [--incidents 1000000]
+    python -m benchmarks.timeseries_storage --launch [--output storage.json]
+
+Loads the same synthetic incidents into a scratch database once per layout,
+with the layout's indexes from schema.py, then reports data, storage and
+index sizes and the latency of typical range queries: one account's or one
+vehicle's incidents in a time window, newest first, through the same query
+builders the app uses. With --launch a throwaway mongod (must be on PATH)
+is started and stopped again.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict
+from motor.motor_asyncio import AsyncIOMotorClient
+from api.database.incidents.connection import IncidentDatabase, TimeSeriesIncidentDatabase
+from api.database.incidents.schema import INCIDENT_INDEXES, TIMESERIES_INCIDENT_INDEXES, create_indexes
+from api.database.incidents.timeseries import timeseries_options
+from benchmarks.load_test import free_port, percentile, wait_for_port
+
+START = 1706630400
+
+LAYOUTS = {
+    "collection": (IncidentDatabase, INCIDENT_INDEXES),
+    "timeseries": (TimeSeriesIncidentDatabase, TIMESERIES_INCIDENT_INDEXES),
+}
+
+def make_incident(i: int, args, rng: random.Random) -> dict:
+    vehicle = rng.randrange(args.vehicles)
+    return {
+        "_id": f"{rng.getrandbits(64):016x}-{i}",
+        "timestamp": START + int(i * args.days * 86400 / args.incidents),
+        "account_id": f"account-{vehicle % args.accounts}",
+        "vehicle_id": f"vehicle-{vehicle}",
+        "vehicle_tag": f"AB {vehicle % 100:02d} CD {vehicle:04d}",
+        "dtc_code": f"{rng.randrange(100, 140)}-{rng.randrange(4)}",
+        "location": {"type": "Point", "coordinates": [74.28 + rng.random(), 16.70 + rng.random()]},
+    }
+
+async def load(db, name: str, args) -> float:
+    """Create the layout's collection and insert the incidents; returns seconds taken"""
+    database, indexes = LAYOUTS[name]
+    await db.drop_collection("incidents")
+    if name == "timeseries":
+        await db.create_collection("incidents", **timeseries_options(args.granularity, 0))
+    else:
+        await db.create_collection("incidents")
+    await create_indexes(db.incidents, indexes)
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    batch = []
+    for i in range(args.incidents):
+        batch.append(database._to_stored(make_incident(i, args, rng)))
+        if len(batch) >= args.batch_size:
+            await db.incidents.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.incidents.insert_many(batch, ordered=False)
+    return time.perf_counter() - started
+
+async def storage(db) -> Dict[str, int]:
+    stats = await db.incidents.aggregate([{"$collStats": {"storageStats": {}}}]).to_list(length=1)
+    storage_stats = stats[0]["storageStats"]
+    return {
+        "data_bytes": storage_stats.get("size", 0),
+        "storage_bytes": storage_stats.get("storageSize", 0),
+        "index_bytes": storage_stats.get("totalIndexSize", 0),
+    }
+
+async def query_latency(db, name: str, args) -> Dict[str, Dict]:
+    """p50/p95 of account and vehicle window queries, in milliseconds"""
+    database, _ = LAYOUTS[name]
+    database.collection = db.incidents
+    rng = random.Random(args.seed + 1)
+    window = args.window_hours * 3600
+    results = {}
+    for field, count in (("account_id", args.accounts), ("vehicle_id", args.vehicles)):
+        samples = []
+        for _ in range(args.queries):
+            since = START + rng.randrange(max(1, args.days * 86400 - window))
+            filters = {field: f"{field.split('_')[0]}-{rng.randrange(count)}"}
+            started = time.perf_counter()
+            await database.find_incidents(filters, since=since, until=since + window, limit=args.limit)
+            samples.append((time.perf_counter() - started) * 1000)
+        samples.sort()
+        results[field.split("_")[0]] = {"p50_ms": percentile(samples, 50), "p95_ms": percentile(samples, 95)}
+    return results
+
+async def run(args) -> Dict:
+    client = AsyncIOMotorClient(args.uri)
+    db = client[args.database]
+    report = {"incidents": args.incidents, "layouts": {}}
+    try:
+        for name in LAYOUTS:
+            load_seconds = await load(db, name, args)
+            report["layouts"][name] = {
+                "load_seconds": round(load_seconds, 2),
+                **await storage(db),
+                "queries": await query_latency(db, name, args),
+            }
+        await db.drop_collection("incidents")
+    finally:
+        client.close()
+    regular, bucketed = report["layouts"]["collection"], report["layouts"]["timeseries"]
+    report["timeseries_vs_collection"] = {
+        key: round(bucketed[key] / regular[key], 3) if regular[key] else None
+        for key in ("storage_bytes", "index_bytes")
+    }
+    return report
+
+@contextmanager
+def launched_mongod():
+    if not shutil.which("mongod"):
+        raise SystemExit("--launch needs mongod on PATH")
+    with tempfile.TemporaryDirectory(prefix="bem-storage-") as workdir:
+        port = free_port()
+        mongo = subprocess.Popen(
+            ["mongod", "--port", str(port), "--dbpath", workdir, "--bind_ip", "127.0.0.1"],
+            stdout=subprocess.DEVNULL
+        )
+        try:
+            wait_for_port(port, mongo)
+            yield f"mongodb://127.0.0.1:{port}"
+        finally:
+            mongo.terminate()
+            try:
+                mongo.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                mongo.kill()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--uri", default="mongodb://localhost:27017", help="MongoDB to use (ignored with --launch)")
+    parser.add_argument("--launch", action="store_true", help="Start a local mongod")
+    parser.add_argument("--database", default="incident_storage_benchmark", help="Scratch database, dropped collection by collection")
+    parser.add_argument("--incidents", type=int, default=200000)
+    parser.add_argument("--days", type=int, default=90, help="Time span the incidents are spread over")
+    parser.add_argument("--accounts", type=int, default=50)
+    parser.add_argument("--vehicles", type=int, default=5000)
+    parser.add_argument("--granularity", default="minutes")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200, help="Queries per kind")
+    parser.add_argument("--window-hours", type=int, default=24)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    if args.launch:
+        with launched_mongod() as uri:
+            args.uri = uri
+            report = asyncio.run(run(args))
+    else:
+        report = asyncio.run(run(args))
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from api.main import app
+from api.services.admission import admission_controller
+from tests.test_webhooks import sample_dtc_data
+
+@pytest.fixture
+def controller(monkeypatch):
+    monkeypatch.setattr(type(admission_controller), "enabled", True)
+    monkeypatch.setattr(type(admission_controller), "max_in_flight", 1)
+    monkeypatch.setattr(type(admission_controller), "max_queue", 1)
+    monkeypatch.setattr(type(admission_controller), "queue_timeout", 0.05)
+    admission_controller.reset()
+    yield admission_controller
+    admission_controller.reset()
+
+async def hold_slot():
+    slot = admission_controller.admit()
+    await slot.__anext__()
+    return slot
+
+async def release_slot(slot):
+    with pytest.raises(StopAsyncIteration):
+        await slot.__anext__()
+
+@pytest.mark.asyncio
+async def test_queued_request_gets_released_slot(controller):
+    """Test that a waiting request is admitted when the running one finishes"""
+    first = await hold_slot()
+    second = asyncio.create_task(hold_slot())
+    await asyncio.sleep(0)
+    assert controller.stats()["queue_depth"] == 1
+
+    await release_slot(first)
+    await release_slot(await second)
+    stats = controller.stats()
+    assert stats["admitted"] == 2
+    assert stats["in_flight"] == 0
+    assert stats["shed"] == 0
+
+@pytest.mark.asyncio
+async def test_sheds_when_queue_full_or_wait_too_long(controller):
+    """Test that requests beyond the queue, or waiting past the timeout, get 429"""
+    first = await hold_slot()
+    waiting = asyncio.create_task(hold_slot())
+    await asyncio.sleep(0)
+
+    with pytest.raises(HTTPException) as excinfo:
+        await hold_slot()
+    assert excinfo.value.status_code == 429
+    assert excinfo.value.headers["Retry-After"] == "1"
+
+    with pytest.raises(HTTPException):
+        await waiting
+    await release_slot(first)
+    assert controller.stats()["shed_by_reason"] == {"queue_full": 1, "overloaded": 0, "queue_timeout": 1}
+
+@pytest.mark.asyncio
+async def test_slow_downstream_lowers_limit(controller, monkeypatch):
+    """Test that requests slower than the latency target shrink the concurrency limit"""
+    monkeypatch.setattr(type(admission_controller), "max_in_flight", 10)
+    monkeypatch.setattr(type(admission_controller), "latency_target_ms", 0)
+    admission_controller.reset()
+    slot = await hold_slot()
+    await asyncio.sleep(0.01)
+    await release_slot(slot)
+    assert controller.stats()["limit"] == 9
+
+@pytest.mark.asyncio
+async def test_webhook_route_returns_429(controller, monkeypatch):
+    """Test that the webhook router refuses work with 429 when overloaded"""
+    monkeypatch.setattr(type(admission_controller), "max_queue", 0)
+    monkeypatch.setattr(type(admission_controller), "_in_flight", 1)
+    response = TestClient(app).post("/api/v1/webhooks/dtc", json=sample_dtc_data)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
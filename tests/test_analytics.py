@@ -0,0 +1,94 @@
+import pytest
+from fastapi.testclient import TestClient
+from api.main import app
+from api.database.incidents.connection import incident_db
+from api.database.incidents.rollup_refresher import rollup_refresher
+from api.database.incidents.rollups import DAY, HOUR
+from api.models.IncidentWebhook import IncidentModel
+
+# Monday 2024-01-29 00:00 UTC, so days and weeks start on it
+MONDAY = 1706486400
+
+def incident(incident_id: str, timestamp: int, vehicle_id: str, dtc_code: str, account_id: str = "account-1") -> IncidentModel:
+    return IncidentModel(
+        id=incident_id,
+        timestamp=timestamp,
+        account_id=account_id,
+        vehicle_id=vehicle_id,
+        vehicle_tag="AB 01 CD 1234",
+        dtc_code=dtc_code,
+        location={"type": "Point", "coordinates": [74.2, 16.7]},
+    )
+
+@pytest.fixture
+async def client():
+    await incident_db.store_many_incidents([
+        incident("a", MONDAY + 100, "vehicle-1", "105-2"),
+        incident("b", MONDAY + HOUR + 100, "vehicle-1", "105-2"),
+        incident("c", MONDAY + 200, "vehicle-2", "123-4"),
+        incident("d", MONDAY + DAY + 10, "vehicle-2", "105-2"),
+        incident("e", MONDAY + 8 * DAY, "vehicle-1", "123-4"),
+        incident("f", MONDAY + 100, "vehicle-3", "105-2", account_id="account-2"),
+    ])
+    await incident_db.refresh_rollups(MONDAY, MONDAY + 9 * DAY)
+    return TestClient(app)
+
+@pytest.mark.asyncio
+async def test_top_dtc_codes_per_day_and_hour(client):
+    """Test that codes are counted per bucket for one account, most frequent first"""
+    params = {"account_id": "account-1", "since": MONDAY, "until": MONDAY + 2 * DAY}
+    body = client.get("/api/v1/analytics/dtc-codes", params=params).json()
+    assert body["refreshed_until"] == MONDAY + 9 * DAY
+    assert body["buckets"] == [
+        {"start": MONDAY, "total": 3, "dtc_codes": [{"dtc_code": "105-2", "count": 2}, {"dtc_code": "123-4", "count": 1}]},
+        {"start": MONDAY + DAY, "total": 1, "dtc_codes": [{"dtc_code": "105-2", "count": 1}]},
+    ]
+
+    body = client.get("/api/v1/analytics/dtc-codes", params={**params, "limit": 1}).json()
+    assert [len(bucket["dtc_codes"]) for bucket in body["buckets"]] == [1, 1]
+
+    body = client.get("/api/v1/analytics/dtc-codes", params={**params, "granularity": "hour", "vehicle_id": "vehicle-1"}).json()
+    assert [(bucket["start"], bucket["total"]) for bucket in body["buckets"]] == [(MONDAY, 1), (MONDAY + HOUR, 1)]
+
+@pytest.mark.asyncio
+async def test_incidents_per_vehicle_per_week(client):
+    """Test that weekly buckets are summed from the daily rollups and start on Monday"""
+    params = {"account_id": "account-1", "since": MONDAY + DAY, "until": MONDAY + 14 * DAY}
+    body = client.get("/api/v1/analytics/vehicles", params=params).json()
+    assert [bucket["start"] for bucket in body["buckets"]] == [MONDAY, MONDAY + 7 * DAY]
+    assert body["buckets"][0]["total"] == 4
+    assert {row["vehicle_id"]: row["count"] for row in body["buckets"][0]["vehicles"]} == {"vehicle-1": 2, "vehicle-2": 2}
+    assert body["buckets"][1]["vehicles"] == [{"vehicle_id": "vehicle-1", "count": 1}]
+
+    body = client.get("/api/v1/analytics/vehicles", params={**params, "dtc_code": "123-4"}).json()
+    assert [bucket["total"] for bucket in body["buckets"]] == [1, 1]
+
+@pytest.mark.asyncio
+async def test_refresh_is_incremental_and_idempotent(client):
+    """Test that refreshing a window recounts whole hours and days without double counting"""
+    await incident_db.refresh_rollups(MONDAY, MONDAY + 9 * DAY)
+    await incident_db.store_incident_data(incident("g", MONDAY + 300, "vehicle-1", "105-2"))
+    await incident_db.refresh_rollups(MONDAY + 300, MONDAY + 400)
+
+    rows = await incident_db.rollup_counts("hour", {"account_id": "account-1"}, MONDAY, MONDAY + DAY, DAY, [])
+    assert rows == [{"start": MONDAY, "count": 4}]
+    rows = await incident_db.rollup_counts("day", {"account_id": "account-1"}, MONDAY, MONDAY + 9 * DAY, DAY, [])
+    assert [row["count"] for row in rows] == [4, 1, 1]
+    assert await incident_db.rollups_refreshed_until() == MONDAY + 9 * DAY
+
+@pytest.mark.asyncio
+async def test_refresher_window_follows_the_watermark(monkeypatch):
+    """Test that a refresh starts at the previous one, less the lateness"""
+    monkeypatch.setattr(type(rollup_refresher), "lateness", HOUR)
+    assert await rollup_refresher.refresh(until=MONDAY) == (MONDAY - HOUR, MONDAY)
+    assert await rollup_refresher.refresh(until=MONDAY + DAY) == (MONDAY - HOUR, MONDAY + DAY)
+    assert rollup_refresher.stats()["last_window"] == [MONDAY - HOUR, MONDAY + DAY]
+
+@pytest.mark.asyncio
+async def test_rejects_unbounded_windows(client):
+    """Test that reversed windows and windows of too many buckets are refused"""
+    assert client.get("/api/v1/analytics/dtc-codes", params={"account_id": "account-1", "since": MONDAY, "until": MONDAY}).status_code == 400
+    params = {"account_id": "account-1", "since": MONDAY - 2000 * DAY, "until": MONDAY, "granularity": "day"}
+    assert client.get("/api/v1/analytics/vehicles", params=params).status_code == 400
+    assert client.get("/api/v1/analytics/vehicles", params={**params, "granularity": "week"}).status_code == 200
+    assert client.get("/api/v1/analytics/vehicles", params={**params, "granularity": "month"}).status_code == 422
@@ -0,0 +1,35 @@
+import pytest
+from fastapi.testclient import TestClient
+from api.main import app
+from api.services.dtc_normalization import InvalidDTCCode, normalize_dtc_code, normalize_dtc_codes
+from tests.test_webhooks import sample_dtc_data
+
+@pytest.mark.parametrize("code, expected", [
+    ("P105C", "105-2"),
+    ("P1050", "105-0"),
+    ("P105", "105-0"),
+    ("p105c", "105-2"),
+    ("P001J", "001-9"),
+    ("P0100", "010-0"),
+    ("123-4", "123-4"),
+])
+def test_normalize_dtc_code(code, expected):
+    assert normalize_dtc_code(code) == expected
+
+@pytest.mark.parametrize("code", ["X1050", "P10", "P105K", "P1A50", "2630-0", "", None, "B0105", "C0105", "U0105"])
+def test_normalize_dtc_code_rejects_invalid(code):
+    with pytest.raises(InvalidDTCCode):
+        normalize_dtc_code(code)
+
+def test_normalize_dtc_codes_bulk():
+    assert normalize_dtc_codes(["P105C", "P0100"]) == ["105-2", "010-0"]
+    assert normalize_dtc_codes(["P105C", "bad"], strict=False) == ["105-2", None]
+    with pytest.raises(InvalidDTCCode):
+        normalize_dtc_codes(["P105C", "bad"])
+
+@pytest.mark.asyncio
+async def test_dtc_webhook_rejects_invalid_code():
+    """Test that an unstorable code is refused before it becomes a partial"""
+    invalid = {**sample_dtc_data, "data": {**sample_dtc_data["data"], "type": "X999Z"}}
+    response = TestClient(app).post("/api/v1/webhooks/dtc", json=invalid)
+    assert response.status_code == 422
@@ -0,0 +1,118 @@
+import pytest
+from pymongo import DeleteOne, ReplaceOne
+from api.database.dtc_descriptions import sync
+from api.database.dtc_descriptions.connection import DTCDatabase
+from api.database.dtc_descriptions.sync import diff_rows, read_documents, row_hash, workbook_hash
+
+@pytest.fixture(scope="module")
+def documents():
+    return read_documents()
+
+def test_workbook_rows_become_hashed_documents(documents):
+    """Test that every row maps to a document whose row_hash matches its content"""
+    assert len(documents) == len({document["DTC"] for document in documents}) == 450
+    first = documents[0]
+    assert first["DTC"] == "2630-0"
+    assert first["SEVERITY"] == "medium"
+    assert first["row_hash"] == row_hash(first)
+    assert [document["row_hash"] for document in read_documents()] == [document["row_hash"] for document in documents]
+
+def test_workbook_hash_covers_the_mapping_version(monkeypatch):
+    """Test that bumping SYNC_VERSION forces a re-sync of an unchanged workbook"""
+    digest = workbook_hash()
+    assert workbook_hash() == digest
+    monkeypatch.setattr(sync, "SYNC_VERSION", sync.SYNC_VERSION + 1)
+    assert workbook_hash() != digest
+
+def test_diff_writes_only_changes(documents):
+    """Test that unchanged rows are skipped, edited and new rows upserted and dropped codes deleted"""
+    stored = {document["DTC"]: document["row_hash"] for document in documents}
+    assert diff_rows(stored, documents) == ([], [])
+
+    edited = {**documents[1], "Title": "Changed"}
+    edited["row_hash"] = row_hash(edited)
+    stored["9999-9"] = "gone"
+    del stored[documents[2]["DTC"]]
+    upserts, deletes = diff_rows(stored, [documents[0], edited, *documents[2:]])
+    assert [document["DTC"] for document in upserts] == [documents[1]["DTC"], documents[2]["DTC"]]
+    assert deletes == ["9999-9"]
+
+def test_repeated_code_keeps_last_row(documents):
+    """Test that a DTC listed twice is written once, from its last row"""
+    later = {**documents[0], "Title": "Later"}
+    later["row_hash"] = row_hash(later)
+    upserts, _ = diff_rows({}, [documents[0], later])
+    assert upserts == [later]
+
+class FakeCollection:
+    """dtc_codes or dtc_sync, keyed on DTC or _id, recording every bulk_write"""
+    def __init__(self, key: str):
+        self.key, self.documents, self.bulk_writes = key, {}, []
+
+    async def find_one(self, query):
+        return self.documents.get(query[self.key])
+
+    async def replace_one(self, query, document, upsert=False):
+        self.documents[query[self.key]] = {self.key: query[self.key], **document}
+
+    async def estimated_document_count(self):
+        return len(self.documents)
+
+    async def __aiter__(self):
+        for document in list(self.documents.values()):
+            yield document
+
+    def find(self, query, projection):
+        return self
+
+    async def bulk_write(self, operations, ordered=True):
+        self.bulk_writes.append(operations)
+        # pymongo's write models keep their arguments private
+        for operation in operations:
+            if isinstance(operation, ReplaceOne):
+                self.documents[operation._filter["DTC"]] = dict(operation._doc)
+            else:
+                self.documents.pop(operation._filter["DTC"], None)
+
+@pytest.fixture
+def stores(monkeypatch):
+    codes, state = FakeCollection("DTC"), FakeCollection("_id")
+    monkeypatch.setattr(DTCDatabase, "collection", codes)
+    monkeypatch.setattr(DTCDatabase, "sync_state", state)
+    return codes, state
+
+@pytest.mark.asyncio
+async def test_sync_skips_an_unchanged_workbook(stores, documents):
+    """Test that a second sync with the same workbook and count writes nothing"""
+    codes, state = stores
+    assert await DTCDatabase.sync_excel_data() == {"upserted": 450, "deleted": 0}
+    assert len(codes.documents) == state.documents[sync.SYNC_STATE_ID]["rows"] == 450
+
+    assert await DTCDatabase.sync_excel_data() == {"upserted": 0, "deleted": 0}
+    assert len(codes.bulk_writes) == 1
+
+@pytest.mark.asyncio
+async def test_sync_writes_only_changed_rows(stores, documents):
+    """Test that an edited row is replaced and a code no longer in the workbook deleted, in one bulk_write"""
+    codes, _ = stores
+    await DTCDatabase.sync_excel_data()
+    edited = documents[1]["DTC"]
+    codes.documents[edited] = {**codes.documents[edited], "Title": "Changed", "row_hash": "stale"}
+    codes.documents["9999-9"] = {"DTC": "9999-9", "row_hash": "gone"}
+
+    assert await DTCDatabase.sync_excel_data(force=True) == {"upserted": 1, "deleted": 1}
+    assert codes.bulk_writes[-1] == [
+        ReplaceOne({"DTC": edited}, documents[1], upsert=True),
+        DeleteOne({"DTC": "9999-9"}),
+    ]
+    assert codes.documents[edited] == documents[1]
+
+@pytest.mark.asyncio
+async def test_sync_refills_an_emptied_collection(stores):
+    """Test that an unchanged workbook is imported again when dtc_codes was emptied behind the sync state"""
+    codes, _ = stores
+    await DTCDatabase.sync_excel_data()
+    codes.documents.clear()
+
+    assert await DTCDatabase.sync_excel_data() == {"upserted": 450, "deleted": 0}
+    assert len(codes.documents) == 450
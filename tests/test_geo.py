@@ -0,0 +1,37 @@
+import pytest
+from pydantic import ValidationError
+from api.database.incidents.connection import IncidentDatabase
+from api.database.incidents.geo import bbox_polygon, distance_km, in_polygon, near_pipeline, to_geojson, within_query
+from api.database.incidents.timeseries import timeseries_query
+from api.models.IncidentWebhook import GeoPoint
+
+def test_geo_point_reads_legacy_location():
+    """Test that the old {latitude, longitude} object becomes a [longitude, latitude] point"""
+    point = GeoPoint.model_validate({"latitude": 16.7, "longitude": 74.2})
+    assert point.model_dump() == {"type": "Point", "coordinates": [74.2, 16.7]}
+    assert to_geojson({"latitude": 16.7, "longitude": 74.2}) == point.model_dump()
+    with pytest.raises(ValidationError):
+        GeoPoint(coordinates=[16.7, 91])
+
+def test_queries_keep_geo_operators_through_timeseries_mapping():
+    """Test that near and within queries carry the time range and filters for either layout"""
+    query = IncidentDatabase._incident_query({"account_id": "account-1"}, 100, None, None)
+    pipeline = near_pipeline(74.2, 16.7, 5, timeseries_query(query), 10)
+    assert pipeline[0]["$geoNear"]["maxDistance"] == 5000
+    assert pipeline[0]["$geoNear"]["query"]["meta.account_id"] == "account-1"
+    assert pipeline[1] == {"$limit": 10}
+
+    box = bbox_polygon(73, 16, 75, 17)
+    mapped = timeseries_query(within_query(box, query))
+    assert mapped["location"] == {"$geoWithin": {"$geometry": box}}
+    assert "time" in mapped
+
+def test_in_process_geometry():
+    """Test the distance and point-in-polygon checks the in-memory store uses"""
+    assert distance_km((73.8567, 18.5204), (72.8777, 19.0760)) == pytest.approx(120, abs=5)
+    square = bbox_polygon(0, 0, 10, 10)
+    assert in_polygon((5, 5), square)
+    assert not in_polygon((11, 5), square)
+    with_hole = {"type": "Polygon", "coordinates": [square["coordinates"][0], bbox_polygon(4, 4, 6, 6)["coordinates"][0]]}
+    assert not in_polygon((5, 5), with_hole)
+    assert in_polygon((2, 2), with_hole)
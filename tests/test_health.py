@@ -0,0 +1,56 @@
+import pytest
+from fastapi.testclient import TestClient
+from api.main import app
+from api.database.dtc_descriptions.connection import dtc_db
+from api.database.incidents.connection import incident_db
+from api.services.health import health_monitor
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(type(health_monitor), "_snapshot", None)
+    monkeypatch.setattr(type(health_monitor), "_refresh_lock", None)
+    return TestClient(app)
+
+@pytest.mark.asyncio
+async def test_live_touches_no_backend(client):
+    """Test that liveness answers without any backend"""
+    assert client.get("/api/v1/health/live").json() == {"status": "alive"}
+
+@pytest.mark.asyncio
+async def test_ready_reports_each_backend(client, monkeypatch):
+    """Test that readiness is 503 while a backend is unreachable and 200 once all answer"""
+    # The DTC database is never connected in the test suite
+    response = client.get("/api/v1/health/ready")
+    assert response.status_code == 503
+    backends = response.json()["backends"]
+    assert backends["dtc_descriptions"]["status"] == "down"
+    assert backends["incidents"]["status"] == backends["redis"]["status"] == "up"
+
+    async def ping(cls):
+        pass
+    monkeypatch.setattr(type(dtc_db), "ping", classmethod(ping))
+    response = client.get("/api/v1/health/ready")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+
+@pytest.mark.asyncio
+async def test_health_serves_cached_snapshot(client, monkeypatch):
+    """Test that repeated health checks reuse the snapshot until it is older than max_age"""
+    counts = []
+    async def count_documents(cls):
+        counts.append(1)
+        return 7
+    monkeypatch.setattr(type(incident_db), "count_documents", classmethod(count_documents))
+
+    first = client.get("/api/v1/health/").json()
+    second = client.get("/api/v1/health/").json()
+    assert first["databases"]["incidents_database"]["count"] == 7
+    assert "error" in first["databases"]["dtc_database"]
+    assert first["status"] == "degraded"
+    assert second["snapshot"]["taken_at"] == first["snapshot"]["taken_at"]
+    assert len(counts) == 1
+    assert "pending" in second["partials"] and "sweeper" in second["partials"]
+
+    monkeypatch.setattr(type(health_monitor), "max_age", -1)
+    client.get("/api/v1/health/")
+    assert len(counts) == 2
@@ -0,0 +1,138 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+from api.main import app
+from api.database.incidents.connection import incident_db
+from api.models.IncidentWebhook import IncidentModel
+
+def incident(
+    incident_id: str,
+    timestamp: int,
+    account_id: str = "account-1",
+    dtc_code: str = "105-2",
+    coordinates: tuple = (74.2, 16.7)
+) -> IncidentModel:
+    return IncidentModel(
+        id=incident_id,
+        timestamp=timestamp,
+        account_id=account_id,
+        vehicle_id="vehicle-1",
+        vehicle_tag="AB 01 CD 1234",
+        dtc_code=dtc_code,
+        location={"type": "Point", "coordinates": list(coordinates)},
+    )
+
+@pytest.fixture
+async def client():
+    # Two incidents share a timestamp, so the _id tie-break decides their order
+    await incident_db.store_many_incidents([
+        incident("a", 100), incident("b", 200), incident("c", 200),
+        incident("d", 300, dtc_code="123-4"), incident("e", 400, account_id="account-2"),
+    ])
+    return TestClient(app)
+
+# [longitude, latitude]; Mumbai is about 120 km from Pune, Kolhapur about 200 km
+PUNE, MUMBAI, KOLHAPUR = (73.8567, 18.5204), (72.8777, 19.0760), (74.2433, 16.7050)
+
+@pytest.fixture
+async def map_client():
+    await incident_db.store_many_incidents([
+        incident("pune", 100, coordinates=PUNE), incident("mumbai", 200, coordinates=MUMBAI),
+        incident("kolhapur", 300, coordinates=KOLHAPUR), incident("pune-later", 400, coordinates=PUNE),
+    ])
+    return TestClient(app)
+
+@pytest.mark.asyncio
+async def test_pages_newest_first_with_cursor(client):
+    """Test that following next_cursor walks every incident once, newest first"""
+    seen = []
+    params = {"account_id": "account-1", "limit": 2}
+    while True:
+        page = client.get("/api/v1/incidents", params=params).json()
+        seen += [doc["_id"] for doc in page["incidents"]]
+        if page["next_cursor"] is None:
+            break
+        params["cursor"] = page["next_cursor"]
+    assert seen == ["d", "c", "b", "a"]
+
+@pytest.mark.asyncio
+async def test_filters_and_projection(client):
+    """Test that DTC code, time range and field selection apply together"""
+    page = client.get("/api/v1/incidents", params={"since": 200, "until": 400, "fields": "dtc_code"}).json()
+    assert [doc["_id"] for doc in page["incidents"]] == ["d", "c", "b"]
+    assert set(page["incidents"][0]) == {"_id", "timestamp", "dtc_code"}
+
+    page = client.get("/api/v1/incidents", params={"dtc_code": "123-4"}).json()
+    assert [doc["_id"] for doc in page["incidents"]] == ["d"]
+
+@pytest.mark.asyncio
+async def test_rejects_bad_cursor_and_fields(client):
+    """Test that a malformed cursor or unknown field is a 400"""
+    assert client.get("/api/v1/incidents", params={"cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/api/v1/incidents", params={"fields": "password"}).status_code == 400
+    assert client.get("/api/v1/incidents/missing").status_code == 404
+    assert client.get("/api/v1/incidents/e").json()["account_id"] == "account-2"
+
+@pytest.mark.asyncio
+async def test_export_streams_ndjson_in_batches_and_resumes(client):
+    """Test that the export writes every match as NDJSON and resumes after a given incident"""
+    response = client.get("/api/v1/incidents/export", params={"account_id": "account-1", "batch_size": 2})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [doc["_id"] for doc in lines] == ["d", "c", "b", "a"]
+
+    last = lines[1]
+    response = client.get("/api/v1/incidents/export", params={
+        "account_id": "account-1", "after_timestamp": last["timestamp"], "after_id": last["_id"]
+    })
+    assert [json.loads(line)["_id"] for line in response.text.splitlines()] == ["b", "a"]
+    assert client.get("/api/v1/incidents/export", params={"after_id": "c"}).status_code == 400
+
+@pytest.mark.asyncio
+async def test_export_gzip(client):
+    """Test that a gzipped export decompresses to the same lines"""
+    response = client.get("/api/v1/incidents/export", params={"gzip": True, "fields": "dtc_code"})
+    assert response.headers["content-encoding"] == "gzip"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [doc["_id"] for doc in lines] == ["e", "d", "c", "b", "a"]
+    assert set(lines[0]) == {"_id", "timestamp", "dtc_code"}
+
+@pytest.mark.asyncio
+async def test_near_returns_nearest_first_with_distance(map_client):
+    """Test that only incidents inside the radius come back, nearest first, honouring the time range"""
+    params = {"longitude": PUNE[0], "latitude": PUNE[1], "radius_km": 150}
+    incidents = map_client.get("/api/v1/incidents/near", params=params).json()["incidents"]
+    assert [doc["_id"] for doc in incidents][-1] == "mumbai"
+    assert {doc["_id"] for doc in incidents} == {"pune", "pune-later", "mumbai"}
+    assert incidents[0]["distance_km"] == pytest.approx(0)
+    assert incidents[-1]["distance_km"] == pytest.approx(120, abs=5)
+
+    incidents = map_client.get("/api/v1/incidents/near", params={**params, "since": 150, "limit": 1}).json()["incidents"]
+    assert [doc["_id"] for doc in incidents] == ["pune-later"]
+    assert map_client.get("/api/v1/incidents/near", params={**params, "radius_km": 0}).status_code == 422
+
+@pytest.mark.asyncio
+async def test_within_bbox_or_polygon(map_client):
+    """Test that a box or polygon selects the incidents inside it, newest first"""
+    bbox = "72.5,18,74,19.5"
+    incidents = map_client.get("/api/v1/incidents/within", params={"bbox": bbox}).json()["incidents"]
+    assert [doc["_id"] for doc in incidents] == ["pune-later", "mumbai", "pune"]
+
+    incidents = map_client.get("/api/v1/incidents/within", params={"bbox": bbox, "until": 400}).json()["incidents"]
+    assert [doc["_id"] for doc in incidents] == ["mumbai", "pune"]
+
+    # Around Kolhapur and Pune, leaving Mumbai out
+    polygon = "73.5,16;75,16;75,19;73.5,18.8"
+    incidents = map_client.get("/api/v1/incidents/within", params={"polygon": polygon}).json()["incidents"]
+    assert [doc["_id"] for doc in incidents] == ["pune-later", "kolhapur", "pune"]
+
+@pytest.mark.asyncio
+async def test_within_rejects_bad_shapes(map_client):
+    """Test that exactly one well-formed shape is required"""
+    within = "/api/v1/incidents/within"
+    assert map_client.get(within).status_code == 400
+    assert map_client.get(within, params={"bbox": "1,2,3,4", "polygon": "1,2;3,4;5,6"}).status_code == 400
+    assert map_client.get(within, params={"bbox": "74,18,73,19"}).status_code == 400
+    assert map_client.get(within, params={"bbox": "not,a,box"}).status_code == 400
+    assert map_client.get(within, params={"polygon": "1,2;3,4"}).status_code == 400
+    assert map_client.get(within, params={"polygon": "1,2;3,95;5,6"}).status_code == 400
@@ -0,0 +1,181 @@
+"""
+Explain-plan gate for the incidents collection.
+
+Runs every query shape IncidentDatabase issues against a real MongoDB
+(MONGO_URI) with the indexes from schema.py, for both the regular and the
+time-series layout, and fails if a plan scans the collection or examines
+many more documents than it returns. Map queries are checked on the regular
+layout. Skipped when no MongoDB is reachable.
+"""
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from api.config import DatabaseConfig
+from api.database.incidents.connection import IncidentDatabase, TimeSeriesIncidentDatabase
+from api.database.incidents.geo import bbox_polygon, near_pipeline, within_query
+from api.database.incidents.schema import INCIDENT_INDEXES, RETIRED_INDEXES, TIMESERIES_INCIDENT_INDEXES, create_indexes
+from api.database.incidents.timeseries import timeseries_options
+
+def mongo_reachable() -> bool:
+    client = MongoClient(DatabaseConfig.uri, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+        return True
+    except PyMongoError:
+        return False
+    finally:
+        client.close()
+
+pytestmark = pytest.mark.skipif(not mongo_reachable(), reason="MongoDB is not reachable")
+
+INCIDENTS = 3000
+# A plan may examine this many documents per document returned, plus a few
+EXAMINED_PER_RETURNED = 2
+EXAMINED_SLACK = 10
+
+def incident(i: int) -> dict:
+    return {
+        "_id": f"event-{i:06d}",
+        "timestamp": 1706630400 + i // 3,
+        "account_id": f"account-{i % 20}",
+        "vehicle_id": f"vehicle-{i % 200}",
+        "vehicle_tag": "AB 01 CD 1234",
+        "dtc_code": f"{100 + i % 25}-{i % 4}",
+        "location": {"type": "Point", "coordinates": [74.0 + i % 50 / 100, 16.5 + i % 40 / 100]},
+    }
+
+MIDDLE = incident(INCIDENTS // 2)
+SINCE, UNTIL = MIDDLE["timestamp"] - 300, MIDDLE["timestamp"] + 300
+AFTER = (MIDDLE["timestamp"], MIDDLE["_id"])
+
+def find(filters=None, since=None, until=None, after=None, limit=100):
+    """A find_incidents page"""
+    return lambda db: db._incident_cursor(filters or {}, since, until, after, None).limit(limit)
+
+# Every find IncidentDatabase issues; count_documents reads collection metadata and has no plan
+QUERY_SHAPES = {
+    "get_by_vehicle": lambda db: db.collection.find(db._stored_query({"vehicle_id": "vehicle-7"})).limit(100),
+    "get_by_account": lambda db: db.collection.find(db._stored_query({"account_id": "account-7"})).limit(100),
+    "get_incident_data": lambda db: db.collection.find({"_id": MIDDLE["_id"]}).limit(1),
+    "get_latest_document": lambda db: db.collection.find().sort(db._latest_sort).limit(1),
+    "find_incidents": find(),
+    "find_incidents_range": find(since=SINCE, until=UNTIL),
+    "find_incidents_after": find(after=AFTER),
+    "find_incidents_account": find({"account_id": "account-7"}),
+    "find_incidents_account_range": find({"account_id": "account-7"}, SINCE, UNTIL),
+    "find_incidents_account_after": find({"account_id": "account-7"}, after=AFTER),
+    "find_incidents_account_dtc": find({"account_id": "account-7", "dtc_code": "107-3"}),
+    "find_incidents_account_dtc_range": find({"account_id": "account-7", "dtc_code": "107-3"}, SINCE, UNTIL),
+    "find_incidents_vehicle": find({"vehicle_id": "vehicle-7"}),
+    "find_incidents_vehicle_range_after": find({"vehicle_id": "vehicle-7"}, SINCE, UNTIL, AFTER),
+    "find_incidents_vehicle_dtc": find({"vehicle_id": "vehicle-7", "dtc_code": "107-3"}),
+    "find_incidents_dtc": find({"dtc_code": "107-3"}),
+    "find_incidents_dtc_range": find({"dtc_code": "107-3"}, SINCE, UNTIL),
+}
+
+def geo(pipeline=None, query=None):
+    """An explain command for a map query on the regular collection"""
+    if pipeline is not None:
+        return lambda name: {"aggregate": name, "pipeline": pipeline, "cursor": {}}
+    return lambda name: {"find": name, "filter": query, "sort": dict(IncidentDatabase._sort), "limit": 100}
+
+WINDOW = IncidentDatabase._incident_query({}, SINCE, UNTIL, None)
+BOX = bbox_polygon(74.1, 16.6, 74.3, 16.8)
+
+# find_near and find_within; which of them an index can narrow depends on how
+# dense the area is, so these only have to avoid scanning the collection
+GEO_SHAPES = {
+    "near": geo(near_pipeline(74.2, 16.7, 5, {}, 100)),
+    "near_range": geo(near_pipeline(74.2, 16.7, 5, WINDOW, 100)),
+    "near_account": geo(near_pipeline(74.2, 16.7, 5, {"account_id": "account-7"}, 100)),
+    "within": geo(query=within_query(BOX, {})),
+    "within_range": geo(query=within_query(BOX, WINDOW)),
+}
+
+@pytest.fixture
+async def collection():
+    client = AsyncIOMotorClient(DatabaseConfig.uri)
+    db = client[f"{DatabaseConfig.name}_explain"]
+    await db.incidents.drop()
+    await db.incidents.insert_many([incident(i) for i in range(INCIDENTS)])
+    await create_indexes(db.incidents)
+    yield db.incidents
+    await db.incidents.drop()
+    client.close()
+
+@pytest.fixture(params=["collection", "timeseries"])
+async def incidents_db(request, monkeypatch):
+    """IncidentDatabase or TimeSeriesIncidentDatabase over a seeded scratch collection"""
+    database = TimeSeriesIncidentDatabase if request.param == "timeseries" else IncidentDatabase
+    client = AsyncIOMotorClient(DatabaseConfig.uri)
+    db = client[f"{DatabaseConfig.name}_explain"]
+    await db.drop_collection("incidents")
+    if database is TimeSeriesIncidentDatabase:
+        await db.create_collection("incidents", **timeseries_options())
+    await db.incidents.insert_many([database._to_stored(incident(i)) for i in range(INCIDENTS)])
+    await create_indexes(db.incidents, TIMESERIES_INCIDENT_INDEXES if database is TimeSeriesIncidentDatabase else INCIDENT_INDEXES)
+    monkeypatch.setattr(IncidentDatabase, "collection", db.incidents)
+    yield database
+    await db.drop_collection("incidents")
+    client.close()
+
+def stages(plan) -> list:
+    """Every stage name in an explain plan tree, classic or slot-based"""
+    if isinstance(plan, dict):
+        found = [plan["stage"]] if "stage" in plan else []
+        return found + [stage for value in plan.values() for stage in stages(value)]
+    if isinstance(plan, list):
+        return [stage for value in plan for stage in stages(value)]
+    return []
+
+def find_explain(explain: dict) -> dict:
+    """
+    The part of a find's explain holding queryPlanner and executionStats.
+
+    A find on a time-series collection is rewritten into an aggregation over
+    the buckets, so unless the server runs the whole pipeline in one plan its
+    explain is aggregate-shaped, with the bucket scan under the first stage's
+    $cursor; examined and returned then count buckets.
+    """
+    if "queryPlanner" in explain:
+        return explain
+    for stage in explain.get("stages", []):
+        if "$cursor" in stage:
+            return stage["$cursor"]
+    raise AssertionError(f"No query plan in explain output: {list(explain)}")
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("shape", sorted(QUERY_SHAPES))
+async def test_query_shape_uses_an_index(incidents_db, shape):
+    """Test that the query shape neither scans the collection nor examines far more than it returns"""
+    explain = find_explain(await QUERY_SHAPES[shape](incidents_db).explain())
+
+    plan = stages(explain["queryPlanner"]["winningPlan"])
+    assert "COLLSCAN" not in plan, f"{shape} scans the collection: {plan}"
+    execution = explain["executionStats"]
+    limit = EXAMINED_PER_RETURNED * execution["nReturned"] + EXAMINED_SLACK
+    assert execution["totalDocsExamined"] <= limit, (
+        f"{shape} examined {execution['totalDocsExamined']} documents for {execution['nReturned']}"
+    )
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("shape", sorted(GEO_SHAPES))
+async def test_geo_query_uses_an_index(collection, shape):
+    """Test that the map query doesn't scan the collection"""
+    explain = await collection.database.command("explain", GEO_SHAPES[shape](collection.name), verbosity="queryPlanner")
+    plan = stages(explain)
+    assert "COLLSCAN" not in plan, f"{shape} scans the collection: {plan}"
+
+@pytest.mark.asyncio
+async def test_create_indexes_is_idempotent(collection):
+    """Test that a second run changes nothing and retired indexes are dropped"""
+    assert await create_indexes(collection) == {"created": [], "dropped": []}
+
+    await collection.create_index("account_id")
+    result = await create_indexes(collection)
+    assert result == {"created": [], "dropped": ["account_id_1"]}
+    names = set(await collection.index_information())
+    assert names == {"_id_"} | {model.document["name"] for model in INCIDENT_INDEXES}
+    assert not names & set(RETIRED_INDEXES)
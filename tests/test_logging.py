@@ -0,0 +1,24 @@
+import json
+import logging
+from api.log import JsonFormatter, SampleFilter
+
+def make_record(msg: str, **extra) -> logging.LogRecord:
+    record = logging.makeLogRecord({"name": "api.test", "levelname": "INFO", "levelno": logging.INFO, "msg": msg})
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+def test_json_formatter_includes_extra_fields():
+    """Test that extra fields become keys of the JSON line"""
+    line = JsonFormatter().format(make_record("Stored incident", event_id="test-id-123"))
+    data = json.loads(line)
+    assert data["message"] == "Stored incident"
+    assert data["level"] == "INFO"
+    assert data["event_id"] == "test-id-123"
+
+def test_sample_filter_keeps_one_in_n():
+    """Test that sampled records pass one in N per message, and others always pass"""
+    sample_filter = SampleFilter(every=10)
+    kept = [sample_filter.filter(make_record("Stored incident", sample=True)) for _ in range(25)]
+    assert sum(kept) == 3
+    assert all(sample_filter.filter(make_record("Error storing incident")) for _ in range(5))
@@ -0,0 +1,41 @@
+import pytest
+from api.database.redis.memory import MemoryCorrelationDatabase
+
+REQUIRED = ["dtc_data", "alert_data"]
+
+@pytest.fixture
+async def memory_db(monkeypatch, tmp_path):
+    monkeypatch.setattr(MemoryCorrelationDatabase, "max_partials", 2)
+    monkeypatch.setattr(MemoryCorrelationDatabase, "snapshot_path", str(tmp_path / "partials.json"))
+    await MemoryCorrelationDatabase.connect()
+    yield MemoryCorrelationDatabase
+    await MemoryCorrelationDatabase.close()
+
+@pytest.mark.asyncio
+async def test_claims_pair_once(memory_db):
+    """Test that the write completing a partial claims it"""
+    assert await memory_db.hset_and_claim("incident:1", "dtc_data", "{}", REQUIRED) is None
+    assert await memory_db.hset_and_claim("incident:1", "alert_data", "{}", REQUIRED) == {"dtc_data": "{}", "alert_data": "{}"}
+    assert await memory_db.hgetall("incident:1") == {}
+
+@pytest.mark.asyncio
+async def test_evicts_least_recently_written(memory_db):
+    """Test that the store stays within max_partials"""
+    await memory_db.hset_and_claim("incident:1", "dtc_data", "{}", REQUIRED)
+    await memory_db.hset_and_claim("incident:2", "dtc_data", "{}", REQUIRED)
+    await memory_db.hset_and_claim("incident:3", "dtc_data", "{}", REQUIRED)
+
+    stats = await memory_db.pending_partials_stats()
+    assert stats["pending"] == 2
+    assert stats["evicted"] == 1
+    assert await memory_db.hgetall("incident:1") == {}
+
+@pytest.mark.asyncio
+async def test_snapshot_survives_restart(memory_db):
+    """Test that pending partials are reloaded from the snapshot"""
+    await memory_db.hset_and_claim("incident:1", "dtc_data", '{"id": "1"}', REQUIRED)
+    await memory_db.close()
+    await memory_db.connect()
+
+    assert await memory_db.hgetall("incident:1") == {"dtc_data": '{"id": "1"}'}
+    assert await memory_db.hset_and_claim("incident:1", "alert_data", "{}", REQUIRED) is not None
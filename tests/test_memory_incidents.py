@@ -0,0 +1,53 @@
+import pytest
+from pymongo.errors import DuplicateKeyError
+from api.database.incidents.memory import MemoryIncidentDatabase
+from api.models.IncidentWebhook import IncidentModel
+
+def incident(incident_id: str, vehicle_id: str, account_id: str = "account-1") -> IncidentModel:
+    return IncidentModel(
+        id=incident_id,
+        timestamp=1706630400,
+        account_id=account_id,
+        vehicle_id=vehicle_id,
+        vehicle_tag="AB 01 CD 1234",
+        dtc_code="105-2",
+        location={"type": "Point", "coordinates": [74.2, 16.7]},
+    )
+
+@pytest.fixture
+async def memory_db():
+    await MemoryIncidentDatabase.connect()
+    yield MemoryIncidentDatabase
+    await MemoryIncidentDatabase.close()
+
+@pytest.mark.asyncio
+async def test_lookups_use_secondary_indexes(memory_db):
+    """Test that vehicle and account lookups return only their documents, in insertion order"""
+    await memory_db.store_many_incidents([incident("1", "v-1"), incident("2", "v-2"), incident("3", "v-1", "account-2")])
+
+    assert [doc["_id"] for doc in await memory_db.get_by_vehicle("v-1")] == ["1", "3"]
+    assert [doc["_id"] for doc in await memory_db.get_by_account("account-2")] == ["3"]
+    assert await memory_db.get_by_vehicle("v-3") == []
+
+@pytest.mark.asyncio
+async def test_duplicates_are_rejected(memory_db):
+    """Test that a repeated _id raises on single inserts and is reported on batches"""
+    await memory_db.store_incident_data(incident("1", "v-1"))
+    with pytest.raises(DuplicateKeyError):
+        await memory_db.store_incident_data(incident("1", "v-1"))
+
+    errors = await memory_db.store_many_incidents([incident("2", "v-1"), incident("1", "v-1")])
+    assert list(errors) == [1] and errors[1].startswith("E11000")
+    assert await memory_db.count_documents() == 2
+
+@pytest.mark.asyncio
+async def test_delete_many_keeps_indexes_and_latest_in_step(memory_db):
+    """Test that deleting by an indexed field updates the indexes and the latest document"""
+    await memory_db.store_many_incidents([incident("1", "v-1"), incident("2", "v-2"), incident("3", "v-1")])
+    assert (await memory_db.get_latest_document())["_id"] == "3"
+
+    assert await memory_db.delete_many({"vehicle_id": "v-1"}) == 2
+    assert await memory_db.get_by_vehicle("v-1") == []
+    assert (await memory_db.get_latest_document())["_id"] == "2"
+    assert await memory_db.delete_many({}) == 1
+    assert await memory_db.get_latest_document() is None
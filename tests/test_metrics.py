@@ -0,0 +1,36 @@
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from api.main import app
+from tests.test_webhooks import sample_dtc_data, sample_alert_data
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+@pytest.mark.asyncio
+async def test_metrics_cover_ingest_stages_and_storage():
+    """Test that a completed pair shows up in the stage, store and counter metrics"""
+    client = TestClient(app)
+    pairs = sample("incident_pairs_completed_total")
+    claims = sample("ingest_stage_seconds_count", stage="claim")
+    inserts = sample("mongo_operation_seconds_count", database="incidents", method="store_incident_data")
+
+    client.post("/api/v1/webhooks/dtc", json=sample_dtc_data)
+    client.post("/api/v1/webhooks/alert", json=sample_alert_data)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'correlation_operation_seconds_count{backend="memory",method="hset_and_claim"}' in response.text
+    assert "pending_partials 0.0" in response.text
+    assert sample("incident_pairs_completed_total") == pairs + 1
+    assert sample("ingest_stage_seconds_count", stage="claim") == claims + 2
+    assert sample("mongo_operation_seconds_count", database="incidents", method="store_incident_data") == inserts + 1
+
+@pytest.mark.asyncio
+async def test_metrics_count_errors_by_type():
+    """Test that a rejected DTC code is counted under its exception type"""
+    errors = sample("ingest_errors_total", type="InvalidDTCCode")
+    bad_code = {**sample_dtc_data, "data": {**sample_dtc_data["data"], "type": "XYZ"}}
+    assert TestClient(app).post("/api/v1/webhooks/dtc", json=bad_code).status_code == 422
+    assert sample("ingest_errors_total", type="InvalidDTCCode") == errors + 1
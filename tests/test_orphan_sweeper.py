@@ -0,0 +1,72 @@
+import pytest
+from api.config import PartialConfig
+from api.database.incidents.connection import incident_db
+from api.database.redis.main import redis_db
+from api.database.redis.sweeper import orphan_sweeper
+
+REQUIRED = ["dtc_data", "alert_data"]
+
+@pytest.mark.asyncio
+async def test_claim_tracks_and_clears_pending_partials():
+    """Test that a new partial is indexed as pending and a claim removes it"""
+    await redis_db.hset_and_claim("incident:event-1", "dtc_data", "{}", REQUIRED)
+    stats = await redis_db.pending_partials_stats()
+    assert stats["pending"] == 1
+
+    await redis_db.hset_and_claim("incident:event-1", "alert_data", "{}", REQUIRED)
+    assert (await redis_db.pending_partials_stats())["pending"] == 0
+
+@pytest.mark.asyncio
+async def test_sweep_counts_and_archives_orphans(monkeypatch):
+    """Test that partials older than the TTL are swept and counted by missing field"""
+    orphan_sweeper._reset_stats()
+    await redis_db.hset_and_claim("incident:event-1", "dtc_data", '{"type": "P105C"}', REQUIRED)
+    for n in range(2, 5):
+        await redis_db.hset_and_claim(f"incident:event-{n}", "alert_data", "{}", REQUIRED)
+
+    # Nothing is older than the default TTL yet
+    assert await orphan_sweeper.sweep() == 0
+
+    monkeypatch.setattr(PartialConfig, "ttl_ms", -1000)
+    monkeypatch.setattr(type(orphan_sweeper), "archive", True)
+    monkeypatch.setattr(type(orphan_sweeper), "sweep_batch", 3)
+    assert await orphan_sweeper.sweep() == 4
+
+    stats = orphan_sweeper.stats()
+    assert stats["missing_by_field"] == {"dtc_data": 3, "alert_data": 1}
+    assert stats["orphans_swept"] == 4
+    assert stats["orphans_archived"] == 4
+    assert stats["sweeps"] == 2
+    assert not await redis_db.hgetall("incident:event-1")
+    assert (await redis_db.pending_partials_stats())["pending"] == 0
+
+    archived = {doc["event_id"]: doc for doc in incident_db._orphans}
+    assert archived["event-1"]["missing"] == ["alert_data"]
+    assert archived["event-1"]["partials"]["dtc_data"] == {"type": "P105C"}
+
+@pytest.mark.asyncio
+async def test_sweep_puts_back_partials_it_fails_to_archive(monkeypatch):
+    """Test that a batch whose archive fails is restored and archived by the next sweep"""
+    orphan_sweeper._reset_stats()
+    await redis_db.hset_and_claim("incident:event-1", "dtc_data", "{}", REQUIRED)
+    await redis_db.hset_and_claim("incident:event-2", "alert_data", "{}", REQUIRED)
+    monkeypatch.setattr(PartialConfig, "ttl_ms", -1000)
+    monkeypatch.setattr(type(orphan_sweeper), "archive", True)
+
+    archive = incident_db.archive_orphans
+    async def fail_once(documents):
+        monkeypatch.setattr(incident_db, "archive_orphans", archive)
+        raise ConnectionError("archive failed")
+    monkeypatch.setattr(incident_db, "archive_orphans", fail_once)
+
+    with pytest.raises(ConnectionError):
+        await orphan_sweeper.sweep()
+    assert await redis_db.hgetall("incident:event-1") == {"dtc_data": "{}"}
+    assert (await redis_db.pending_partials_stats())["pending"] == 2
+    assert orphan_sweeper.stats()["orphans_swept"] == 0
+
+    assert await orphan_sweeper.sweep() == 2
+    stats = orphan_sweeper.stats()
+    assert stats["missing_by_field"] == {"dtc_data": 1, "alert_data": 1}
+    assert stats["orphans_archived"] == 2
+    assert sorted(doc["event_id"] for doc in incident_db._orphans) == ["event-1", "event-2"]
@@ -0,0 +1,39 @@
+import pytest
+from fastapi.testclient import TestClient
+from api.main import app
+from api.config import PartialConfig
+from api.database.incidents.connection import incident_db
+from api.database.redis.codec import decode_fields, decode_partial, encode_partial
+from api.database.redis.main import redis_db
+from api.models.IncidentWebhook import DTCPartial
+from tests.test_webhooks import sample_dtc_data, sample_alert_data
+
+partial = DTCPartial(timestamp=1706630400000, account_id="a", vehicle_id="v", dtc_code="105-2")
+
+@pytest.mark.parametrize("encoding, compression", [("json", "none"), ("msgpack", "none"), ("msgpack", "zlib")])
+def test_round_trip(monkeypatch, encoding, compression):
+    monkeypatch.setattr(PartialConfig, "encoding", encoding)
+    monkeypatch.setattr(PartialConfig, "compression", compression)
+    value = encode_partial(partial)
+    assert decode_partial(value, DTCPartial) == partial
+    assert decode_fields(value)["dtc_code"] == "105-2"
+
+def test_msgpack_is_smaller_than_json(monkeypatch):
+    json_value = encode_partial(partial)
+    monkeypatch.setattr(PartialConfig, "encoding", "msgpack")
+    assert len(encode_partial(partial)) < len(json_value)
+
+def test_reads_json_written_as_bytes(monkeypatch):
+    """Test that a reader on the new format still decodes JSON partials from Redis"""
+    monkeypatch.setattr(PartialConfig, "encoding", "msgpack")
+    assert decode_partial(partial.model_dump_json().encode(), DTCPartial) == partial
+
+@pytest.mark.asyncio
+async def test_mixed_formats_combine(monkeypatch):
+    """Test that a pair written half in JSON and half in msgpack still combines"""
+    client = TestClient(app)
+    client.post("/api/v1/webhooks/dtc", json=sample_dtc_data)
+    monkeypatch.setattr(PartialConfig, "encoding", "msgpack")
+    monkeypatch.setattr(PartialConfig, "compression", "zlib")
+    assert client.post("/api/v1/webhooks/alert", json=sample_alert_data).status_code == 200
+    assert await incident_db.get_incident_data(sample_dtc_data["data"]["id"]) is not None
@@ -0,0 +1,57 @@
+import asyncio
+import time
+import pytest
+from fastapi.testclient import TestClient
+from api.main import app
+from api.config import DebugConfig
+from api.services.profiling import loop_lag_monitor
+
+@pytest.fixture
+def debug_client(monkeypatch):
+    monkeypatch.setattr(DebugConfig, "token", "secret")
+    return TestClient(app)
+
+def test_debug_routes_hidden_without_token():
+    """Test that the debug routes don't exist unless DEBUG_TOKEN is set"""
+    assert TestClient(app).get("/api/v1/debug/loop-lag").status_code == 404
+
+def test_debug_routes_require_token(debug_client):
+    """Test that a wrong token is refused"""
+    response = debug_client.get("/api/v1/debug/loop-lag", headers={"Authorization": "Bearer wrong"})
+    assert response.status_code == 401
+
+def test_profile_returns_collapsed_stacks(debug_client):
+    """Test that a short profile comes back as 'frame;frame count' lines"""
+    response = debug_client.get(
+        "/api/v1/debug/profile",
+        params={"seconds": 0.2, "hz": 200},
+        headers={"Authorization": "Bearer secret"}
+    )
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0
+        assert "(" in stack.split(";")[-1]
+
+def block_loop(seconds: float):
+    time.sleep(seconds)
+
+@pytest.mark.asyncio
+async def test_loop_lag_monitor_records_blocking_call(monkeypatch):
+    """Test that a callback blocking the loop is recorded with its stack"""
+    monkeypatch.setattr(type(loop_lag_monitor), "threshold", 0.05)
+    monkeypatch.setattr(type(loop_lag_monitor), "interval", 0.01)
+    await loop_lag_monitor.start()
+    try:
+        await asyncio.sleep(0.03)
+        block_loop(0.2)
+        await asyncio.sleep(0.03)
+    finally:
+        await loop_lag_monitor.stop(timeout=1.0)
+
+    stalls = loop_lag_monitor.stalls()
+    assert len(stalls) == 1
+    assert stalls[0]["duration_ms"] >= 100
+    assert any(frame.startswith("block_loop (") for frame in stalls[0]["stack"])
@@ -0,0 +1,154 @@
+import pytest
+from datetime import datetime, UTC
+from api.database.incidents.connection import IncidentDatabase
+from api.database.incidents.timeseries import (
+    MIGRATION_STATE, from_timeseries, migrate, timeseries_field, timeseries_options, timeseries_query, to_timeseries
+)
+
+INCIDENT = {
+    "_id": "event-1",
+    "timestamp": 1706630400,
+    "account_id": "account-1",
+    "vehicle_id": "vehicle-1",
+    "dtc_code": "105-2",
+}
+
+def test_documents_round_trip():
+    """Test that meta fields and the time field are added on write and removed on read"""
+    stored = to_timeseries(INCIDENT)
+    assert stored["meta"] == {"account_id": "account-1", "vehicle_id": "vehicle-1"}
+    assert stored["time"] == datetime(2024, 1, 30, 16, 0, tzinfo=UTC)
+    assert "account_id" not in stored
+    assert from_timeseries(stored) == INCIDENT
+
+def test_keyset_query_maps_to_stored_fields():
+    """Test that a find_incidents query targets meta and time, inside $or too"""
+    query = IncidentDatabase._incident_query({"account_id": "account-1", "dtc_code": "105-2"}, 100, 200, (150, "event-1"))
+    mapped = timeseries_query(query)
+    assert mapped["meta.account_id"] == "account-1"
+    assert mapped["dtc_code"] == "105-2"
+    assert mapped["time"]["$gte"] == datetime.fromtimestamp(100, UTC)
+    assert mapped["$or"][1] == {"time": datetime.fromtimestamp(150, UTC), "_id": {"$lt": "event-1"}}
+    assert timeseries_field("vehicle_id") == "meta.vehicle_id"
+
+def test_options():
+    """Test that retention is only set when configured"""
+    assert "expireAfterSeconds" not in timeseries_options("minutes", 0)
+    options = timeseries_options("hours", 86400)
+    assert options["timeseries"] == {"timeField": "time", "metaField": "meta", "granularity": "hours"}
+    assert options["expireAfterSeconds"] == 86400
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def batch_size(self, size):
+        return self
+
+    async def __aiter__(self):
+        for document in self.documents:
+            yield dict(document)
+
+class FakeCollection:
+    """Just enough of a Motor collection for migrate()"""
+    def __init__(self, db, name):
+        self.db, self.name, self.documents, self.fail_inserts = db, name, [], 0
+
+    async def find_one(self, query):
+        return next((d for d in self.documents if all(d.get(k) == v for k, v in query.items())), None)
+
+    async def insert_one(self, document):
+        self.documents.append(document)
+
+    async def insert_many(self, documents, ordered=True):
+        if self.fail_inserts:
+            self.fail_inserts -= 1
+            raise ConnectionError("insert failed")
+        self.documents.extend(documents)
+
+    async def delete_one(self, query):
+        document = await self.find_one(query)
+        if document:
+            self.documents.remove(document)
+
+    def find(self):
+        return FakeCursor(self.documents)
+
+    async def count_documents(self, query):
+        return len(self.documents)
+
+    async def rename(self, new_name):
+        self.db.collections[new_name] = self.db.collections.pop(self.name)
+        self.db.types[new_name] = self.db.types.pop(self.name)
+        self.name = new_name
+
+    async def index_information(self):
+        return {}
+
+    async def create_indexes(self, models):
+        return [model.document["name"] for model in models]
+
+class FakeDatabase:
+    def __init__(self):
+        self.collections, self.types = {}, {}
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(self, name)
+            self.types[name] = None
+        return self.collections[name]
+
+    async def command(self, name):
+        batch = [{"name": name, "type": self.types[name] or "collection"} for name in self.collections]
+        return {"cursor": {"firstBatch": batch}}
+
+    async def create_collection(self, name, **options):
+        self[name]
+        self.types[name] = "timeseries"
+
+    async def drop_collection(self, name):
+        self.collections.pop(name)
+        self.types.pop(name)
+
+@pytest.fixture
+def db():
+    db = FakeDatabase()
+    db["incidents"].documents = [{**INCIDENT, "_id": f"event-{n}"} for n in range(5)]
+    return db
+
+@pytest.mark.asyncio
+async def test_migrate_refuses_to_run_twice(db):
+    """Test that a rerun after a finished migration leaves the live collection alone"""
+    assert await migrate(db, batch_size=2) == {"source": 5, "copied": 5}
+    assert await db[MIGRATION_STATE].find_one({"_id": "incidents"}) is None
+
+    # Ingest carried on into the time-series collection
+    await db["incidents"].insert_many([to_timeseries({**INCIDENT, "_id": "event-new"})])
+    with pytest.raises(RuntimeError, match="already a time-series"):
+        await migrate(db, batch_size=2)
+    assert len(db["incidents"].documents) == 6
+
+@pytest.mark.asyncio
+async def test_migrate_restarts_an_interrupted_copy(db):
+    """Test that a copy interrupted part way is dropped and redone"""
+    real_create = db.create_collection
+    async def create_failing(name, **options):
+        await real_create(name, **options)
+        db[name].fail_inserts = 1
+    db.create_collection = create_failing
+
+    with pytest.raises(ConnectionError):
+        await migrate(db, batch_size=2)
+    assert await db[MIGRATION_STATE].find_one({"_id": "incidents"}) is not None
+
+    db.create_collection = real_create
+    assert await migrate(db, batch_size=2) == {"source": 5, "copied": 5}
+    assert len(db["incidents"].documents) == 5
+
+@pytest.mark.asyncio
+async def test_migrate_refuses_a_backup_without_a_marker(db):
+    """Test that an existing backup is not taken as an interrupted run unless the marker says so"""
+    db["incidents_pre_timeseries"].documents = [dict(INCIDENT)]
+    with pytest.raises(RuntimeError, match="already exists"):
+        await migrate(db)
+    assert len(db["incidents"].documents) == 5
@@ -5,6 +5,7 @@ from datetime import datetime, UTC
 import json
 from api.main import app
 from api.database.redis.main import redis_db
+from api.database.redis.dedup import persisted_events
 from api.database.incidents.connection import incident_db
 
 # Sample test data
@@ -171,4 +172,136 @@ async def test_concurrent_webhooks(test_client):
         dtc_response = test_client.post("/api/v1/webhooks/dtc", json=dtc)
         alert_response = test_client.post("/api/v1/webhooks/alert", json=alert)
         assert dtc_response.status_code == 200
-        assert alert_response.status_code == 200 
\ No newline at end of file
+        assert alert_response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_hset_and_claim_returns_hash_once():
+    """Test that only the write completing the hash claims it"""
+    key = "incident:test-claim"
+    required = ["dtc_data", "alert_data"]
+
+    first = await redis_db.hset_and_claim(key, "dtc_data", "{}", required)
+    assert first is None
+
+    second = await redis_db.hset_and_claim(key, "alert_data", "{}", required)
+    assert second == {"dtc_data": "{}", "alert_data": "{}"}
+
+    # Hash is gone, so a retried webhook starts a new partial
+    assert not await redis_db.hgetall(key)
+    third = await redis_db.hset_and_claim(key, "alert_data", "{}", required)
+    assert third is None
+
+@pytest.mark.asyncio
+async def test_batch_webhook(test_client):
+    """Test mixed batch submission with per-item status"""
+    other_dtc = {**sample_dtc_data, "data": {**sample_dtc_data["data"], "id": "test-id-456"}}
+    invalid = {"data": {"id": "test-id-789"}, "action": "create", "entity": "alert_log"}
+    missing_action = {"data": {"id": "test-id-789"}, "entity": "alert_log"}
+    response = test_client.post(
+        "/api/v1/webhooks/batch",
+        json=[sample_dtc_data, other_dtc, sample_alert_data, invalid, missing_action]
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == ["stored", "pending", "stored", "error", "error"]
+
+    assert await incident_db.get_incident_data(sample_dtc_data["data"]["id"]) is not None
+    stored_data = await redis_db.hgetall("incident:test-id-456")
+    assert "dtc_data" in stored_data
+
+@pytest.mark.asyncio
+async def test_batch_webhook_reopened_partial_stays_pending(test_client):
+    """Test that a write after the pair was claimed is reported as pending"""
+    response = test_client.post(
+        "/api/v1/webhooks/batch",
+        json=[sample_dtc_data, sample_alert_data, sample_dtc_data]
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == ["stored", "stored", "pending"]
+
+    stored_data = await redis_db.hgetall(f"incident:{sample_dtc_data['data']['id']}")
+    assert "dtc_data" in stored_data
+
+@pytest.mark.asyncio
+async def test_batch_webhook_failed_insert_leaves_partial_pending(test_client, monkeypatch):
+    """Test that a pair whose insert fails is handed back, so its pending half is still pending"""
+    event_id = sample_dtc_data["data"]["id"]
+    store_many = incident_db.store_many_incidents
+    async def fail_first(incidents):
+        monkeypatch.setattr(incident_db, "store_many_incidents", store_many)
+        return {0: "insert failed"}
+    monkeypatch.setattr(incident_db, "store_many_incidents", fail_first)
+
+    response = test_client.post("/api/v1/webhooks/batch", json=[sample_dtc_data, sample_alert_data])
+    assert [r["status"] for r in response.json()["results"]] == ["pending", "error"]
+    assert await incident_db.get_incident_data(event_id) is None
+    assert set(await redis_db.hgetall(f"incident:{event_id}")) == {"dtc_data", "alert_data"}
+
+    # Retrying only the failed item completes the incident
+    response = test_client.post("/api/v1/webhooks/batch", json=[sample_alert_data])
+    assert [r["status"] for r in response.json()["results"]] == ["stored"]
+    assert await incident_db.get_incident_data(event_id) is not None
+
+@pytest.mark.asyncio
+async def test_partial_holds_only_incident_fields(test_client):
+    """Test that only the fields the incident needs are kept in Redis"""
+    test_client.post("/api/v1/webhooks/dtc", json=sample_dtc_data)
+    stored_data = await redis_db.hgetall(f"incident:{sample_dtc_data['data']['id']}")
+    partial = json.loads(stored_data["dtc_data"])
+    assert partial["dtc_code"] == "105-2"
+    assert "dtcs" not in partial
+
+@pytest.mark.asyncio
+async def test_combines_partial_written_as_full_payload(test_client):
+    """Test that partials stored in the old full-payload format still combine"""
+    event_id = sample_dtc_data["data"]["id"]
+    await redis_db.hset_and_claim(
+        f"incident:{event_id}", "dtc_data", json.dumps(sample_dtc_data["data"]), ["dtc_data", "alert_data"]
+    )
+    response = test_client.post("/api/v1/webhooks/alert", json=sample_alert_data)
+    assert response.status_code == 200
+
+    incident = await incident_db.get_incident_data(event_id)
+    assert incident["dtc_code"] == "105-2"
+    assert incident["location"] == {"type": "Point", "coordinates": [74.28041166666667, 16.709181666666666]}
+
+@pytest.mark.asyncio
+async def test_dtc_webhook_rejects_alert_envelope(test_client):
+    """Test that the entity discriminator must match the endpoint"""
+    response = test_client.post("/api/v1/webhooks/dtc", json=sample_alert_data)
+    assert response.status_code == 500
+
+@pytest.mark.asyncio
+async def test_retry_after_stored_is_acknowledged(test_client):
+    """Test that a retried webhook for a stored incident returns 200 without opening a partial"""
+    hits = persisted_events.stats()["hits"]
+    test_client.post("/api/v1/webhooks/dtc", json=sample_dtc_data)
+    test_client.post("/api/v1/webhooks/alert", json=sample_alert_data)
+
+    response = test_client.post("/api/v1/webhooks/dtc", json=sample_dtc_data)
+    assert response.status_code == 200
+    assert response.json() == {"status": "Duplicate"}
+    assert not await redis_db.hgetall(f"incident:{sample_dtc_data['data']['id']}")
+
+    stats = persisted_events.stats()
+    assert stats["hits"] == hits + 1
+    assert stats["hit_rate"] > 0
+
+@pytest.mark.asyncio
+async def test_repeated_pair_is_not_an_error(test_client, monkeypatch):
+    """Test that re-storing an incident (dedup window lapsed) is treated as a duplicate, not a 500"""
+    monkeypatch.setattr(type(persisted_events), "enabled", False)
+    for _ in range(2):
+        test_client.post("/api/v1/webhooks/dtc", json=sample_dtc_data)
+        response = test_client.post("/api/v1/webhooks/alert", json=sample_alert_data)
+        assert response.status_code == 200
+
+@pytest.mark.asyncio
+async def test_batch_webhook_reports_duplicates(test_client):
+    """Test that batch items for already stored incidents are skipped as duplicates"""
+    test_client.post("/api/v1/webhooks/batch", json=[sample_dtc_data, sample_alert_data])
+    response = test_client.post("/api/v1/webhooks/batch", json=[sample_alert_data, sample_dtc_data])
+    assert [r["status"] for r in response.json()["results"]] == ["duplicate", "duplicate"]
+    assert not await redis_db.hgetall(f"incident:{sample_dtc_data['data']['id']}")
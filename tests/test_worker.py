@@ -0,0 +1,83 @@
+import pytest
+from fastapi.testclient import TestClient
+from api.main import app
+from api.config import IngestConfig
+from api.database.incidents.connection import incident_db
+from api.database.redis.main import redis_db
+from api.worker import process_batch
+from tests.test_webhooks import sample_dtc_data, sample_alert_data
+
+@pytest.fixture
+async def stream_mode(monkeypatch):
+    monkeypatch.setattr(IngestConfig, "mode", "stream")
+    await redis_db.xgroup_create(IngestConfig.stream, IngestConfig.group)
+    return TestClient(app)
+
+@pytest.mark.asyncio
+async def test_stream_mode_acks_and_worker_stores(stream_mode):
+    """Test that handlers return 202 and the worker combines the queued partials"""
+    event_id = sample_dtc_data["data"]["id"]
+    assert stream_mode.post("/api/v1/webhooks/dtc", json=sample_dtc_data).status_code == 202
+    assert stream_mode.post("/api/v1/webhooks/alert", json=sample_alert_data).status_code == 202
+    assert await incident_db.get_incident_data(event_id) is None
+
+    assert await process_batch("worker-1", block_ms=0) == 2
+    assert await incident_db.get_incident_data(event_id) is not None
+    assert await process_batch("worker-1", block_ms=0) == 0
+
+@pytest.mark.asyncio
+async def test_worker_reclaims_stuck_entries(stream_mode, monkeypatch):
+    """Test that entries left pending by a dead consumer are taken over"""
+    stream_mode.post("/api/v1/webhooks/dtc", json=sample_dtc_data)
+    stream_mode.post("/api/v1/webhooks/alert", json=sample_alert_data)
+
+    # worker-1 reads both entries and dies before acknowledging them
+    await redis_db.xreadgroup(IngestConfig.stream, IngestConfig.group, "worker-1", 10, 0)
+
+    monkeypatch.setattr(IngestConfig, "claim_idle_ms", 0)
+    assert await process_batch("worker-2", block_ms=0) == 2
+    assert await incident_db.get_incident_data(sample_dtc_data["data"]["id"]) is not None
+
+@pytest.mark.asyncio
+async def test_worker_dead_letters_failing_entries(stream_mode, monkeypatch):
+    """Test that an entry failing max_deliveries times is moved to the dead-letter stream"""
+    # Missing the partial's data, so processing fails on every delivery
+    await redis_db.xadd(IngestConfig.stream, {"id": "bad", "field": "dtc_data"})
+    monkeypatch.setattr(IngestConfig, "claim_idle_ms", 0)
+    monkeypatch.setattr(IngestConfig, "max_deliveries", 2)
+
+    await process_batch("worker-1", block_ms=0)
+    assert IngestConfig.dead_letter_stream not in redis_db._streams
+    await process_batch("worker-1", block_ms=0)
+    assert await process_batch("worker-1", block_ms=0) == 0
+
+    dead = redis_db._streams[IngestConfig.dead_letter_stream]["entries"]
+    assert len(dead) == 1 and dead[0][1]["id"] == "bad"
+
+@pytest.mark.asyncio
+async def test_worker_stores_incident_after_a_failed_insert(stream_mode, monkeypatch):
+    """Test that a pair claimed by a failing insert is handed back and stored on redelivery"""
+    event_id = sample_dtc_data["data"]["id"]
+    stream_mode.post("/api/v1/webhooks/dtc", json=sample_dtc_data)
+    stream_mode.post("/api/v1/webhooks/alert", json=sample_alert_data)
+
+    store = incident_db.store_incident_data
+    attempts = []
+    async def fail_once(incident):
+        attempts.append(incident.id)
+        if len(attempts) == 1:
+            raise ConnectionError("insert failed")
+        return await store(incident)
+    monkeypatch.setattr(incident_db, "store_incident_data", fail_once)
+    monkeypatch.setattr(IngestConfig, "claim_idle_ms", 0)
+
+    assert await process_batch("worker-1", block_ms=0) == 2
+    assert await incident_db.get_incident_data(event_id) is None
+    assert set(await redis_db.hgetall(f"incident:{event_id}")) == {"dtc_data", "alert_data"}
+
+    # Only the entry whose claim failed is still pending
+    assert await process_batch("worker-1", block_ms=0) == 1
+    assert attempts == [event_id, event_id]
+    assert await incident_db.get_incident_data(event_id) is not None
+    assert await redis_db.hgetall(f"incident:{event_id}") == {}
+    assert await process_batch("worker-1", block_ms=0) == 0
@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from api.main import app
+from api.database.incidents.connection import incident_db
+from api.database.incidents.write_buffer import incident_write_buffer
+from api.database.redis.main import redis_db
+from api.models.IncidentWebhook import IncidentModel
+from tests.test_webhooks import sample_dtc_data
+
+def make_incident(event_id: str) -> IncidentModel:
+    return IncidentModel(
+        id=event_id,
+        timestamp=1706630400,
+        account_id="test-account-123",
+        vehicle_id="test-vehicle-123",
+        vehicle_tag="AB 01 CD 1234",
+        dtc_code="105-2",
+        location={"type": "Point", "coordinates": [74.28, 16.7]}
+    )
+
+async def wait_for_count(expected: int, timeout: float = 1.0):
+    """Yield to the loop until the background task has written `expected` incidents"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while await incident_db.count_documents() < expected:
+        if asyncio.get_running_loop().time() > deadline:
+            break
+        await asyncio.sleep(0.01)
+    return await incident_db.count_documents()
+
+@pytest.fixture
+async def write_buffer(monkeypatch):
+    monkeypatch.setattr(type(incident_write_buffer), "batch_size", 2)
+    monkeypatch.setattr(type(incident_write_buffer), "flush_interval", 60)
+    await incident_write_buffer.start()
+    yield incident_write_buffer
+    await incident_write_buffer.stop(timeout=1.0)
+
+@pytest.mark.asyncio
+async def test_flushes_when_batch_is_full(write_buffer):
+    """Test that reaching batch_size wakes the background task to flush"""
+    await write_buffer.add(make_incident("event-1"))
+    await asyncio.sleep(0.05)
+    assert await incident_db.get_incident_data("event-1") is None
+
+    await write_buffer.add(make_incident("event-2"))
+    assert await wait_for_count(2) == 2
+
+    stats = write_buffer.stats()
+    assert stats["flushes"] == 1
+    assert stats["last_batch_size"] == 2
+    assert stats["pending"] == 0
+
+@pytest.mark.asyncio
+async def test_flushes_after_interval(write_buffer, monkeypatch):
+    """Test that a partial batch is flushed once flush_interval elapses"""
+    monkeypatch.setattr(type(incident_write_buffer), "flush_interval", 0.05)
+    # Restart so the background task picks up the short interval
+    await write_buffer.stop(timeout=1.0)
+    await write_buffer.start()
+
+    await write_buffer.add(make_incident("event-1"))
+    assert await wait_for_count(1) == 1
+    assert write_buffer.stats()["last_batch_size"] == 1
+
+@pytest.mark.asyncio
+async def test_stop_drains_pending(write_buffer):
+    """Test that stopping the buffer writes everything still pending"""
+    await write_buffer.add(make_incident("event-1"))
+    await write_buffer.add(make_incident("event-1"))
+    await write_buffer.add(make_incident("event-3"))
+    await write_buffer.stop(timeout=1.0)
+
+    assert await incident_db.count_documents() == 2
+    stats = write_buffer.stats()
+    assert stats["pending"] == 0
+    assert stats["write_errors"] == 0
+    assert stats["duplicates"] == 1
+
+@pytest.mark.asyncio
+async def test_full_buffer_rejects_before_claiming(monkeypatch):
+    """Test that a full buffer refuses the webhook without touching Redis"""
+    monkeypatch.setattr(type(incident_write_buffer), "enabled", True)
+    monkeypatch.setattr(type(incident_write_buffer), "max_pending", 0)
+
+    response = TestClient(app).post("/api/v1/webhooks/dtc", json=sample_dtc_data)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert not await redis_db.hgetall(f"incident:{sample_dtc_data['data']['id']}")